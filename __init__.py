@@ -0,0 +1,67 @@
+import importlib
+
+"""
+The helpers as a package, e.g. from a notebook with the repo in src/ (see notebook_utils.insert_parent_in_path):
+
+    from src.package import chunk_list, S3Connector
+    from src.package import eda_utils
+
+Nothing is imported up front: a submodule is imported the first time it, or one of the names below, is accessed, and
+the submodules import pandas, numpy, seaborn, matplotlib, polars, duckdb and boto3 lazily too (see lazy_utils), so a
+job pays only for what it uses. The modules can still be imported on their own with the repo in sys.path.
+"""
+
+SUBMODULES = [
+    "bootstrap_python", "cache_utils", "duckdb_bootstrap", "duckdb_utils", "eda_utils", "get_file_base_path",
+    "lazy_utils", "make_subplots", "notebook_utils", "notebooks_utils", "pandas_kernels", "pandas_utils",
+    "polars_utils", "s3_connector", "trace_utils", "utils",
+]
+
+# name: submodule, the entry points, names defined by several submodules are only reachable through them
+EXPORTS = {
+    "add_root": "utils",
+    "chunk_list": "utils",
+    "convert_int_into_2d_array": "utils",
+    "insert_parent_in_path": "notebook_utils",
+    "S3Connector": "s3_connector",
+    "cached": "cache_utils",
+    "configure_cache": "cache_utils",
+    "clear_cache": "cache_utils",
+    "configure_tracing": "trace_utils",
+    "span": "trace_utils",
+    "traced": "trace_utils",
+    "BootstrapStatistics": "bootstrap_python",
+    "chunked_bootstrap": "bootstrap_python",
+    "scalable_vectorize_bootstrap": "bootstrap_python",
+    "weighted_bootstrap": "bootstrap_python",
+    "parallel_bootstrap": "bootstrap_python",
+    "bootstrap_statistic": "bootstrap_python",
+    "adaptive_bootstrap": "bootstrap_python",
+    "upsert_parquet_files": "duckdb_utils",
+    "ingest_parquet_files": "duckdb_utils",
+    "upsert_data_from_parquet": "duckdb_utils",
+    "Window": "pandas_utils",
+    "compact_dtypes": "pandas_kernels",
+    "get_time_lags": "polars_utils",
+    "build_lag_features": "polars_utils",
+    "profile_dataframe": "eda_utils",
+    "get_correlations": "eda_utils",
+    "Chart": "make_subplots",
+}
+
+__all__ = SUBMODULES + list(EXPORTS)
+
+
+def __getattr__(name:str):
+    if name in SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if name in EXPORTS:
+        value = getattr(importlib.import_module(f".{EXPORTS[name]}", __name__), name)
+        # cached, the next access doesn't go through __getattr__
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
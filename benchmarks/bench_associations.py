@@ -0,0 +1,73 @@
+"""
+Benchmark of the association engine against one DataFrame.corr per covariate, and of the aggregated
+plot_relation_between_target_and_covariates against plotting every row with regplot / boxplot.
+
+    python -m benchmarks.bench_associations
+"""
+import time
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import seaborn as sns  # noqa: E402
+
+import eda_utils as eu  # noqa: E402
+from benchmarks.common import print_table, run_isolated  # noqa: E402
+from benchmarks.generators import make_covariates  # noqa: E402
+
+
+def legacy_plot(data: pd.DataFrame, target: str, covariates: list[str], ncols: int = 3) -> None:
+    """The plot before the aggregation: one corr, and a regplot / boxplot over every row per covariate."""
+    nrows = int(np.ceil(len(covariates) / ncols))
+    fig, axs = plt.subplots(nrows=nrows, ncols=ncols, figsize=(15, 5 * nrows))
+    axs = axs.flatten()
+    for i, covariate in enumerate(covariates):
+        if eu.is_numeric(data[covariate]):
+            sns.regplot(x=covariate, y=target, data=data, ax=axs[i])
+            correlation = data[[covariate, target]].corr().iloc[0, 1]
+            axs[i].annotate(f"Pearson: {correlation:.2f}", xy=(0.05, 0.95), xycoords="axes fraction")
+        else:
+            sns.boxplot(x=covariate, y=target, data=data, ax=axs[i])
+    plt.tight_layout()
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def case_correlations(engine: str, n_rows: int, n_numeric: int) -> float:
+    data = make_covariates(n_rows, n_numeric, 0)
+    covariates = [f"num_{i}" for i in range(n_numeric)]
+    start = time.perf_counter()
+    if engine == "legacy":
+        pd.Series({covariate: data[[covariate, "target"]].corr().iloc[0, 1] for covariate in covariates})
+    else:
+        eu.get_correlations(data, "target", covariates)
+    return time.perf_counter() - start
+
+
+def case_plot(engine: str, n_rows: int) -> float:
+    data = make_covariates(n_rows, 4, 2)
+    covariates = [col for col in data.columns if col != "target"]
+    start = time.perf_counter()
+    if engine == "legacy":
+        legacy_plot(data, "target", covariates)
+    else:
+        plt.show = lambda: plt.gcf().canvas.draw()
+        eu.plot_relation_between_target_and_covariates(data, "target", covariates, seed=0)
+        plt.close("all")
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rows = []
+    for n_rows in [100_000, 1_000_000]:
+        for engine in ["legacy", "vectorized"]:
+            result = run_isolated(case_correlations, engine=engine, n_rows=n_rows, n_numeric=200)
+            rows.append({"case": "correlations, 200 covariates", "engine": engine, "n_rows": n_rows, **result})
+    for n_rows in [10_000, 100_000]:
+        for engine in ["legacy", "aggregated"]:
+            result = run_isolated(case_plot, engine=engine, n_rows=n_rows)
+            rows.append({"case": "plot, 6 covariates", "engine": engine, "n_rows": n_rows, **result})
+    print_table(rows)
@@ -0,0 +1,38 @@
+"""
+Benchmark of the single column bootstrap engines: peak RSS and wall time.
+
+    python -m benchmarks.bench_bootstrap
+"""
+import time
+
+import bootstrap_python as bp
+from benchmarks.common import print_table, run_isolated
+from benchmarks.generators import make_column
+
+
+def case_single_column(engine: str, n: int, B: int, **kwargs) -> float:
+    data = make_column(n)
+    start = time.perf_counter()
+    getattr(bp, engine)(data, "value", B, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    rows = []
+    grid = [(10_000, 1_000), (100_000, 1_000), (1_000_000, 200)]
+    engines = [
+        ("vectorized_bootstrap", {}),
+        ("chunked_bootstrap", {"max_memory_mb": 64}),
+        ("chunked_bootstrap", {"max_memory_mb": 256}),
+        ("weighted_bootstrap", {"method": "multinomial", "max_memory_mb": 64}),
+        ("weighted_bootstrap", {"method": "poisson", "max_memory_mb": 64}),
+    ]
+    for n, B in grid:
+        for engine, kwargs in engines:
+            result = run_isolated(case_single_column, engine=engine, n=n, B=B, **kwargs)
+            rows.append({"engine": engine, **kwargs, "n": n, "B": B, **result})
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark of the result cache: cold call, memory hit and disk hit (a new process, like a notebook restart) of the
+cached helpers.
+
+    python -m benchmarks.bench_cache
+"""
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generators import make_hourly_pickups
+from benchmarks.common import print_table, run_isolated
+
+
+def call_helper(helper: str) -> None:
+    import bootstrap_python as bp
+    import eda_utils as eu
+    import polars_utils as pu
+
+    if helper == "scalable_vectorize_bootstrap":
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({"group": rng.integers(0, 1000, 2_000_000), "value": rng.normal(size=2_000_000)})
+
+        def call():
+            # random helpers are cached on request, a hit needs the same seed
+            np.random.seed(0)
+            return bp.scalable_vectorize_bootstrap(df, "value", ["group"], 500, use_cache=True)
+
+        return call
+    if helper == "get_time_lags":
+        df = make_hourly_pickups(180)
+        return lambda: pu.get_time_lags(df, [1, 2, 24, 168])
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(1_000_000, 30)), columns=[f"col_{i}" for i in range(30)])
+    return lambda: eu.profile_dataframe(df, seed=0, use_cache=True)
+
+
+def case_cache(helper: str, directory: str, warm: str) -> float:
+    import cache_utils as cu
+
+    cu.configure_cache(directory=directory)
+    call = call_helper(helper)
+    if warm == "memory":
+        call()
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rows = []
+    for helper in ["scalable_vectorize_bootstrap", "get_time_lags", "profile_dataframe"]:
+        with tempfile.TemporaryDirectory() as directory:
+            for warm in ["cold", "memory", "disk"]:
+                result = run_isolated(case_cache, helper=helper, directory=directory, warm=warm)
+                rows.append({"helper": helper, "call": warm, **result})
+    print_table(rows)
@@ -0,0 +1,53 @@
+"""
+Benchmark of the DuckDB bootstrap against the pandas path (read_parquet + scalable_vectorize_bootstrap)
+at growing row counts. The timed section includes reading the parquet file in both cases.
+
+    python -m benchmarks.bench_duckdb_bootstrap
+"""
+import os
+import tempfile
+import time
+
+import duckdb
+import pandas as pd
+
+import bootstrap_python as bp
+import duckdb_bootstrap as dbb
+from benchmarks.generators import make_groups
+from benchmarks.common import print_table, run_isolated
+
+
+def case_pandas(path: str, B: int) -> float:
+    start = time.perf_counter()
+    df = pd.read_parquet(path)
+    bp.scalable_vectorize_bootstrap(df, "value", ["group"], B)
+    return time.perf_counter() - start
+
+
+def case_duckdb(path: str, B: int, method: str) -> float:
+    connection = duckdb.connect()
+    start = time.perf_counter()
+    dbb.duckdb_bootstrap(connection, path, "value", ["group"], B, method=method)
+    return time.perf_counter() - start
+
+
+def main():
+    rows = []
+    B, n_groups = 200, 100
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [100_000, 1_000_000, 5_000_000]:
+            path = os.path.join(tmp, f"groups_{n}.parquet")
+            make_groups(n, n_groups).to_parquet(path)
+            cases = [
+                ("pandas", case_pandas, {}),
+                ("duckdb", case_duckdb, {"method": "poisson"}),
+                ("duckdb", case_duckdb, {"method": "index"}),
+            ]
+            for engine, case, kwargs in cases:
+                result = run_isolated(case, path=path, B=B, **kwargs)
+                rows.append({"engine": engine, **kwargs, "n": n, "B": B, **result})
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark of the concurrent ingestion pipeline on a synthetic dataset of 1000 hourly files,
+with the time spent in every stage.
+
+    python -m benchmarks.bench_duckdb_ingest
+"""
+import tempfile
+import time
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import duckdb_utils as du
+from benchmarks.bench_duckdb_upsert import TARGET, per_file_loop
+from benchmarks.bench_duckdb_upsert import create_target as create_raw_target
+from benchmarks.generators import make_hourly_files
+from benchmarks.common import print_table
+
+
+def add_features(table: pa.Table) -> pa.Table:
+    """Preprocessing run by the readers: flag of busy hours and hour of the day."""
+    hour = pc.hour(table["pickup_datetime_hour"])
+    busy = pc.greater(table["num_pickup"], 25)
+    return table.append_column("hour", hour).append_column("is_busy", busy)
+
+
+def create_target(connection: duckdb.DuckDBPyConnection) -> None:
+    connection.execute(f"""
+        CREATE OR REPLACE TABLE {TARGET} (
+            key BIGINT PRIMARY KEY,
+            pickup_datetime_hour TIMESTAMP,
+            pickup_location_id BIGINT,
+            num_pickup BIGINT,
+            hour BIGINT,
+            is_busy BOOLEAN
+        )
+    """)
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        files = make_hourly_files(tmp, 1_000)
+        # the per-file loop inserts positionally, so it loads the raw columns only
+        cases = [("per-file loop, no transform", create_raw_target, lambda c: per_file_loop(c, files))]
+        cases += [
+            (f"ingest_parquet_files n_readers={n}", create_target, lambda c, n=n: du.ingest_parquet_files(
+                c, files, TARGET, ["key"], transform=add_features, n_readers=n, manifest_table=False
+            ))
+            for n in [1, 2, 4, 8]
+        ]
+        for name, create, run in cases:
+            connection = duckdb.connect()
+            create(connection)
+            start = time.perf_counter()
+            report = run(connection)
+            seconds = time.perf_counter() - start
+            metrics = {} if report is None else {
+                k: v for k, v in report.asdict().items() if k.endswith("seconds") and k != "seconds"
+            }
+            rows.append({"engine": name, "files": len(files), "seconds": seconds, **metrics})
+            connection.close()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
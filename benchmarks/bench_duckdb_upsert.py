@@ -0,0 +1,71 @@
+"""
+Benchmark of the batched upsert engine against the per-file staging loop on synthetic hourly files.
+
+    python -m benchmarks.bench_duckdb_upsert
+"""
+import tempfile
+import time
+
+import duckdb
+
+import duckdb_utils as du
+from benchmarks.common import print_table
+from benchmarks.generators import N_LOCATIONS, make_hourly_files
+
+TARGET = "main.pickup_hourly"
+
+
+def create_target(connection: duckdb.DuckDBPyConnection) -> None:
+    connection.execute(f"""
+        CREATE OR REPLACE TABLE {TARGET} (
+            key BIGINT PRIMARY KEY,
+            pickup_datetime_hour TIMESTAMP,
+            pickup_location_id BIGINT,
+            num_pickup BIGINT
+        )
+    """)
+
+
+def per_file_loop(connection: duckdb.DuckDBPyConnection, files: list[str]) -> None:
+    """The staging-table statement upsert_data_from_parquet used to run, once per file."""
+    for file in files:
+        connection.execute(f"""
+            CREATE OR REPLACE TEMP TABLE stg_pickup_hourly AS
+            SELECT * FROM read_parquet('{file}');
+
+            INSERT INTO {TARGET}
+            SELECT * FROM stg_pickup_hourly
+            ON CONFLICT(key)
+            DO UPDATE SET num_pickup = EXCLUDED.num_pickup;
+
+            DROP TABLE stg_pickup_hourly;
+        """)
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        files = make_hourly_files(tmp, 2_000)
+        n_rows = len(files) * N_LOCATIONS
+        cases = [
+            ("per-file loop", lambda c: per_file_loop(c, files)),
+            ("upsert_parquet_files batch_files=100", lambda c: du.upsert_parquet_files(c, files, TARGET, ["key"], ["num_pickup"], batch_files=100, manifest_table=False)),
+            ("upsert_parquet_files batch_files=1000", lambda c: du.upsert_parquet_files(c, files, TARGET, ["key"], ["num_pickup"], batch_files=1000, manifest_table=False)),
+            ("upsert_parquet_files batch_files=100 + manifest", lambda c: du.upsert_parquet_files(c, files, TARGET, ["key"], ["num_pickup"], batch_files=100)),
+        ]
+        for load in ["initial", "reload"]:
+            for name, run in cases:
+                connection = duckdb.connect()
+                create_target(connection)
+                if load == "reload":
+                    du.upsert_parquet_files(connection, files, TARGET, ["key"])
+                start = time.perf_counter()
+                run(connection)
+                seconds = time.perf_counter() - start
+                rows.append({"engine": name, "load": load, "files": len(files), "seconds": seconds, "rows_per_second": n_rows / seconds})
+                connection.close()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Benchmark of the grouped bootstrap engines over the number of groups and the skew of the group sizes.
+
+    python -m benchmarks.bench_grouped_bootstrap
+"""
+import time
+
+import bootstrap_python as bp
+from benchmarks.common import print_table, run_isolated
+from benchmarks.generators import make_groups
+
+
+def case_grouped(engine: str, n: int, n_groups: int, skew: float, B: int, **kwargs) -> float:
+    df = make_groups(n, n_groups, skew)
+    start = time.perf_counter()
+    getattr(bp, engine)(df, "value", ["group"], B, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    rows = []
+    n, B = 200_000, 500
+    engines = [
+        ("apply_vectorize_bootstrap", {}),
+        ("scalable_vectorize_bootstrap", {}),
+        ("scalable_vectorize_bootstrap", {"method": "poisson"}),
+    ]
+    for n_groups in [10, 1_000, 50_000]:
+        for skew in [0.0, 1.2]:
+            for engine, kwargs in engines:
+                result = run_isolated(case_grouped, engine=engine, n=n, n_groups=n_groups, skew=skew, B=B, **kwargs)
+                rows.append({"engine": engine, **kwargs, "n_groups": n_groups, "skew": skew, **result})
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
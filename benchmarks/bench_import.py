@@ -0,0 +1,74 @@
+"""
+Benchmark of the cold-start time of every entry point: a fresh interpreter imports it, then loads its lazy dependencies
+(what the import used to cost when they were imported up front).
+
+    python -m benchmarks.bench_import
+"""
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import print_table
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+HEAVY = ["numpy", "pandas", "matplotlib", "seaborn", "polars", "duckdb", "boto3", "pyarrow"]
+
+# entry point: (statement, module whose lazy dependencies are loaded afterwards)
+ENTRY_POINTS = {
+    "utils.chunk_list": ("from utils import chunk_list", "utils"),
+    "S3Connector": ("from s3_connector import S3Connector", "s3_connector"),
+    "trace_utils": ("import trace_utils", "trace_utils"),
+    "cache_utils": ("import cache_utils", "cache_utils"),
+    "pandas_utils": ("import pandas_utils", "pandas_utils"),
+    "bootstrap_python": ("import bootstrap_python", "bootstrap_python"),
+    "duckdb_utils": ("import duckdb_utils", "duckdb_utils"),
+    "duckdb_bootstrap": ("import duckdb_bootstrap", "duckdb_bootstrap"),
+    "polars_utils": ("import polars_utils", "polars_utils"),
+    "eda_utils": ("import eda_utils", "eda_utils"),
+    "make_subplots": ("import make_subplots", "make_subplots"),
+    f"{PACKAGE}.chunk_list": (f"from {PACKAGE} import chunk_list", f"{PACKAGE}.utils"),
+    f"{PACKAGE}.S3Connector": (f"from {PACKAGE} import S3Connector", f"{PACKAGE}.s3_connector"),
+}
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+imported = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+module = sys.modules[{module!r}]
+start = time.perf_counter()
+# the flat and the package lazy_utils are different modules, so no isinstance
+for value in list(vars(module).values()):
+    if type(value).__name__ == "LazyModule":
+        value._load()
+if {module!r}.endswith("s3_connector"):
+    import boto3
+print(json.dumps({{"import_seconds": imported, "dependencies_seconds": time.perf_counter() - start, "heavy": heavy}}))
+"""
+
+
+def time_entry_point(statement: str, module: str) -> dict:
+    script = SCRIPT.format(statement=statement, heavy=HEAVY, module=module)
+    # the parent of the repo too, for the package entry points
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([ROOT, os.path.dirname(ROOT)])}
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, cwd=ROOT, check=True)
+    result = json.loads(output.stdout)
+    return {**result, "heavy_on_import": ",".join(result.pop("heavy")) or "-"}
+
+
+if __name__ == "__main__":
+    repeat = 3
+    rows = []
+    for entry_point, (statement, module) in ENTRY_POINTS.items():
+        runs = [time_entry_point(statement, module) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run["import_seconds"])
+        rows.append({
+            "entry_point": entry_point,
+            "import_seconds": best["import_seconds"],
+            "eager_seconds": best["import_seconds"] + min(run["dependencies_seconds"] for run in runs),
+            "heavy_on_import": best["heavy_on_import"],
+        })
+    print_table(rows)
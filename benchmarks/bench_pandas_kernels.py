@@ -0,0 +1,104 @@
+"""
+Benchmark of the pandas_kernels transforms against the way the pandas_utils helpers used to compute them, and of the
+memory saved by compact_dtypes.
+
+    python -m benchmarks.bench_pandas_kernels
+"""
+import random
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import pandas_kernels as pk
+from benchmarks.common import print_table, run_isolated
+from benchmarks.generators import make_transform_frame
+
+TRANSFORMS = ["randomize_date_col", "coalesce", "binarize", "normalize_by_colum", "compact_dtypes"]
+FARES = ["fare_0", "fare_1", "fare_2"]
+
+
+def legacy_transform(df: pd.DataFrame, transform: str) -> pd.DataFrame:
+    """The row-wise apply, np.where and concat versions, with the 'random' import of randomize_date_col fixed."""
+    if transform == "randomize_date_col":
+        df["pickup_datetime_random"] = df["pickup_datetime"].apply(lambda x: x - timedelta(days=random.randint(1, 30)))
+    elif transform == "coalesce":
+        df["fare_01"] = np.where(df["fare_0"].isnull(), df["fare_1"], df["fare_0"])
+        df["fare"] = np.where(df["fare_01"].isnull(), df["fare_2"], df["fare_01"])
+    elif transform == "binarize":
+        # the same scale for every payment type, the edges are recomputed on every call
+        for _, group in df.groupby("payment_type")["trip_distance"]:
+            ser = group[group <= 50]
+            pd.cut(ser, np.linspace(df["trip_distance"].min(), 50, 20))
+    elif transform == "normalize_by_colum":
+        cols = FARES + ["trip_distance"]
+        normalized = df[cols].div(df["passenger_count"], axis=0).rename(columns=lambda col: f"{col}_per_passenger_count")
+        df = pd.concat([df, normalized], axis=1)
+    elif transform == "compact_dtypes":
+        # astype one column at a time with pd.to_numeric, the usual notebook recipe
+        for col in df.columns:
+            if pd.api.types.is_integer_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], downcast="integer")
+            elif df[col].dtype == object or isinstance(df[col].dtype, pd.StringDtype):
+                if df[col].nunique() <= 0.5 * len(df):
+                    df[col] = df[col].astype("category")
+    return df
+
+
+def kernel_transform(df: pd.DataFrame, transform: str) -> pd.DataFrame:
+    if transform == "randomize_date_col":
+        df["pickup_datetime_random"] = pk.randomize_dates(df["pickup_datetime"], 30, seed=0)
+    elif transform == "coalesce":
+        pk.coalesce(df, FARES, "fare")
+    elif transform == "binarize":
+        edges = pk.get_bin_edges(df["trip_distance"], 20, max_cap=50)
+        for _, group in df.groupby("payment_type")["trip_distance"]:
+            pk.cut(group[group <= 50], edges)
+    elif transform == "normalize_by_colum":
+        pk.divide_columns(df, FARES + ["trip_distance"], "passenger_count")
+    elif transform == "compact_dtypes":
+        df = pk.compact_dtypes(df, inplace=True)
+    return df
+
+
+def case_transform(transform: str, engine: str, n_rows: int) -> float:
+    df = make_transform_frame(n_rows)
+    start = time.perf_counter()
+    (legacy_transform if engine == "legacy" else kernel_transform)(df, transform)
+    return time.perf_counter() - start
+
+
+def case_groupby(compact: bool, n_rows: int) -> float:
+    """A typical aggregation on the raw frame and on the compacted one."""
+    df = make_transform_frame(n_rows)
+    if compact:
+        df = pk.compact_dtypes(df, inplace=True)
+    start = time.perf_counter()
+    df.groupby(["borough", "payment_type", "passenger_count"], observed=True)[FARES + ["trip_distance"]].mean()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rows = []
+    for n_rows in [100_000, 1_000_000, 5_000_000]:
+        for transform in TRANSFORMS:
+            for engine in ["legacy", "kernel"]:
+                result = run_isolated(case_transform, transform=transform, engine=engine, n_rows=n_rows)
+                rows.append({"transform": transform, "engine": engine, "n_rows": n_rows, **result})
+    print_table(rows)
+
+    rows = []
+    for n_rows in [1_000_000, 5_000_000]:
+        df = make_transform_frame(n_rows)
+        before = pk.get_memory_usage(df).sum()
+        after = pk.get_memory_usage(pk.compact_dtypes(df)).sum()
+        for compact in [False, True]:
+            result = run_isolated(case_groupby, compact=compact, n_rows=n_rows)
+            rows.append({
+                "frame": "compact" if compact else "raw", "n_rows": n_rows,
+                "frame_mb": after if compact else before, "groupby_seconds": result["seconds"],
+                "peak_rss_mb": result["peak_rss_mb"],
+            })
+    print()
+    print_table(rows)
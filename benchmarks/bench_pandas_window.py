@@ -0,0 +1,55 @@
+"""
+Benchmark of pandas_utils.Window against one sort + groupby per feature, the way the lead_window / row_number
+helpers used to compute them.
+
+    python -m benchmarks.bench_pandas_window
+"""
+import time
+
+import pandas as pd
+
+import pandas_utils as pu
+from benchmarks.common import print_table, run_isolated
+from benchmarks.generators import make_hourly_frame
+
+LAGS = [1, 2, 3, 6, 12, 24, 48, 72, 168, 336]
+
+
+def legacy_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Ten lags, a row number and a rolling mean, each with its own sort_values + groupby."""
+    features = {}
+    for lag in LAGS:
+        features[f"num_pickup_lag_{lag}"] = (
+            df.sort_values(by="pickup_datetime_hour").groupby("pickup_location_id")["num_pickup"].shift(lag)
+        )
+    features["row_number"] = df.sort_values(by="pickup_datetime_hour").groupby("pickup_location_id").cumcount() + 1
+    features["rolling_mean_24"] = (
+        df.sort_values(by="pickup_datetime_hour").groupby("pickup_location_id")["num_pickup"]
+        .rolling(24, min_periods=1).mean().reset_index(level=0, drop=True)
+    )
+    return pd.DataFrame(features).reindex(df.index)
+
+
+def window_features(df: pd.DataFrame) -> pd.DataFrame:
+    window = pu.Window(df, "pickup_location_id", "pickup_datetime_hour")
+    features = window.lag("num_pickup", LAGS)
+    features["row_number"] = window.row_number()
+    features["rolling_mean_24"] = window.rolling("num_pickup", 24)
+    return features
+
+
+def case_features(engine: str, n_rows: int, n_groups: int) -> float:
+    df = make_hourly_frame(n_rows, n_groups)
+    start = time.perf_counter()
+    (legacy_features if engine == "legacy" else window_features)(df)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rows = []
+    for n_rows in [100_000, 1_000_000, 5_000_000]:
+        for n_groups in [265, 50_000]:
+            for engine in ["legacy", "window"]:
+                result = run_isolated(case_features, engine=engine, n_rows=n_rows, n_groups=n_groups)
+                rows.append({"engine": engine, "n_rows": n_rows, "n_groups": n_groups, **result})
+    print_table(rows)
@@ -0,0 +1,50 @@
+"""
+Scaling benchmark of the parallel bootstrap engines from 1 to 32 workers.
+
+Also checks that every worker count returns the same result for the same seed.
+
+    python -m benchmarks.bench_parallel_bootstrap
+"""
+import time
+
+import bootstrap_python as bp
+from benchmarks.generators import make_column, make_groups
+from benchmarks.common import print_table, run_isolated
+
+WORKERS = [1, 2, 4, 8, 16, 32]
+
+
+def case_parallel_grouped(n: int, n_groups: int, B: int, n_jobs: int) -> float:
+    df = make_groups(n, n_groups, skew=1.0)
+    start = time.perf_counter()
+    bp.parallel_scalable_bootstrap(df, "value", ["group"], B, n_jobs=n_jobs, seed=0)
+    return time.perf_counter() - start
+
+
+def case_parallel_single(n: int, B: int, n_jobs: int) -> float:
+    data = make_column(n)
+    start = time.perf_counter()
+    bp.parallel_bootstrap(data, "value", B, n_jobs=n_jobs, seed=0)
+    return time.perf_counter() - start
+
+
+def check_reproducible(n_jobs: list[int]) -> bool:
+    df = make_groups(50_000, 500, skew=1.0)
+    results = [bp.parallel_scalable_bootstrap(df, "value", ["group"], 200, n_jobs=j, seed=0, max_memory_mb=4) for j in n_jobs]
+    return all(results[0].equals(result) for result in results[1:])
+
+
+def main():
+    print(f"bit-identical across {WORKERS[:3]} workers: {check_reproducible(WORKERS[:3])}")
+    rows = []
+    for n_jobs in WORKERS:
+        result = run_isolated(case_parallel_grouped, n=2_000_000, n_groups=5_000, B=1_000, n_jobs=n_jobs)
+        rows.append({"engine": "parallel_scalable_bootstrap", "n_jobs": n_jobs, **result})
+    for n_jobs in WORKERS:
+        result = run_isolated(case_parallel_single, n=1_000_000, B=1_000, n_jobs=n_jobs)
+        rows.append({"engine": "parallel_bootstrap", "n_jobs": n_jobs, **result})
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
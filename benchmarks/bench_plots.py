@@ -0,0 +1,50 @@
+"""
+Render-time benchmark of make_subplots: every seaborn call on the raw rows (backend="seaborn") against the summaries
+of the aggregate backend, from pandas and from DuckDB.
+
+    python -m benchmarks.bench_plots
+"""
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import seaborn as sns  # noqa: E402
+
+import make_subplots as ms  # noqa: E402
+from benchmarks.common import print_table, run_isolated  # noqa: E402
+from benchmarks.generators import make_kpis  # noqa: E402
+
+KPIS = ["avg_weekly_gfv", "avg_weekly_frequency", "avg_weekly_incentivized_rate", "avg_weekly_incentives", "avg_weekly_customer_fees"]
+CHARTS = [
+    ms.Chart(sns.histplot, {"bins": 10, "kde": True}),
+    ms.Chart(sns.rugplot, {"color": "red", "height": 0.1, "alpha": 0.5}),
+]
+
+
+def case_render(backend: str, n_rows: int, n_jobs: int = 1) -> float:
+    data = make_kpis(n_rows)
+    connection = None
+    if backend == "duckdb":
+        import duckdb
+
+        connection = duckdb.connect()
+        connection.execute("CREATE TABLE kpis AS SELECT * FROM data")
+        data = "kpis"
+    start = time.perf_counter()
+    ms.make_subplots(CHARTS, data, KPIS, backend="seaborn" if backend == "seaborn" else "aggregate", n_jobs=n_jobs, seed=0, connection=connection)
+    plt.gcf().canvas.draw()
+    plt.close("all")
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rows = []
+    for n_rows in [100_000, 1_000_000, 5_000_000, 20_000_000]:
+        for backend, n_jobs in [("seaborn", 1), ("aggregate", 1), ("aggregate", 4), ("duckdb", 4)]:
+            if backend == "seaborn" and n_rows > 1_000_000:
+                continue
+            result = run_isolated(case_render, backend=backend, n_rows=n_rows, n_jobs=n_jobs)
+            rows.append({"backend": backend, "n_jobs": n_jobs, "n_rows": n_rows, **result})
+    print_table(rows)
@@ -0,0 +1,86 @@
+"""
+Benchmark of the lag feature engine against the per-lag window shifts get_time_lags used to run,
+of the incremental update against a full recompute, and of the eager parquet -> parquet path
+against the streaming one.
+
+    python -m benchmarks.bench_polars_lags
+"""
+import os
+import tempfile
+import time
+
+import polars as pl
+
+import polars_utils as pu
+from benchmarks.common import print_table, run_isolated
+from benchmarks.generators import make_hourly_pickups
+
+
+
+def legacy_time_lags(df: pl.DataFrame, n_lags: list[int]) -> pl.DataFrame:
+    """The row-based shifts get_time_lags used to run, one sort per lag."""
+    return (
+        df
+        .with_columns([
+            pl.col("num_pickup").sort_by(["pickup_location_id", "pickup_datetime_hour"]).shift(i).over("pickup_location_id").alias(f"num_pickup_{i}d_ago") for i in n_lags
+        ])
+        .drop_nulls()
+    )
+
+
+def case_lags(engine: str, n_days: int, n_lags: int) -> float:
+    df = make_hourly_pickups(n_days)
+    lags = list(range(1, n_lags + 1))
+    start = time.perf_counter()
+    if engine == "legacy":
+        legacy_time_lags(df, lags)
+    else:
+        pu.get_time_lags(df, lags)
+    return time.perf_counter() - start
+
+
+def case_update(engine: str, n_days: int) -> float:
+    """Features of the last hour, from the full history or from the cached tail."""
+    df = make_hourly_pickups(n_days)
+    last = df["pickup_datetime_hour"].max()
+    history = df.filter(pl.col("pickup_datetime_hour") < last)
+    new_rows = df.filter(pl.col("pickup_datetime_hour") == last)
+    lags, windows = [1, 2, 24, 168], [24, 168]
+    tail = pu.get_lag_tail(history, max(lags + windows))
+    start = time.perf_counter()
+    if engine == "full":
+        pu.build_lag_features(pl.concat([history, new_rows]), lags, windows).filter(pl.col("pickup_datetime_hour") == last)
+    else:
+        pu.update_lag_features(new_rows, tail, lags, windows)
+    return time.perf_counter() - start
+
+
+def case_parquet(engine: str, source: str, n_lags: int) -> float:
+    """Reads the hourly pickups, builds the lags and writes them, eagerly or streaming."""
+    lags = list(range(1, n_lags + 1))
+    with tempfile.TemporaryDirectory() as directory:
+        destination = os.path.join(directory, "features.parquet")
+        start = time.perf_counter()
+        if engine == "eager":
+            pu.get_time_lags(pl.read_parquet(source), lags).write_parquet(destination)
+        else:
+            pu.stream_time_lags(source, destination, lags)
+        return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rows = []
+    for n_lags in [1, 8, 24, 168]:
+        for engine in ["legacy", "engine"]:
+            result = run_isolated(case_lags, engine=engine, n_days=90, n_lags=n_lags)
+            rows.append({"case": "get_time_lags", "engine": engine, "n_lags": n_lags, **result})
+    for engine in ["full", "incremental"]:
+        result = run_isolated(case_update, engine=engine, n_days=90)
+        rows.append({"case": "last hour", "engine": engine, **result})
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "pickup_hourly.parquet")
+        make_hourly_pickups(365).write_parquet(source)
+        for engine in ["eager", "streaming"]:
+            result = run_isolated(case_parquet, engine=engine, source=source, n_lags=24)
+            rows.append({"case": "parquet, 1 year", "engine": engine, "n_lags": 24, **result})
+    print_table(rows)
@@ -0,0 +1,55 @@
+"""
+Benchmark of the profiling engine against the first EDA pass it replaces: df.isnull().mean(),
+pandas_utils.get_unique_val_col (nunique one column at a time) and df.describe() for min/max/mean/quantiles.
+
+    python -m benchmarks.bench_profile
+"""
+import os
+import tempfile
+import time
+
+import eda_utils as eu
+import pandas_utils as pu
+from benchmarks.common import print_table, run_isolated
+from benchmarks.generators import make_wide_frame
+
+
+def case_profile(engine: str, n_rows: int, n_cols: int, **kwargs) -> float:
+    df = make_wide_frame(n_rows, n_cols)
+    start = time.perf_counter()
+    if engine == "legacy":
+        df.isnull().mean()
+        pu.get_unique_val_col(df)
+        df.describe(percentiles=eu.PROFILE_QUANTILES)
+    else:
+        eu.profile_dataframe(df, **kwargs)
+    return time.perf_counter() - start
+
+
+def case_profile_parquet(path: str, **kwargs) -> float:
+    start = time.perf_counter()
+    eu.profile_parquet(path, **kwargs)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n_rows, n_cols = 1_000_000, 50
+    cases = [
+        ("legacy", {}),
+        ("profile", {"cardinality": "exact"}),
+        ("profile", {"cardinality": "hll"}),
+        ("profile", {"cardinality": "hll", "n_jobs": 4}),
+        ("profile", {"cardinality": "hll", "sample": 0.1, "seed": 0}),
+    ]
+    rows = []
+    for engine, kwargs in cases:
+        result = run_isolated(case_profile, engine=engine, n_rows=n_rows, n_cols=n_cols, **kwargs)
+        rows.append({"engine": engine, **kwargs, **result})
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "wide.parquet")
+        make_wide_frame(n_rows, n_cols).to_parquet(path)
+        for backend in ["duckdb", "polars"]:
+            for cardinality in ["exact", "hll"]:
+                result = run_isolated(case_profile_parquet, path=path, backend=backend, cardinality=cardinality)
+                rows.append({"engine": f"parquet/{backend}", "cardinality": cardinality, **result})
+    print_table(rows)
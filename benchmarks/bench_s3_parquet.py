@@ -0,0 +1,60 @@
+"""
+Peak memory and wall time of shipping a DataFrame to S3 as parquet: BytesIO + put_object_bucket
+against the streaming S3Connector.write_parquet. Runs on moto's in-process S3, which keeps the
+uploaded objects in the same process, so the stored bytes are part of the peak RSS of both engines.
+
+    python -m benchmarks.bench_s3_parquet
+"""
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import print_table, run_isolated
+
+BUCKET = "bench-s3-parquet"
+
+
+def make_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "pickup_location_id": rng.integers(0, 265, n),
+        "year": rng.choice([2022, 2023, 2024], n),
+        "num_pickup": rng.poisson(20, n),
+        "fare": rng.exponential(15, n),
+    })
+
+
+def case_write(n: int, engine: str) -> float:
+    from moto import mock_aws
+
+    from s3_connector import S3Connector
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        s3 = S3Connector()
+        s3.client.create_bucket(Bucket=BUCKET)
+        df = make_frame(n)
+        start = time.perf_counter()
+        if engine == "bytesio":
+            buffer = BytesIO()
+            df.to_parquet(buffer)
+            s3.put_object_bucket(BUCKET, buffer, "bytesio/data.parquet")
+        else:
+            s3.write_parquet(df, BUCKET, "streaming", partition_cols=["year"])
+        return time.perf_counter() - start
+
+
+def main():
+    rows = []
+    for n in [1_000_000, 5_000_000]:
+        for engine in ["bytesio", "write_parquet"]:
+            rows.append({"engine": engine, "n": n, **run_isolated(case_write, n=n, engine=engine)})
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Throughput benchmark of the S3Connector transfer layer.
+
+Runs against moto's in-process S3 by default. Set S3_ENDPOINT_URL (plus the usual AWS
+credentials) to benchmark a real endpoint or a local stand-in such as a moto server.
+
+    python -m benchmarks.bench_s3_transfer
+"""
+import contextlib
+import os
+import tempfile
+import time
+from io import BytesIO
+
+from benchmarks.common import print_table
+from s3_connector import MB, S3Connector
+
+BUCKET = "bench-s3-connector"
+
+
+def sequential_put(s3: S3Connector, files: dict[str, str]) -> None:
+    """One object at a time through a new Bucket resource and a full copy of the bytes, as
+    put_object_bucket used to do."""
+    for key, path in files.items():
+        with open(path, "rb") as f:
+            body = BytesIO(f.read())
+        s3._s3.Bucket(BUCKET).put_object(Body=body.getvalue(), Key=key)
+
+
+def make_files(directory: str, n_files: int, size: int) -> dict[str, str]:
+    files = {}
+    for i in range(n_files):
+        path = os.path.join(directory, f"part-{i:05d}.parquet")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        files[f"bench/{n_files}x{size}/part-{i:05d}.parquet"] = path
+    return files
+
+
+def main():
+    endpoint_url = os.environ.get("S3_ENDPOINT_URL")
+    if endpoint_url is None:
+        from moto import mock_aws
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+        mock = mock_aws()
+    else:
+        mock = contextlib.nullcontext()
+
+    rows = []
+    with mock, tempfile.TemporaryDirectory() as tmp:
+        s3 = S3Connector(endpoint_url=endpoint_url, max_workers=16)
+        s3.client.create_bucket(Bucket=BUCKET)
+        for n_files, size in [(500, 64 * 1024), (50, 4 * MB), (2, 100 * MB)]:
+            files = make_files(tmp, n_files, size)
+            total_mb = n_files * size / MB
+            cases = [
+                ("sequential put_object", lambda: sequential_put(s3, files)),
+                ("upload_many", lambda: s3.upload_many(files, BUCKET)),
+                ("download_many", lambda: s3.download_many(BUCKET, list(files), os.path.join(tmp, "download"))),
+            ]
+            for name, run in cases:
+                start = time.perf_counter()
+                run()
+                seconds = time.perf_counter() - start
+                rows.append({
+                    "operation": name, "n_files": n_files, "file_mb": size / MB,
+                    "seconds": seconds, "mb_per_second": total_mb / seconds,
+                })
+            for path in files.values():
+                os.remove(path)
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark of the instrumentation overhead: the instrumented helpers with tracing off, on with no exporter and on with
+the JSON lines exporter, plus the cost per call of the tracing primitives.
+
+    python -m benchmarks.bench_tracing
+"""
+import os
+import tempfile
+import time
+
+import duckdb
+
+from benchmarks.common import print_table, run_isolated
+from benchmarks.generators import make_column, make_groups, make_hourly_files
+
+
+def configure(tracing: str, directory: str) -> None:
+    import cache_utils
+    import trace_utils
+
+    cache_utils.configure_cache(enabled=False)
+    if tracing == "off":
+        trace_utils.configure_tracing(enabled=False)
+    elif tracing == "on":
+        trace_utils.configure_tracing([])
+    else:
+        trace_utils.configure_tracing([f"jsonl:{os.path.join(directory, 'trace.jsonl')}"])
+
+
+def case_helper(helper: str, tracing: str) -> float:
+    import bootstrap_python as bp
+    import duckdb_utils as du
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure(tracing, directory)
+        if helper == "chunked_bootstrap":
+            # a small budget, so many chunks and timed blocks
+            data = make_column(200_000)
+            call = lambda: bp.chunked_bootstrap(data, "value", 1_000, max_memory_mb=4)
+        elif helper == "scalable_vectorize_bootstrap":
+            data = make_groups(1_000_000, 10_000)
+            call = lambda: bp.scalable_vectorize_bootstrap(data, "value", ["group"], 200, max_memory_mb=32)
+        else:
+            files = make_hourly_files(directory, 500)
+            connection = duckdb.connect()
+            connection.execute("""
+                CREATE TABLE pickup_hourly (
+                    key BIGINT PRIMARY KEY, pickup_datetime_hour TIMESTAMP, pickup_location_id BIGINT, num_pickup BIGINT
+                )
+            """)
+            call = lambda: du.upsert_parquet_files(connection, files, "pickup_hourly", ["key"], ["num_pickup"], batch_files=10)
+        start = time.perf_counter()
+        call()
+        return time.perf_counter() - start
+
+
+def time_primitive(call, n: int = 1_000_000) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        call()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def primitive_rows() -> list[dict]:
+    import trace_utils as tu
+
+    def timed_block():
+        with tu.timed("block"):
+            pass
+
+    def span_block():
+        with tu.span("block"):
+            pass
+
+    rows = []
+    for tracing in ["off", "on"]:
+        tu.configure_tracing([], enabled=tracing == "on", memory=False)
+        with tu.span("parent"):
+            for name, call in [("count", lambda: tu.count("rows", 10)), ("timed", timed_block), ("span", span_block)]:
+                rows.append({"primitive": name, "tracing": tracing, "ns_per_call": time_primitive(call, 200_000)})
+    return rows
+
+
+if __name__ == "__main__":
+    rows = []
+    for helper in ["chunked_bootstrap", "scalable_vectorize_bootstrap", "upsert_parquet_files"]:
+        for tracing in ["off", "on", "jsonl"]:
+            rows.append({"helper": helper, "tracing": tracing, **run_isolated(case_helper, helper=helper, tracing=tracing)})
+    print_table(rows)
+    print()
+    print_table(primitive_rows())
@@ -0,0 +1,67 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Every case runs in a freshly spawned process so the peak RSS of one case
+does not leak into the next one. Run the scripts from the repo root, e.g.
+`python -m benchmarks.bench_bootstrap`.
+"""
+import multiprocessing as mp
+import resource
+import sys
+import time
+
+
+def _peak_rss_mb() -> float:
+    # the largest of this process and its (finished) children, e.g. pool workers
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # linux reports KB, macOS reports bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _worker(queue, func, kwargs):
+    try:
+        start = time.perf_counter()
+        seconds = func(**kwargs)
+        if seconds is None:
+            seconds = time.perf_counter() - start
+        queue.put({"seconds": seconds, "peak_rss_mb": _peak_rss_mb(), "error": None})
+    except MemoryError as e:
+        queue.put({"seconds": None, "peak_rss_mb": _peak_rss_mb(), "error": repr(e)})
+
+
+def run_isolated(func: callable, **kwargs) -> dict:
+    """Runs func(**kwargs) in a spawned process and measures wall time and peak RSS.
+
+    'func' must be importable (defined at module level) and builds its own input data, so the
+    data is part of the peak RSS. If it returns a number, that is taken as the timed section
+    (to leave the data setup out of the wall time); otherwise the whole call is timed.
+    Returns a dict with seconds, peak_rss_mb and error.
+    """
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_worker, args=(queue, func, kwargs))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return {"seconds": None, "peak_rss_mb": None, "error": f"exit code {process.exitcode}"}
+    return queue.get()
+
+
+def print_table(rows: list[dict]) -> None:
+    """Prints a list of dicts as an aligned text table."""
+    if not rows:
+        return
+    columns = list(dict.fromkeys(c for row in rows for c in row))
+    widths = {c: max(len(c), *(len(_fmt(r.get(c))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c)).ljust(widths[c]) for c in columns))
+
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return "" if value is None else str(value)
@@ -0,0 +1,130 @@
+"""
+Synthetic data generators shared by the benchmark scripts and the regression suite. All of them are seeded,
+so the same parameters always give the same data.
+"""
+import datetime as dt
+import os
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    import polars as pl
+
+N_LOCATIONS = 265
+
+
+def make_column(n: int, seed: int = 0) -> pd.DataFrame:
+    """A single skewed 'value' column."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"value": rng.exponential(10, n)})
+
+
+def make_groups(n: int, n_groups: int, skew: float = 0.0, seed: int = 0) -> pd.DataFrame:
+    """n rows spread over n_groups. With skew=0 the groups have similar sizes, higher values
+    follow a Zipf-like law where group k gets a share proportional to 1 / (k + 1) ** skew."""
+    rng = np.random.default_rng(seed)
+    shares = 1 / np.arange(1, n_groups + 1) ** skew
+    group = rng.choice(n_groups, size=n, p=shares / shares.sum())
+    return pd.DataFrame({"group": group, "value": rng.exponential(10, n)})
+
+
+def make_hourly_frame(n_rows: int, n_groups: int, seed: int = 0) -> pd.DataFrame:
+    """Shuffled hourly pickups of n_groups locations, as a pandas frame."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "pickup_location_id": rng.integers(0, n_groups, n_rows),
+        "pickup_datetime_hour": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.permutation(n_rows), unit="h"),
+        "num_pickup": rng.poisson(20, n_rows),
+    })
+
+
+def make_transform_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Trips with a date, three partially null fares to coalesce, counts, low-cardinality strings and an id."""
+    rng = np.random.default_rng(seed)
+    columns = {
+        "trip_id": np.arange(n_rows),
+        "pickup_datetime": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, n_rows), unit="s"),
+        "pickup_location_id": rng.integers(1, 266, n_rows),
+        "passenger_count": rng.integers(0, 7, n_rows),
+        "trip_distance": rng.exponential(3, n_rows).round(2),
+        "num_pickup": rng.poisson(20, n_rows).astype(float),
+        "payment_type": rng.choice(["card", "cash", "no_charge", "dispute"], n_rows).astype(object),
+        "borough": pd.Series(rng.choice(["Manhattan", "Queens", "Brooklyn", "Bronx", "Staten Island"], n_rows), dtype="str"),
+    }
+    for i, null_rate in enumerate([0.5, 0.3, 0.1]):
+        fare = rng.gamma(2, 8, n_rows)
+        fare[rng.random(n_rows) < null_rate] = np.nan
+        columns[f"fare_{i}"] = fare
+    return pd.DataFrame(columns)
+
+
+def make_hourly_pickups(n_days: int, seed: int = 0, missing: float = 0.05) -> "pl.DataFrame":
+    """Hourly pickups per location, shuffled, with a fraction of the hours missing, as a polars frame."""
+    import polars as pl
+
+    rng = np.random.default_rng(seed)
+    hours = pl.datetime_range(dt.datetime(2024, 1, 1), dt.datetime(2024, 1, 1) + dt.timedelta(days=n_days), "1h", eager=True, closed="left")
+    df = pl.DataFrame({
+        "pickup_location_id": np.repeat(np.arange(N_LOCATIONS), len(hours)),
+        "pickup_datetime_hour": pl.concat([hours] * N_LOCATIONS),
+        "num_pickup": rng.poisson(20, N_LOCATIONS * len(hours)),
+    })
+    return df.sample(fraction=1 - missing, seed=seed, shuffle=True)
+
+
+def make_hourly_files(directory: str, n_hours: int, seed: int = 0) -> list[str]:
+    """One parquet file per hour with a row per pickup location, keyed by hour and location."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-01")
+    files = []
+    for hour in range(n_hours):
+        location = np.arange(N_LOCATIONS)
+        path = os.path.join(directory, f"pickup_hourly_{hour:05d}.parquet")
+        pd.DataFrame({
+            "key": hour * N_LOCATIONS + location,
+            "pickup_datetime_hour": start + pd.Timedelta(hours=hour),
+            "pickup_location_id": location,
+            "num_pickup": rng.poisson(20, N_LOCATIONS),
+        }).to_parquet(path)
+        files.append(path)
+    return files
+
+
+def make_wide_frame(n_rows: int, n_cols: int, seed: int = 0) -> pd.DataFrame:
+    """Numeric columns of different cardinalities with 10% nulls, and a few string columns."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for i in range(n_cols):
+        if i % 10 == 9:
+            columns[f"cat_{i}"] = pd.Series(rng.integers(0, 1000, n_rows)).astype(str)
+        else:
+            values = rng.integers(0, 10 ** (1 + i % 6), n_rows).astype(float)
+            values[rng.random(n_rows) < 0.1] = np.nan
+            columns[f"num_{i}"] = values
+    return pd.DataFrame(columns)
+
+
+def make_covariates(n_rows: int, n_numeric: int, n_categorical: int, seed: int = 0) -> pd.DataFrame:
+    """A normal target with numeric covariates correlated to it and binned categorical covariates."""
+    rng = np.random.default_rng(seed)
+    target = rng.normal(size=n_rows)
+    columns = {"target": target}
+    for i in range(n_numeric):
+        columns[f"num_{i}"] = target * rng.random() + rng.normal(size=n_rows)
+    for i in range(n_categorical):
+        columns[f"cat_{i}"] = pd.Categorical(np.digitize(target + rng.normal(size=n_rows), np.linspace(-2, 2, 5 + i)).astype(str))
+    return pd.DataFrame(columns)
+
+
+def make_kpis(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Weekly KPI columns with the skewed shapes of the GFV frames."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "avg_weekly_gfv": rng.lognormal(3, 1, n_rows),
+        "avg_weekly_frequency": rng.poisson(3, n_rows).astype(float),
+        "avg_weekly_incentivized_rate": rng.beta(2, 5, n_rows),
+        "avg_weekly_incentives": rng.exponential(5, n_rows),
+        "avg_weekly_customer_fees": rng.gamma(2, 2, n_rows),
+    })
@@ -0,0 +1,332 @@
+"""
+Benchmark and regression suite of the compute helpers.
+
+Every case runs in its own process (see common.run_isolated) on seeded synthetic data (see generators) and records
+wall time and peak RSS. The results are written as JSON and can be compared with a stored baseline, any case slower
+or bigger than the baseline beyond the tolerances is flagged and the exit status is 1.
+
+    python -m benchmarks.suite --scale quick --save-baseline benchmarks/results/baseline.json
+    python -m benchmarks.suite --scale quick --baseline benchmarks/results/baseline.json
+    python -m benchmarks.suite --suite bootstrap eda_utils --filter profile --repeat 3
+
+Baselines are machine specific, compare results of the same machine and scale only.
+"""
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+from benchmarks.common import print_table, run_isolated
+from benchmarks.generators import (
+    make_column, make_covariates, make_groups, make_hourly_files, make_hourly_frame, make_hourly_pickups,
+    make_wide_frame,
+)
+
+SUITES = ["bootstrap", "pandas_utils", "polars_utils", "duckdb_utils", "eda_utils"]
+SCALES = ["quick", "full"]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+@dataclass
+class Case:
+    suite:str
+    func:callable
+    params:dict = field(default_factory=dict)
+
+    @property
+    def id(self) -> str:
+        params = ",".join(f"{key}={value}" for key, value in self.params.items() if key != "helper")
+        return f"{self.suite}.{self.params['helper']}[{params}]"
+
+
+def disable_cache() -> None:
+    """The suite measures the computations, not the result cache."""
+    import cache_utils
+
+    cache_utils.configure_cache(enabled=False)
+
+
+def case_bootstrap(helper: str, n: int, B: int, **kwargs) -> float:
+    import bootstrap_python as bp
+
+    disable_cache()
+    data = make_column(n)
+    start = time.perf_counter()
+    getattr(bp, helper)(data, "value", B, **kwargs)
+    return time.perf_counter() - start
+
+
+def case_grouped_bootstrap(helper: str, n: int, n_groups: int, B: int, **kwargs) -> float:
+    import bootstrap_python as bp
+
+    disable_cache()
+    data = make_groups(n, n_groups, skew=1.0)
+    start = time.perf_counter()
+    getattr(bp, helper)(data, "value", ["group"], B, **kwargs)
+    return time.perf_counter() - start
+
+
+def case_pandas_utils(helper: str, n_rows: int, n_groups: int) -> float:
+    import pandas_utils as pu
+
+    df = make_hourly_frame(n_rows, n_groups)
+    args = (df, "pickup_location_id", "pickup_datetime_hour")
+    start = time.perf_counter()
+    if helper == "lead_window":
+        pu.lead_window(*args, "num_pickup", 24)
+    elif helper == "row_number":
+        pu.row_number(*args)
+    elif helper == "Window":
+        window = pu.Window(*args)
+        window.lag("num_pickup", [1, 2, 24, 168])
+        window.row_number()
+        window.rolling("num_pickup", 24)
+        window.cumsum("num_pickup")
+    elif helper == "normalize_by_colum":
+        pu.normalize_by_colum(df, ["num_pickup"], "pickup_location_id")
+    return time.perf_counter() - start
+
+
+def case_polars_utils(helper: str, n_days: int, n_lags: int) -> float:
+    import polars_utils as plu
+
+    disable_cache()
+    df = make_hourly_pickups(n_days)
+    lags = list(range(1, n_lags + 1))
+    start = time.perf_counter()
+    if helper == "get_time_lags":
+        plu.get_time_lags(df, lags)
+    elif helper == "build_lag_features":
+        plu.build_lag_features(df, lags, rolling_windows=[24, 168])
+    elif helper == "row_number":
+        plu.row_number(df, "pickup_location_id", "pickup_datetime_hour")
+    return time.perf_counter() - start
+
+
+def case_duckdb_utils(helper: str, n_files: int) -> float:
+    import duckdb
+
+    import duckdb_utils as du
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = make_hourly_files(directory, n_files)
+        connection = duckdb.connect()
+        connection.execute("ATTACH ':memory:' AS dwh")
+        connection.execute("""
+            CREATE TABLE dwh.main.pickup_hourly (
+                key BIGINT PRIMARY KEY,
+                pickup_datetime_hour TIMESTAMP,
+                pickup_location_id BIGINT,
+                num_pickup BIGINT
+            )
+        """)
+        start = time.perf_counter()
+        if helper == "upsert_data_from_parquet":
+            for path in files:
+                du.upsert_data_from_parquet(connection, path)
+        elif helper == "upsert_parquet_files":
+            du.upsert_parquet_files(connection, files, "dwh.main.pickup_hourly", ["key"], ["num_pickup"], manifest_table=False)
+        return time.perf_counter() - start
+
+
+def case_eda_utils(helper: str, n_rows: int, n_cols: int) -> float:
+    import eda_utils as eu
+
+    disable_cache()
+    if helper in ("get_correlations", "rank_covariates"):
+        df = make_covariates(n_rows, n_cols, 2)
+    else:
+        df = make_wide_frame(n_rows, n_cols)
+    start = time.perf_counter()
+    if helper == "profile_dataframe":
+        eu.profile_dataframe(df)
+    elif helper == "check_nulls":
+        with contextlib.redirect_stdout(io.StringIO()):
+            eu.check_nulls(df, list(df.columns[:5]))
+    elif helper == "get_correlations":
+        eu.get_correlations(df, "target")
+    elif helper == "rank_covariates":
+        eu.rank_covariates(df, "target", [col for col in df.columns if col != "target"])
+    return time.perf_counter() - start
+
+
+def get_cases(scale: str = "quick") -> list[Case]:
+    """The grid of every suite, rows / groups / B, small enough for every commit with "quick"."""
+    quick = scale == "quick"
+    cases = []
+
+    sizes = [(10_000, 1_000), (100_000, 500)] if quick else [(100_000, 1_000), (1_000_000, 1_000), (5_000_000, 200)]
+    for n, B in sizes:
+        cases += [
+            Case("bootstrap", case_bootstrap, {"helper": "vectorized_bootstrap", "n": n, "B": B}),
+            Case("bootstrap", case_bootstrap, {"helper": "chunked_bootstrap", "n": n, "B": B}),
+            Case("bootstrap", case_bootstrap, {"helper": "weighted_bootstrap", "n": n, "B": B, "method": "poisson"}),
+        ]
+    groups = [(100_000, 100, 200), (100_000, 10_000, 200)] if quick else [(1_000_000, 100, 1_000), (1_000_000, 50_000, 1_000), (5_000_000, 1_000, 500)]
+    for n, n_groups, B in groups:
+        cases += [
+            Case("bootstrap", case_grouped_bootstrap, {"helper": "scalable_vectorize_bootstrap", "n": n, "n_groups": n_groups, "B": B}),
+            Case("bootstrap", case_grouped_bootstrap, {"helper": "grouped_weighted_bootstrap", "n": n, "n_groups": n_groups, "B": B, "method": "poisson"}),
+        ]
+
+    frames = [(100_000, 265), (100_000, 10_000)] if quick else [(1_000_000, 265), (1_000_000, 50_000), (5_000_000, 265)]
+    for n_rows, n_groups in frames:
+        for helper in ["lead_window", "row_number", "Window", "normalize_by_colum"]:
+            cases.append(Case("pandas_utils", case_pandas_utils, {"helper": helper, "n_rows": n_rows, "n_groups": n_groups}))
+
+    lags = [(30, 24)] if quick else [(90, 24), (365, 24), (365, 168)]
+    for n_days, n_lags in lags:
+        for helper in ["get_time_lags", "build_lag_features", "row_number"]:
+            cases.append(Case("polars_utils", case_polars_utils, {"helper": helper, "n_days": n_days, "n_lags": n_lags}))
+
+    for n_files in ([50] if quick else [200, 2_000]):
+        for helper in ["upsert_data_from_parquet", "upsert_parquet_files"]:
+            cases.append(Case("duckdb_utils", case_duckdb_utils, {"helper": helper, "n_files": n_files}))
+
+    wide = [(100_000, 20)] if quick else [(1_000_000, 50), (5_000_000, 50)]
+    for n_rows, n_cols in wide:
+        for helper in ["profile_dataframe", "check_nulls", "get_correlations", "rank_covariates"]:
+            cases.append(Case("eda_utils", case_eda_utils, {"helper": helper, "n_rows": n_rows, "n_cols": n_cols}))
+    return cases
+
+
+def get_metadata(scale: str) -> dict:
+    versions = {}
+    for module in ["numpy", "pandas", "polars", "duckdb", "pyarrow"]:
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+        "scale": scale,
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def run_suite(cases: list[Case], repeat: int = 1, verbose: bool = True) -> dict:
+    """Runs every case 'repeat' times, keeps the fastest time and the largest peak RSS."""
+    results = {}
+    for case in cases:
+        runs = [run_isolated(case.func, **case.params) for _ in range(repeat)]
+        times = [run["seconds"] for run in runs if run["seconds"] is not None]
+        memory = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+        errors = [run["error"] for run in runs if run["error"] is not None]
+        results[case.id] = {
+            "suite": case.suite,
+            "params": case.params,
+            "seconds": min(times) if times else None,
+            "seconds_all": times,
+            "peak_rss_mb": max(memory) if memory else None,
+            "error": errors[0] if errors else None,
+        }
+        if verbose:
+            result = results[case.id]
+            print(f"{case.id}: {result['seconds'] if result['error'] is None else result['error']}", file=sys.stderr)
+    return results
+
+
+def compare(results: dict, baseline: dict, time_tolerance: float = 0.2, memory_tolerance: float = 0.2, min_seconds: float = 0.05, min_memory_mb: float = 20) -> list[dict]:
+    """
+    Compares the results with the baseline case by case. A case is a regression if it fails and didn't, or if its time
+    (memory) is over the baseline by more than the tolerance, a fraction, and by more than min_seconds (min_memory_mb),
+    so the noise of tiny cases isn't flagged. Cases only in one of them are "new" or "missing".
+    """
+    rows = []
+    for case_id in dict.fromkeys([*results, *baseline]):
+        current, base = results.get(case_id), baseline.get(case_id)
+        row = {"case": case_id, "seconds": None, "baseline_seconds": None, "time_ratio": None, "peak_rss_mb": None, "baseline_rss_mb": None, "memory_ratio": None}
+        if base is None:
+            rows.append({**row, "seconds": current["seconds"], "peak_rss_mb": current["peak_rss_mb"], "status": "new"})
+            continue
+        if current is None:
+            rows.append({**row, "baseline_seconds": base["seconds"], "baseline_rss_mb": base["peak_rss_mb"], "status": "missing"})
+            continue
+        row.update(seconds=current["seconds"], baseline_seconds=base["seconds"], peak_rss_mb=current["peak_rss_mb"], baseline_rss_mb=base["peak_rss_mb"])
+        if current["error"] is not None:
+            row["status"] = "error" if base["error"] is not None else "REGRESSION"
+            rows.append(row)
+            continue
+        if base["error"] is not None or base["seconds"] is None:
+            row["status"] = "fixed"
+            rows.append(row)
+            continue
+        row["time_ratio"] = current["seconds"] / base["seconds"] if base["seconds"] else None
+        row["memory_ratio"] = current["peak_rss_mb"] / base["peak_rss_mb"] if base["peak_rss_mb"] else None
+        slower = current["seconds"] > base["seconds"] * (1 + time_tolerance) and current["seconds"] - base["seconds"] > min_seconds
+        bigger = current["peak_rss_mb"] > base["peak_rss_mb"] * (1 + memory_tolerance) and current["peak_rss_mb"] - base["peak_rss_mb"] > min_memory_mb
+        faster = current["seconds"] < base["seconds"] / (1 + time_tolerance) and base["seconds"] - current["seconds"] > min_seconds
+        row["status"] = "REGRESSION" if slower or bigger else "faster" if faster else "ok"
+        rows.append(row)
+    return rows
+
+
+def write_results(path: str, metadata: dict, results: dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"metadata": metadata, "results": results}, file, indent=2, default=str)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=SUITES, help="suites to run, all by default")
+    parser.add_argument("--scale", choices=SCALES, default="quick", help="size of the grids")
+    parser.add_argument("--filter", default=None, help="only the cases whose id contains this text")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest is kept")
+    parser.add_argument("--output", default=None, help="results JSON, benchmarks/results/<timestamp>.json by default")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare with")
+    parser.add_argument("--save-baseline", default=None, help="also write the results to this baseline path")
+    parser.add_argument("--time-tolerance", type=float, default=0.2, help="allowed slowdown, as a fraction")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed peak RSS increase, as a fraction")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in get_cases(args.scale) if case.suite in args.suite and (args.filter is None or args.filter in case.id)]
+    metadata = get_metadata(args.scale)
+    results = run_suite(cases, args.repeat)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{metadata['timestamp'].replace(':', '')}.json")
+    write_results(output, metadata, results)
+    if args.save_baseline:
+        write_results(args.save_baseline, metadata, results)
+    print(f"results written to {output}", file=sys.stderr)
+
+    if args.baseline is None:
+        print_table([{"case": case_id, **{key: result[key] for key in ("seconds", "peak_rss_mb", "error")}} for case_id, result in results.items()])
+        return 0
+    baseline = load_results(args.baseline)
+    if baseline["metadata"].get("scale") != args.scale:
+        print(f"warning: the baseline was run with --scale {baseline['metadata'].get('scale')}", file=sys.stderr)
+    # Only the cases that were selected in this run are compared
+    selected = {case_id: result for case_id, result in baseline["results"].items() if result["suite"] in args.suite and (args.filter is None or args.filter in case_id)}
+    rows = compare(results, selected, args.time_tolerance, args.memory_tolerance)
+    print_table(rows)
+    regressions = [row for row in rows if row["status"] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,23 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, asdict
-import numpy as np
-import pandas as pd
+import time
+from multiprocessing import shared_memory
+from statistics import NormalDist
+from typing import Iterable
+if __package__:
+    from .cache_utils import cached
+    from .lazy_utils import lazy_import
+    from .trace_utils import count, timed, traced
+else:
+    from cache_utils import cached
+    from lazy_utils import lazy_import
+    from trace_utils import count, timed, traced
+
+np = lazy_import("numpy", "numpy")
+pd = lazy_import("pandas", "pandas")
+
+BOOTSTRAP_METHODS = ["index", "multinomial", "poisson"]
 
 @dataclass
 class BootstrapStatistics:
@@ -11,6 +28,11 @@ class BootstrapStatistics:
     def asdict(self):
         return asdict(self)
 
+@dataclass
+class AdaptiveBootstrapStatistics(BootstrapStatistics):
+    B:int
+    converged:bool
+
 def get_bootstrap_indexes(n:int, B:int) -> np.ndarray:
     """Creates an array of Bxn where each row represent
     a random number between 0 and n. For the bootstrapp sampling,
@@ -34,11 +56,13 @@ def calculate_CIs(means:np.ndarray, CIs:list[int]=[2.5, 97.5]) -> BootstrapStati
     Returns:
         BootstrapStatistics: _description_
     """
-    low_ci, high_ci = np.percentile(means, CIs)
-    mean = np.mean(means)
+    with timed("bootstrap.percentiles"):
+        low_ci, high_ci = np.percentile(means, CIs)
+        mean = np.mean(means)
     return BootstrapStatistics(mean, low_ci, high_ci)
 
-def vectorized_bootstrap(data:pd.DataFrame, column:str, B:int, CIs:list[int]=[2.5, 97.5]) -> BootstrapStatistics:
+@traced
+def vectorized_bootstrap(data:pd.DataFrame, column:str, B:int, CIs:list[int]=[2.5, 97.5], method:str="index") -> BootstrapStatistics:
     """
     Performs a Bootstrap resampling using Numpy's broadcasting and Advanced Indexing.
     The function calculates the mean of a specific column in the DataFrame 'data' by leveraging
@@ -50,6 +74,8 @@ def vectorized_bootstrap(data:pd.DataFrame, column:str, B:int, CIs:list[int]=[2.
         B (int): The number of bootstrap iterations to perform.
         CIs (list[int], optional): A list of two values representing the lower and upper percentiles
                                    for the confidence interval. Defaults to [2.5, 97.5].
+        method (str, optional): "index" resamples rows with advanced indexing. "multinomial" and "poisson"
+                                use resample weights instead, see 'weighted_bootstrap'. Defaults to "index".
 
     Returns:
         BootstrapStatistics: An object containing the bootstrap statistics, including the mean and the
@@ -75,13 +101,94 @@ def vectorized_bootstrap(data:pd.DataFrame, column:str, B:int, CIs:list[int]=[2.
         The result is an object of type 'BootstrapStatistics' containing the bootstrap mean and the
         confidence interval of the mean.
     """
-    bootstrap_idx = get_bootstrap_indexes(data.shape[0], B)
-    values = np.tile(data[column].values[np.newaxis, :], (B,1))
-    means = values[np.arange(B)[:, np.newaxis], bootstrap_idx].mean(axis=1)
-    # means = samples.mean(axis=1)
+    check_method(method)
+    if method != "index":
+        return weighted_bootstrap(data, column, B, CIs, method=method)
+
+    count("bootstrap.rows", data.shape[0])
+    count("bootstrap.replicates", B)
+    with timed("bootstrap.indexes"):
+        bootstrap_idx = get_bootstrap_indexes(data.shape[0], B)
+    with timed("bootstrap.gather"):
+        values = np.tile(data[column].values[np.newaxis, :], (B,1))
+        samples = values[np.arange(B)[:, np.newaxis], bootstrap_idx]
+    with timed("bootstrap.means"):
+        means = samples.mean(axis=1)
     stats = calculate_CIs(means)
     return stats
 
+def get_chunk_size(n:int, B:int, itemsize:int, max_memory_mb:float=256) -> int:
+    """Number of bootstrap replicates that fit in a memory budget.
+
+    Each replicate needs one row of int64 indexes plus one row of gathered values,
+    so a chunk of b replicates costs b * n * (8 + itemsize) bytes.
+
+    Args:
+        n (int): Number of observations in the column.
+        B (int): Total number of bootstrap iterations.
+        itemsize (int): Size in bytes of a single value of the column.
+        max_memory_mb (float, optional): Memory budget for the working buffers. Defaults to 256.
+
+    Returns:
+        int: The chunk size, between 1 and B.
+    """
+    bytes_per_replicate = n * (np.dtype(np.int64).itemsize + itemsize)
+    chunk_size = int(max_memory_mb * 1024**2 // max(bytes_per_replicate, 1))
+    return int(min(max(chunk_size, 1), B))
+
+@traced
+def chunked_bootstrap(data:pd.DataFrame, column:str, B:int, CIs:list[int]=[2.5, 97.5], max_memory_mb:float=256) -> BootstrapStatistics:
+    """
+    Performs a Bootstrap resampling in chunks of B so the working memory stays under 'max_memory_mb'.
+    It is a drop-in replacement of 'vectorized_bootstrap' for large columns.
+
+    Args:
+        data (pd.DataFrame): The input DataFrame containing the data to be resampled.
+        column (str): The name of the column in 'data' for which the bootstrap resampling will be performed.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): A list of two values representing the lower and upper percentiles
+                                   for the confidence interval. Defaults to [2.5, 97.5].
+        max_memory_mb (float, optional): Memory budget, in MB, for the index and gather buffers. Defaults to 256.
+
+    Returns:
+        BootstrapStatistics: An object containing the bootstrap statistics, including the mean and the
+                             confidence interval of the mean.
+
+    Description:
+        'vectorized_bootstrap' materializes three (B, N) arrays at once: the tiled column, the random
+        indexes and the gathered samples. Here the column is never tiled, the values are gathered directly
+        from the 1-D array with 'np.take', and only 'chunk_size' replicates are alive at any time
+        (see 'get_chunk_size'). The gather buffer is allocated once and reused for every chunk, gathered
+        with mode="clip" because np.take copies 'out' through a temporary with the default mode="raise"
+        (the indexes are always in range). The index array can't be reused: numpy only draws integers
+        into new arrays (randint and Generator.integers have no 'out'), and drawing them through floats
+        would change the stream. It is freed before the next draw instead, so only one is alive.
+
+        The indexes are drawn chunk by chunk from the global numpy random state, which yields the same
+        stream as a single (B, N) draw. Therefore, with the same seed, the result is identical to
+        'vectorized_bootstrap'.
+    """
+    values = data[column].to_numpy()
+    n = values.shape[0]
+    chunk_size = get_chunk_size(n, B, values.dtype.itemsize, max_memory_mb)
+    count("bootstrap.rows", n)
+    count("bootstrap.replicates", B)
+
+    samples = np.empty((chunk_size, n), dtype=values.dtype)
+    means = np.empty(B, dtype=np.float64)
+    for start in range(0, B, chunk_size):
+        stop = min(start + chunk_size, B)
+        buffer = samples[:stop - start]
+        with timed("bootstrap.indexes"):
+            idx = get_bootstrap_indexes(n, stop - start)
+        with timed("bootstrap.gather"):
+            np.take(values, idx, out=buffer, mode="clip")
+        del idx
+        with timed("bootstrap.means"):
+            means[start:stop] = buffer.mean(axis=1)
+    stats = calculate_CIs(means, CIs)
+    return stats
+
 def comprehension_list_bootstrap(data:pd.DataFrame, column:str, B:int, CIs:list[int]=[2.5, 97.5]) -> BootstrapStatistics:
     """
     Performs a Bootstrap resampling using list comprehension.
@@ -123,9 +230,11 @@ def comprehension_list_bootstrap(data:pd.DataFrame, column:str, B:int, CIs:list[
     return stats
 
 
-def scalable_vectorize_bootstrap(df: pd.DataFrame, column: str, granularity: list[str], B: int, CIs: list[int] = [2.5, 97.5]) -> pd.DataFrame:
+def apply_vectorize_bootstrap(df: pd.DataFrame, column: str, granularity: list[str], B: int, CIs: list[int] = [2.5, 97.5]) -> pd.DataFrame:
     """
-    Perform a scalable Bootstrap resampling using vectorization for statistical inference on a DataFrame.
+    Original row-wise implementation of 'scalable_vectorize_bootstrap', kept as a reference for
+    benchmarks. It holds the (B, N) tiled matrix of every group at once and runs 'DataFrame.apply'
+    row by row, so prefer 'scalable_vectorize_bootstrap'.
 
     Args:
         df (pd.DataFrame): The input DataFrame containing the data to be resampled.
@@ -139,7 +248,7 @@ def scalable_vectorize_bootstrap(df: pd.DataFrame, column: str, granularity: lis
         pd.DataFrame: A DataFrame containing Bootstrap statistics for each group specified in 'granularity'.
 
     Description:
-        The scalable_vectorize_bootstrap function performs a Bootstrap resampling on the
+        The apply_vectorize_bootstrap function performs a Bootstrap resampling on the
         specified column of the input DataFrame 'df' for each group specified in the 'granularity' list.
         The Bootstrap resampling technique is used to estimate the sampling distribution of a statistic
         (in this case, the mean) by repeatedly resampling with replacement from the original data.
@@ -159,7 +268,6 @@ def scalable_vectorize_bootstrap(df: pd.DataFrame, column: str, granularity: lis
         'calculate_CIs' function. The results are returned in a DataFrame containing the group identifiers
         specified in 'granularity', along with the Bootstrap statistics including mean, lower CI, and upper CI.
     """
-    
     # get the indexes for the bootstrap
     idx = (
         df
@@ -200,3 +308,889 @@ def scalable_vectorize_bootstrap(df: pd.DataFrame, column: str, granularity: lis
 
     return final_table
 
+
+
+@cached(columns=lambda args: [args["column"], *args["granularity"]], random=True)
+@traced
+def scalable_vectorize_bootstrap(df: pd.DataFrame, column: str, granularity: list[str], B: int, CIs: list[int] = [2.5, 97.5], method: str = "index", max_memory_mb: float = 256) -> pd.DataFrame:
+    """
+    Perform a scalable Bootstrap resampling using vectorization for statistical inference on a DataFrame.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame containing the data to be resampled.
+        column (str): The name of the column in 'df' for which the bootstrap resampling will be performed.
+        granularity (list[str]): A list of columns that act as a partition for the bootstrap algorithm.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): A list of two values representing the lower and upper percentiles
+                                   for the confidence interval. Defaults to [2.5, 97.5].
+        method (str, optional): "index" resamples rows with advanced indexing. "multinomial" and "poisson"
+                                use resample weights instead, see 'grouped_weighted_bootstrap'. Defaults to "index".
+        max_memory_mb (float, optional): Memory budget, in MB, for the index and gather buffers. Defaults to 256.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing Bootstrap statistics for each group specified in 'granularity'.
+
+    Description:
+        The scalable_vectorize_bootstrap function performs a Bootstrap resampling on the
+        specified column of the input DataFrame 'df' for each group specified in the 'granularity' list.
+        The Bootstrap resampling technique is used to estimate the sampling distribution of a statistic
+        (in this case, the mean) by repeatedly resampling with replacement from the original data.
+
+        The rows are sorted once by group (see 'get_group_offsets'), so each group is the contiguous
+        slice values[offsets[g]:offsets[g + 1]], like a CSR matrix. Groups are then processed in batches
+        whose (B, rows) buffers fit in 'max_memory_mb' (see 'get_group_batches'). For a batch, a single
+        'np.random.randint' call draws the indexes of every group, each one bounded by the size of
+        its group and shifted by its offset. The values are gathered from the 1-D sorted column and
+        'np.add.reduceat' sums every group segment at once, so the means of all the groups in the batch
+        come from one vectorized reduction. A group too large for the budget gets a batch of its own,
+        resampled in chunks of B.
+
+        Finally, the confidence intervals are computed with 'np.percentile' along the replicates axis
+        for all groups of the batch. The results are returned in a DataFrame containing the group
+        identifiers specified in 'granularity', along with the Bootstrap statistics including mean,
+        lower CI, and upper CI.
+
+        With use_cache=True, results are cached on the content of 'column' and 'granularity', the arguments and the
+        numpy random state (see cache_utils.cached): a rerun after the same np.random.seed is a lookup.
+    """
+    check_method(method)
+    if method != "index":
+        return grouped_weighted_bootstrap(df, column, granularity, B, CIs, method=method, max_memory_mb=max_memory_mb)
+
+    with timed("bootstrap.sort"):
+        values, offsets, keys = get_group_offsets(df, column, granularity)
+    batches = get_group_batches(np.diff(offsets), B, max_memory_mb)
+    count("bootstrap.rows", values.shape[0])
+    count("bootstrap.groups", keys.shape[0])
+    count("bootstrap.batches", len(batches))
+    count("bootstrap.replicates", B * keys.shape[0])
+    stats = [
+        bootstrap_group_batch(values, offsets, first, last, B, CIs, max_memory_mb)
+        for first, last in batches
+    ]
+    final_table = concat_group_stats(keys, stats)
+    return final_table
+
+def concat_group_stats(keys:pd.DataFrame, stats:list[pd.DataFrame]) -> pd.DataFrame:
+    """The keys of the groups next to the stats of their batches, an empty table when there are no groups."""
+    if not stats:
+        stats = [pd.DataFrame({"mean": [], "low_ci": [], "high_ci": []})]
+    return pd.concat([keys, pd.concat(stats, ignore_index=True)], axis=1)
+
+def check_B(B:int) -> None:
+    if B < 1:
+        raise ValueError(f"B must be at least 1, got {B}")
+
+def bootstrap_group_batch(values:np.ndarray, offsets:np.ndarray, first:int, last:int, B:int, CIs:list[int]=[2.5, 97.5], max_memory_mb:float=256, rng:np.random.Generator=None) -> pd.DataFrame:
+    """Bootstraps the mean of the groups first to last - 1 of a sorted column (see 'get_group_offsets').
+
+    Args:
+        values (np.ndarray): The values sorted by group.
+        offsets (np.ndarray): The (G + 1, ) group offsets.
+        first (int): First group of the batch.
+        last (int): Last group of the batch, excluded.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): The lower and upper percentiles. Defaults to [2.5, 97.5].
+        max_memory_mb (float, optional): Memory budget for the index and gather buffers. Defaults to 256.
+        rng (np.random.Generator, optional): Source of the random indexes. Defaults to the global numpy state.
+
+    Returns:
+        pd.DataFrame: One row per group with mean, low_ci and high_ci.
+    """
+    means = group_bootstrap_means(values, offsets[first:last], np.diff(offsets[first:last + 1]), B, max_memory_mb, rng)
+    with timed("bootstrap.percentiles"):
+        low_ci, high_ci = np.percentile(means, CIs, axis=0)
+    return pd.DataFrame({"mean": means.mean(axis=0), "low_ci": low_ci, "high_ci": high_ci})
+
+def group_bootstrap_means(values:np.ndarray, starts:np.ndarray, sizes:np.ndarray, B:int, max_memory_mb:float=256, rng:np.random.Generator=None) -> np.ndarray:
+    """(B, G) bootstrap means of the groups values[starts[g]:starts[g] + sizes[g]].
+
+    The groups do not need to be adjacent, so any subset of the groups of 'get_group_offsets' works.
+    """
+    row_offsets = np.repeat(starts, sizes)
+    row_sizes = np.repeat(sizes, sizes)
+    segments = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    randint = np.random.randint if rng is None else rng.integers
+
+    chunk_size = get_chunk_size(row_sizes.shape[0], B, values.dtype.itemsize, max_memory_mb)
+    means = np.empty((B, sizes.shape[0]), dtype=np.float64)
+    for start in range(0, B, chunk_size):
+        stop = min(start + chunk_size, B)
+        # a scalar bound is much faster than a broadcast one, and large groups come alone
+        high = sizes[0] if sizes.shape[0] == 1 else row_sizes
+        with timed("bootstrap.indexes"):
+            idx = randint(0, high, (stop - start, row_sizes.shape[0]))
+            idx += row_offsets
+        with timed("bootstrap.gather"):
+            samples = np.take(values, idx)
+        with timed("bootstrap.means"):
+            means[start:stop] = np.add.reduceat(samples, segments, axis=1) / sizes
+    return means
+
+def get_group_offsets(df:pd.DataFrame, column:str, granularity:list[str]) -> tuple[np.ndarray, np.ndarray, pd.DataFrame]:
+    """Sorts 'column' by group so every group is a contiguous slice of the values.
+
+    Rows with null keys are dropped, as 'groupby' does.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, pd.DataFrame]: The sorted values, the (G + 1, ) offsets where
+        group g is values[offsets[g]:offsets[g + 1]] and the G group keys.
+    """
+    codes, keys = get_group_codes(df, granularity)
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    values = df[column].to_numpy()[order]
+    offsets = np.searchsorted(codes[order], np.arange(keys.shape[0] + 1))
+    return values, offsets, keys
+
+def get_group_batches(sizes:np.ndarray, B:int, max_memory_mb:float=256) -> list[tuple[int, int]]:
+    """Splits consecutive groups into batches whose (B, rows) index and gather buffers fit in 'max_memory_mb'.
+
+    A group larger than the budget is a batch on its own.
+
+    Returns:
+        list[tuple[int, int]]: (first, last) group positions of every batch, last excluded.
+    """
+    max_rows = max(int(max_memory_mb * 1024**2 // (B * 2 * np.dtype(np.int64).itemsize)), 1)
+    cumulative = np.cumsum(sizes)
+    batches = []
+    first = 0
+    while first < sizes.shape[0]:
+        rows_before = cumulative[first - 1] if first else 0
+        last = max(int(np.searchsorted(cumulative, rows_before + max_rows, side="right")), first + 1)
+        batches.append((first, last))
+        first = last
+    return batches
+
+###########################################################
+# Weights-based bootstrap
+#
+# For the mean there is no need to materialize the resampled rows: a resample
+# is fully described by how many times each row was drawn. With those counts
+# (weights) the bootstrap mean is sum(w * x) / sum(w).
+#  - multinomial: the counts of drawing n rows with replacement, i.e. the
+#    exact same distribution as the "index" method.
+#  - poisson: every row gets an independent Poisson(1) weight. It approximates
+#    the multinomial for large n and, since rows are independent, it can be
+#    computed in a single streaming pass over the data.
+###########################################################
+
+def check_method(method:str) -> None:
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError(f"method must be one of {BOOTSTRAP_METHODS}, got {method!r}")
+
+def multinomial_bootstrap_means(values:np.ndarray, B:int, max_memory_mb:float=256) -> np.ndarray:
+    """Bootstrap means from multinomial resample counts.
+
+    The (b, n) counts matrix is drawn in chunks that fit in 'max_memory_mb' and reduced
+    with a matrix product against the values.
+
+    Args:
+        values (np.ndarray): 1-D array with the data.
+        B (int): The number of bootstrap iterations to perform.
+        max_memory_mb (float, optional): Memory budget for the counts matrix. Defaults to 256.
+
+    Returns:
+        np.ndarray: A (B, ) array with the bootstrap means.
+    """
+    n = values.shape[0]
+    values = values.astype(np.float64, copy=False)
+    pvals = np.full(n, 1 / n)
+    chunk_size = get_chunk_size(n, B, 0, max_memory_mb)
+    means = np.empty(B, dtype=np.float64)
+    for start in range(0, B, chunk_size):
+        stop = min(start + chunk_size, B)
+        with timed("bootstrap.weights"):
+            counts = np.random.multinomial(n, pvals, size=stop - start)
+        with timed("bootstrap.means"):
+            np.matmul(counts, values, out=means[start:stop])
+    return means / n
+
+def poisson_bootstrap_sums(chunks:Iterable[np.ndarray], B:int) -> tuple[np.ndarray, np.ndarray]:
+    """Accumulates sum(w * x) and sum(w) with Poisson(1) weights over a stream of chunks.
+
+    Only one chunk and two (B, ) accumulators are in memory at any time, so the data can
+    be larger than RAM, e.g. 'pyarrow.parquet.ParquetFile.iter_batches'.
+
+    Args:
+        chunks (Iterable[np.ndarray]): 1-D arrays with consecutive pieces of the data.
+        B (int): The number of bootstrap iterations to perform.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The (B, ) weighted sums and the (B, ) sums of weights.
+    """
+    weighted_sums = np.zeros(B, dtype=np.float64)
+    weights_sums = np.zeros(B, dtype=np.float64)
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        count("bootstrap.rows", chunk.shape[0])
+        with timed("bootstrap.weights"):
+            weights = np.random.poisson(1.0, size=(B, chunk.shape[0]))
+        with timed("bootstrap.means"):
+            weighted_sums += weights @ chunk
+            weights_sums += weights.sum(axis=1)
+    return weighted_sums, weights_sums
+
+def iter_chunks(values:np.ndarray, chunk_rows:int) -> Iterable[np.ndarray]:
+    for start in range(0, values.shape[0], chunk_rows):
+        yield values[start:start + chunk_rows]
+
+def get_chunk_rows(B:int, max_memory_mb:float=256) -> int:
+    """Rows per chunk so a (B, rows) weights matrix plus its products fit in 'max_memory_mb'."""
+    bytes_per_row = B * 3 * np.dtype(np.float64).itemsize
+    return max(int(max_memory_mb * 1024**2 // bytes_per_row), 1)
+
+def streaming_poisson_bootstrap(chunks:Iterable[np.ndarray], B:int, CIs:list[int]=[2.5, 97.5]) -> BootstrapStatistics:
+    """
+    Performs a Poisson bootstrap of the mean in a single pass over a stream of chunks.
+
+    Args:
+        chunks (Iterable[np.ndarray]): 1-D arrays with consecutive pieces of the data.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): A list of two values representing the lower and upper percentiles
+                                   for the confidence interval. Defaults to [2.5, 97.5].
+
+    Returns:
+        BootstrapStatistics: An object containing the bootstrap statistics, including the mean and the
+                             confidence interval of the mean.
+    """
+    weighted_sums, weights_sums = poisson_bootstrap_sums(chunks, B)
+    means = weighted_sums / weights_sums
+    return calculate_CIs(means, CIs)
+
+@traced
+def weighted_bootstrap(data:pd.DataFrame, column:str, B:int, CIs:list[int]=[2.5, 97.5], method:str="multinomial", max_memory_mb:float=256) -> BootstrapStatistics:
+    """
+    Performs a Bootstrap of the mean using resample weights instead of resampled rows.
+
+    Args:
+        data (pd.DataFrame): The input DataFrame containing the data to be resampled.
+        column (str): The name of the column in 'data' for which the bootstrap resampling will be performed.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): A list of two values representing the lower and upper percentiles
+                                   for the confidence interval. Defaults to [2.5, 97.5].
+        method (str, optional): "multinomial" or "poisson". Defaults to "multinomial".
+        max_memory_mb (float, optional): Memory budget for the weights matrix. Defaults to 256.
+
+    Returns:
+        BootstrapStatistics: An object containing the bootstrap statistics, including the mean and the
+                             confidence interval of the mean.
+    """
+    values = data[column].to_numpy()
+    count("bootstrap.replicates", B)
+    if method == "multinomial":
+        count("bootstrap.rows", values.shape[0])
+        means = multinomial_bootstrap_means(values, B, max_memory_mb)
+        return calculate_CIs(means, CIs)
+    if method == "poisson":
+        chunks = iter_chunks(values, get_chunk_rows(B, max_memory_mb))
+        return streaming_poisson_bootstrap(chunks, B, CIs)
+    raise ValueError(f"method must be 'multinomial' or 'poisson', got {method!r}")
+
+def get_group_codes(df:pd.DataFrame, granularity:list[str]) -> tuple[np.ndarray, pd.DataFrame]:
+    """Integer code of the group of every row and the group keys, ordered by code.
+
+    Rows whose keys contain nulls get the code -1, as they are dropped by 'groupby'.
+    """
+    grouped = df.groupby(granularity, sort=True)
+    codes = grouped.ngroup().to_numpy()
+    keys = grouped.size().reset_index()[granularity]
+    return codes, keys
+
+@traced
+def grouped_weighted_bootstrap(df:pd.DataFrame, column:str, granularity:list[str], B:int, CIs:list[int]=[2.5, 97.5], method:str="poisson", max_memory_mb:float=256) -> pd.DataFrame:
+    """
+    Performs a Bootstrap of the mean for every group in 'granularity' using resample weights.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame containing the data to be resampled.
+        column (str): The name of the column in 'df' for which the bootstrap resampling will be performed.
+        granularity (list[str]): A list of columns that act as a partition for the bootstrap algorithm.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): A list of two values representing the lower and upper percentiles
+                                   for the confidence interval. Defaults to [2.5, 97.5].
+        method (str, optional): "multinomial" or "poisson". Defaults to "poisson".
+        max_memory_mb (float, optional): Memory budget for the weights matrix. Defaults to 256.
+
+    Returns:
+        pd.DataFrame: Same output as 'scalable_vectorize_bootstrap', the columns in 'granularity' plus
+                      mean, low_ci and high_ci.
+
+    Description:
+        The rows are sorted once by group (see 'get_group_offsets'), so every group is a contiguous
+        slice of the values.
+
+        With "poisson" the sorted values are processed in row chunks: a (rows, B) Poisson(1) weights
+        matrix is drawn for the chunk and 'np.add.reduceat' sums w * x and w for every group in the
+        chunk into (G, B) accumulators. The whole table is bootstrapped in one pass whatever the number
+        of groups. Resamples where a group got a total weight of 0 (likely for very small groups)
+        are discarded for that group.
+
+        With "multinomial" every group draws its own (B, size) counts matrix, which is exact but loops
+        over the groups.
+    """
+    with timed("bootstrap.sort"):
+        values, offsets, keys = get_group_offsets(df, column, granularity)
+    values = values.astype(np.float64, copy=False)
+    n_groups = keys.shape[0]
+    count("bootstrap.rows", values.shape[0])
+    count("bootstrap.groups", n_groups)
+    count("bootstrap.replicates", B * n_groups)
+
+    if method == "multinomial":
+        group_means = [
+            multinomial_bootstrap_means(values[offsets[g]:offsets[g + 1]], B, max_memory_mb)
+            for g in range(n_groups)
+        ]
+    elif method == "poisson":
+        weighted_sums = np.zeros((n_groups, B), dtype=np.float64)
+        weights_sums = np.zeros((n_groups, B), dtype=np.float64)
+        chunk_rows = get_chunk_rows(B, max_memory_mb)
+        for start in range(0, values.shape[0], chunk_rows):
+            stop = min(start + chunk_rows, values.shape[0])
+            # groups overlapping the chunk and where each one starts within it
+            first = np.searchsorted(offsets, start, side="right") - 1
+            last = np.searchsorted(offsets, stop, side="left")
+            chunk_groups = np.arange(first, last)
+            starts = np.maximum(offsets[first:last], start) - start
+            with timed("bootstrap.weights"):
+                weights = np.random.poisson(1.0, size=(stop - start, B)).astype(np.float64)
+            with timed("bootstrap.means"):
+                weights_sums[chunk_groups] += np.add.reduceat(weights, starts, axis=0)
+                weights *= values[start:stop, np.newaxis]
+                weighted_sums[chunk_groups] += np.add.reduceat(weights, starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            all_means = weighted_sums / weights_sums
+        group_means = [means[weights_sums[g] > 0] for g, means in enumerate(all_means)]
+    else:
+        raise ValueError(f"method must be 'multinomial' or 'poisson', got {method!r}")
+
+    stats = pd.DataFrame([calculate_CIs(means, CIs).asdict() for means in group_means])
+    return pd.concat([keys, stats], axis=1)
+
+
+###########################################################
+# Parallel bootstrap
+#
+# The work is split into tasks that do not depend on the number of workers:
+# batches of groups (see 'get_group_batches') or blocks of B. Task i draws
+# from its own generator, seeded with SeedSequence(seed).spawn(...)[i], so
+# the result is bit-identical whatever 'n_jobs' is. The input arrays are put
+# in shared memory once and every worker attaches to them instead of
+# receiving a pickled copy of the DataFrame.
+###########################################################
+
+class SharedArrays:
+    """Copies numpy arrays into shared memory blocks, to be used as a context manager.
+
+    'specs' is a small picklable description that 'attach_shared_arrays' uses
+    to map the same memory in another process.
+    """
+    def __init__(self, arrays:dict[str, np.ndarray]):
+        self.blocks = {}
+        self.specs = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks[name] = block
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+
+# arrays attached by the current worker process
+_worker_arrays = {}
+
+def attach_shared_arrays(specs:dict[str, tuple]) -> None:
+    """Pool initializer: maps the shared arrays described by 'specs' into '_worker_arrays'."""
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_arrays[name] = (block, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+def get_task_rng(seed:int, task:int) -> np.random.Generator:
+    """Generator of a task, equal to the one of SeedSequence(seed).spawn(task + 1)[task]."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(task,)))
+
+def group_batch_task(task:int, first:int, last:int, B:int, CIs:list[int], max_memory_mb:float, seed:int) -> pd.DataFrame:
+    values = _worker_arrays["values"][1]
+    offsets = _worker_arrays["offsets"][1]
+    return bootstrap_group_batch(values, offsets, first, last, B, CIs, max_memory_mb, get_task_rng(seed, task))
+
+def block_means_task(task:int, B:int, max_memory_mb:float, seed:int) -> np.ndarray:
+    values = _worker_arrays["values"][1]
+    rng = get_task_rng(seed, task)
+    n = values.shape[0]
+    chunk_size = get_chunk_size(n, B, values.dtype.itemsize, max_memory_mb)
+    means = np.empty(B, dtype=np.float64)
+    for start in range(0, B, chunk_size):
+        stop = min(start + chunk_size, B)
+        means[start:stop] = np.take(values, rng.integers(0, n, (stop - start, n))).mean(axis=1)
+    return means
+
+def run_tasks(arrays:dict[str, np.ndarray], func:callable, tasks:list[tuple], n_jobs:int) -> list:
+    """Runs func(*task) for every task with 'arrays' available to the workers, keeping the task order."""
+    if not tasks:
+        return []
+    with SharedArrays(arrays) as shared:
+        if n_jobs == 1:
+            attach_shared_arrays(shared.specs)
+            try:
+                return [func(*task) for task in tasks]
+            finally:
+                for block, _ in _worker_arrays.values():
+                    block.close()
+                _worker_arrays.clear()
+        with ProcessPoolExecutor(n_jobs, initializer=attach_shared_arrays, initargs=(shared.specs,)) as pool:
+            return list(pool.map(func, *zip(*tasks)))
+
+def parallel_bootstrap(data:pd.DataFrame, column:str, B:int, CIs:list[int]=[2.5, 97.5], n_jobs:int=None, seed:int=None, block_size:int=100, max_memory_mb:float=256) -> BootstrapStatistics:
+    """
+    Performs the Bootstrap of 'vectorized_bootstrap' splitting B into blocks run in a process pool.
+
+    Args:
+        data (pd.DataFrame): The input DataFrame containing the data to be resampled.
+        column (str): The name of the column in 'data' for which the bootstrap resampling will be performed.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): A list of two values representing the lower and upper percentiles
+                                   for the confidence interval. Defaults to [2.5, 97.5].
+        n_jobs (int, optional): Number of worker processes. Defaults to None, which uses all cores.
+        seed (int, optional): Root seed. The same seed gives the same result for any 'n_jobs'.
+                              Defaults to None, fresh entropy.
+        block_size (int, optional): Bootstrap iterations per task. Defaults to 100.
+        max_memory_mb (float, optional): Memory budget of the buffers of each worker. Defaults to 256.
+
+    Returns:
+        BootstrapStatistics: An object containing the bootstrap statistics, including the mean and the
+                             confidence interval of the mean.
+    """
+    check_B(B)
+    seed = np.random.SeedSequence(seed).entropy
+    tasks = [
+        (task, min(block_size, B - start), max_memory_mb, seed)
+        for task, start in enumerate(range(0, B, block_size))
+    ]
+    values = data[column].to_numpy()
+    means = run_tasks({"values": values}, block_means_task, tasks, n_jobs)
+    return calculate_CIs(np.concatenate(means), CIs)
+
+def parallel_scalable_bootstrap(df:pd.DataFrame, column:str, granularity:list[str], B:int, CIs:list[int]=[2.5, 97.5], n_jobs:int=None, seed:int=None, max_memory_mb:float=256) -> pd.DataFrame:
+    """
+    Performs the Bootstrap of 'scalable_vectorize_bootstrap' splitting the groups across a process pool.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame containing the data to be resampled.
+        column (str): The name of the column in 'df' for which the bootstrap resampling will be performed.
+        granularity (list[str]): A list of columns that act as a partition for the bootstrap algorithm.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): A list of two values representing the lower and upper percentiles
+                                   for the confidence interval. Defaults to [2.5, 97.5].
+        n_jobs (int, optional): Number of worker processes. Defaults to None, which uses all cores.
+        seed (int, optional): Root seed. The same seed gives the same result for any 'n_jobs'.
+                              Defaults to None, fresh entropy.
+        max_memory_mb (float, optional): Memory budget of the buffers of each worker, it also defines the
+                                         batches of groups. Defaults to 256.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing Bootstrap statistics for each group specified in 'granularity'.
+    """
+    check_B(B)
+    seed = np.random.SeedSequence(seed).entropy
+    values, offsets, keys = get_group_offsets(df, column, granularity)
+    tasks = [
+        (task, first, last, B, CIs, max_memory_mb, seed)
+        for task, (first, last) in enumerate(get_group_batches(np.diff(offsets), B, max_memory_mb))
+    ]
+    stats = run_tasks({"values": values, "offsets": offsets}, group_batch_task, tasks, n_jobs)
+    final_table = concat_group_stats(keys, stats)
+    return final_table
+
+
+###########################################################
+# Arbitrary statistics
+#
+# A Statistic bundles three vectorized functions over a (n, k) values array,
+# k being the number of columns the statistic needs (2 for a ratio):
+#  - resample(values, idx): the statistic of every row of a (b, n) index matrix.
+#  - estimate(values): the statistic on the original data.
+#  - jackknife(values): the (n, ) leave-one-out estimates, used by BCa.
+# Built-in statistics avoid full sorts (np.partition) and compute the
+# jackknife in O(n) from totals or prefix sums. Any other callable goes
+# through 'generic_statistic', which is correct but O(n^2) time for BCa,
+# in blocks of leave-one-out samples that fit in the memory budget.
+###########################################################
+
+INTERVALS = ["percentile", "bca"]
+
+@dataclass
+class Statistic:
+    name:str
+    resample:callable
+    estimate:callable
+    jackknife:callable
+
+def mean_statistic() -> Statistic:
+    def resample(values, idx):
+        return np.take(values[:, 0], idx).mean(axis=1)
+
+    def jackknife(values):
+        x = values[:, 0]
+        return (x.sum() - x) / (x.shape[0] - 1)
+
+    return Statistic("mean", resample, lambda values: values[:, 0].mean(), jackknife)
+
+def quantile_statistic(q:float) -> Statistic:
+    """Quantile with numpy's default linear interpolation, selected with np.partition."""
+    def select(samples, n):
+        position = (n - 1) * q
+        low = int(np.floor(position))
+        high = min(low + 1, n - 1)
+        part = np.partition(samples, [low, high], axis=-1)
+        return part[..., low] + (position - low) * (part[..., high] - part[..., low])
+
+    def resample(values, idx):
+        return select(np.take(values[:, 0], idx), idx.shape[1])
+
+    def jackknife(values):
+        x = np.sort(values[:, 0])
+        n = x.shape[0]
+        position = (n - 2) * q
+        low = int(np.floor(position))
+        # removing the element of rank r shifts down every element above r
+        rank = np.arange(n)
+        low_value = np.where(low < rank, x[low], x[min(low + 1, n - 1)])
+        high_value = np.where(low + 1 < rank, x[min(low + 1, n - 1)], x[min(low + 2, n - 1)])
+        loo = low_value + (position - low) * (high_value - low_value)
+        # back from rank order to the original row order
+        return loo[np.argsort(np.argsort(values[:, 0], kind="stable"), kind="stable")]
+
+    return Statistic(f"quantile_{q}", resample, lambda values: np.quantile(values[:, 0], q), jackknife)
+
+def median_statistic() -> Statistic:
+    statistic = quantile_statistic(0.5)
+    statistic.name = "median"
+    return statistic
+
+def trimmed_mean_statistic(proportion:float=0.1) -> Statistic:
+    """Mean after removing 'proportion' of the observations at each tail, as scipy.stats.trim_mean."""
+    def trimmed_mean(samples, n):
+        cut = int(proportion * n)
+        if cut == 0:
+            return samples.mean(axis=-1)
+        part = np.partition(samples, [cut, n - cut - 1], axis=-1)
+        return part[..., cut:n - cut].mean(axis=-1)
+
+    def resample(values, idx):
+        return trimmed_mean(np.take(values[:, 0], idx), idx.shape[1])
+
+    def jackknife(values):
+        order = np.argsort(values[:, 0], kind="stable")
+        x = values[order, 0]
+        n = x.shape[0]
+        cut = int(proportion * (n - 1))
+        first, last = cut, n - 1 - cut
+        prefix = np.concatenate([[0.0], np.cumsum(x)])
+        rank = np.arange(n)
+        # sum of the kept ranks [first, last) once the element of rank r is removed
+        sums = np.where(
+            rank >= last, prefix[last] - prefix[first],
+            np.where(rank < first, prefix[last + 1] - prefix[first + 1], prefix[last + 1] - prefix[first] - x)
+        )
+        loo = np.empty(n)
+        loo[order] = sums / (last - first)
+        return loo
+
+    return Statistic(
+        f"trimmed_mean_{proportion}", resample, lambda values: trimmed_mean(values[:, 0], values.shape[0]), jackknife
+    )
+
+def ratio_statistic() -> Statistic:
+    """Ratio of sums of two columns, e.g. revenue per order, from weighted sums of the resample counts."""
+    def resample(values, idx):
+        b, n = idx.shape
+        counts = np.bincount((idx + n * np.arange(b)[:, np.newaxis]).ravel(), minlength=b * n).reshape(b, n)
+        sums = counts @ values[:, :2]
+        return sums[:, 0] / sums[:, 1]
+
+    def jackknife(values):
+        numerator, denominator = values[:, 0], values[:, 1]
+        return (numerator.sum() - numerator) / (denominator.sum() - denominator)
+
+    return Statistic("ratio", resample, lambda values: values[:, 0].sum() / values[:, 1].sum(), jackknife)
+
+def generic_statistic(func:callable, vectorized:bool=False, max_memory_mb:float=256) -> Statistic:
+    """Wraps any statistic of a 1-D array.
+
+    If 'vectorized' is True, func must accept an 'axis' argument like numpy reductions (np.std, np.ptp...)
+    and every chunk of resamples is reduced in a single call. Otherwise func is applied row by row on each
+    gathered chunk. The jackknife builds the n leave-one-out samples in blocks that fit in 'max_memory_mb'.
+    """
+    def apply(samples):
+        if vectorized:
+            return func(samples, axis=-1)
+        return np.fromiter((func(row) for row in samples), dtype=np.float64, count=samples.shape[0])
+
+    def resample(values, idx):
+        return apply(np.take(values[:, 0], idx))
+
+    def jackknife(values):
+        x = values[:, 0]
+        n = x.shape[0]
+        positions = np.arange(n - 1)
+        block_size = get_chunk_size(n - 1, n, x.dtype.itemsize, max_memory_mb)
+        loo = np.empty(n, dtype=np.float64)
+        for start in range(0, n, block_size):
+            rows = np.arange(start, min(start + block_size, n))
+            # row i of the block is x without x[i]: positions from i on are shifted by one
+            leave_one_out = np.take(x, positions + (positions >= rows[:, np.newaxis]))
+            loo[start:start + rows.shape[0]] = apply(leave_one_out)
+        return loo
+
+    return Statistic(getattr(func, "__name__", "statistic"), resample, lambda values: float(func(values[:, 0])), jackknife)
+
+BUILTIN_STATISTICS = {
+    "mean": mean_statistic,
+    "median": median_statistic,
+    "quantile": quantile_statistic,
+    "trimmed_mean": trimmed_mean_statistic,
+    "ratio": ratio_statistic,
+}
+
+def get_statistic(statistic, max_memory_mb:float=256, **params) -> Statistic:
+    """Resolves a statistic given by name (see BUILTIN_STATISTICS, 'params' are passed to the factory),
+    as a Statistic or as a callable of a 1-D array, whose jackknife is bounded by 'max_memory_mb'."""
+    if isinstance(statistic, Statistic):
+        return statistic
+    if isinstance(statistic, str):
+        if statistic not in BUILTIN_STATISTICS:
+            raise ValueError(f"statistic must be one of {list(BUILTIN_STATISTICS)}, got {statistic!r}")
+        return BUILTIN_STATISTICS[statistic](**params)
+    if callable(statistic):
+        return generic_statistic(statistic, max_memory_mb=max_memory_mb, **params)
+    raise TypeError(f"statistic must be a name, a Statistic or a callable, got {type(statistic)}")
+
+def calculate_bca_CIs(replicates:np.ndarray, estimate:float, jackknife:np.ndarray, CIs:list[int]=[2.5, 97.5]) -> BootstrapStatistics:
+    """Calculates the bias-corrected and accelerated (BCa) CIs.
+
+    Args:
+        replicates (np.ndarray): The (B, ) bootstrap replicates of the statistic.
+        estimate (float): The statistic on the original data.
+        jackknife (np.ndarray): The (n, ) leave-one-out estimates of the statistic.
+        CIs (list[int], optional): The nominal lower and upper percentiles. Defaults to [2.5, 97.5].
+
+    Returns:
+        BootstrapStatistics: The mean of the replicates and the BCa interval.
+    """
+    normal = NormalDist()
+    proportion = np.mean(replicates < estimate)
+    # a proportion of 0 or 1 means an unbounded bias correction, clip it to the resolution of B
+    proportion = np.clip(proportion, 1 / (2 * len(replicates)), 1 - 1 / (2 * len(replicates)))
+    bias = normal.inv_cdf(proportion)
+    deviations = jackknife.mean() - jackknife
+    denominator = 6 * np.sum(deviations ** 2) ** 1.5
+    acceleration = np.sum(deviations ** 3) / denominator if denominator > 0 else 0.0
+    adjusted = []
+    for ci in CIs:
+        z = bias + normal.inv_cdf(ci / 100)
+        adjusted.append(100 * normal.cdf(bias + z / (1 - acceleration * z)))
+    low_ci, high_ci = np.percentile(replicates, adjusted)
+    return BootstrapStatistics(np.mean(replicates), low_ci, high_ci)
+
+def bootstrap_replicates(values:np.ndarray, B:int, statistic:Statistic, max_memory_mb:float=256, rng:np.random.Generator=None) -> np.ndarray:
+    """Computes B bootstrap replicates of 'statistic' over a (n, k) values array, drawing the
+    indexes in chunks that fit in 'max_memory_mb'."""
+    n = values.shape[0]
+    randint = np.random.randint if rng is None else rng.integers
+    chunk_size = get_chunk_size(n, B, values.dtype.itemsize, max_memory_mb)
+    replicates = np.empty(B, dtype=np.float64)
+    for start in range(0, B, chunk_size):
+        stop = min(start + chunk_size, B)
+        replicates[start:stop] = statistic.resample(values, randint(0, n, (stop - start, n)))
+    return replicates
+
+def get_confidence_interval(values:np.ndarray, replicates:np.ndarray, statistic:Statistic, CIs:list[int], interval:str) -> BootstrapStatistics:
+    if interval == "percentile":
+        return calculate_CIs(replicates, CIs)
+    if interval == "bca":
+        return calculate_bca_CIs(replicates, statistic.estimate(values), statistic.jackknife(values), CIs)
+    raise ValueError(f"interval must be one of {INTERVALS}, got {interval!r}")
+
+def bootstrap_statistic(data:pd.DataFrame, column:str | list[str], B:int, statistic="mean", CIs:list[int]=[2.5, 97.5], interval:str="percentile", max_memory_mb:float=256, **params) -> BootstrapStatistics:
+    """
+    Performs a Bootstrap resampling of any statistic.
+
+    Args:
+        data (pd.DataFrame): The input DataFrame containing the data to be resampled.
+        column (str | list[str]): The column(s) the statistic needs, e.g. ["revenue", "orders"] for "ratio".
+        B (int): The number of bootstrap iterations to perform.
+        statistic (str | Statistic | callable, optional): A name in BUILTIN_STATISTICS, a Statistic or a
+                                                          function of a 1-D array. Defaults to "mean".
+        CIs (list[int], optional): A list of two values representing the lower and upper percentiles
+                                   for the confidence interval. Defaults to [2.5, 97.5].
+        interval (str, optional): "percentile" or "bca". Defaults to "percentile".
+        max_memory_mb (float, optional): Memory budget, in MB, for the index and gather buffers. Defaults to 256.
+        **params: Passed to the statistic factory, e.g. q=0.9 for "quantile" or proportion=0.05 for
+                  "trimmed_mean".
+
+    Returns:
+        BootstrapStatistics: The mean of the bootstrap replicates of the statistic and its confidence interval.
+
+    Example:
+        bootstrap_statistic(orders, ["revenue", "orders"], 1000, statistic="ratio", interval="bca")
+    """
+    statistic = get_statistic(statistic, max_memory_mb, **params)
+    columns = [column] if isinstance(column, str) else column
+    values = data[columns].to_numpy(dtype=np.float64)
+    replicates = bootstrap_replicates(values, B, statistic, max_memory_mb)
+    return get_confidence_interval(values, replicates, statistic, CIs, interval)
+
+def grouped_bootstrap_statistic(df:pd.DataFrame, column:str | list[str], granularity:list[str], B:int, statistic="mean", CIs:list[int]=[2.5, 97.5], interval:str="percentile", max_memory_mb:float=256, **params) -> pd.DataFrame:
+    """
+    Performs 'bootstrap_statistic' for every group in 'granularity'.
+
+    Returns:
+        pd.DataFrame: Same layout as 'scalable_vectorize_bootstrap', the columns in 'granularity' plus
+                      mean, low_ci and high_ci.
+    """
+    statistic = get_statistic(statistic, max_memory_mb, **params)
+    columns = [column] if isinstance(column, str) else column
+    codes, keys = get_group_codes(df, granularity)
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    values = df[columns].to_numpy(dtype=np.float64)[order]
+    offsets = np.searchsorted(codes[order], np.arange(keys.shape[0] + 1))
+
+    stats = []
+    for g in range(keys.shape[0]):
+        group_values = values[offsets[g]:offsets[g + 1]]
+        replicates = bootstrap_replicates(group_values, B, statistic, max_memory_mb)
+        stats.append(get_confidence_interval(group_values, replicates, statistic, CIs, interval).asdict())
+    return pd.concat([keys, pd.DataFrame(stats)], axis=1)
+
+
+###########################################################
+# Adaptive bootstrap
+#
+# Replicates are drawn in batches of 'batch_size'. After every batch the CI
+# is recomputed and the bootstrap stops once both endpoints moved less than
+# 'tol' times the width of the interval for 'patience' batches in a row, or
+# when the replicate (max_B) or time (max_seconds) budget runs out.
+###########################################################
+
+def is_stable(low_ci:np.ndarray, high_ci:np.ndarray, previous_low:np.ndarray, previous_high:np.ndarray, tol:float) -> np.ndarray:
+    change = np.maximum(np.abs(low_ci - previous_low), np.abs(high_ci - previous_high))
+    return change <= tol * (high_ci - low_ci)
+
+def adaptive_bootstrap(data:pd.DataFrame, column:str | list[str], CIs:list[int]=[2.5, 97.5], statistic="mean", batch_size:int=100, tol:float=0.01, patience:int=2, min_B:int=200, max_B:int=10000, max_seconds:float=None, max_memory_mb:float=256, **params) -> AdaptiveBootstrapStatistics:
+    """
+    Performs a Bootstrap resampling that picks B by itself.
+
+    Args:
+        data (pd.DataFrame): The input DataFrame containing the data to be resampled.
+        column (str | list[str]): The column(s) the statistic needs, see 'bootstrap_statistic'.
+        CIs (list[int], optional): A list of two values representing the lower and upper percentiles
+                                   for the confidence interval. Defaults to [2.5, 97.5].
+        statistic (str | Statistic | callable, optional): See 'get_statistic'. Defaults to "mean".
+        batch_size (int, optional): Replicates drawn between two checks. Defaults to 100.
+        tol (float, optional): Largest move of the CI endpoints, relative to the CI width, to count
+                               a batch as stable. Defaults to 0.01.
+        patience (int, optional): Stable batches in a row needed to stop. Defaults to 2.
+        min_B (int, optional): Replicates drawn before the first check. Defaults to 200.
+        max_B (int, optional): Replicate budget. Defaults to 10000.
+        max_seconds (float, optional): Time budget. Defaults to None, no limit.
+        max_memory_mb (float, optional): Memory budget, in MB, for the index and gather buffers. Defaults to 256.
+        **params: Passed to the statistic factory.
+
+    Returns:
+        AdaptiveBootstrapStatistics: The bootstrap statistics plus the B actually used and whether the
+                                     interval converged before a budget ran out.
+    """
+    statistic = get_statistic(statistic, max_memory_mb, **params)
+    columns = [column] if isinstance(column, str) else column
+    values = data[columns].to_numpy(dtype=np.float64)
+    deadline = None if max_seconds is None else time.perf_counter() + max_seconds
+
+    replicates = bootstrap_replicates(values, min(min_B, max_B), statistic, max_memory_mb)
+    low_ci, high_ci = np.percentile(replicates, CIs)
+    stable_batches = 0
+    converged = False
+    while replicates.shape[0] < max_B and (deadline is None or time.perf_counter() < deadline):
+        batch = bootstrap_replicates(values, min(batch_size, max_B - replicates.shape[0]), statistic, max_memory_mb)
+        replicates = np.concatenate([replicates, batch])
+        previous_low, previous_high = low_ci, high_ci
+        low_ci, high_ci = np.percentile(replicates, CIs)
+        stable_batches = stable_batches + 1 if is_stable(low_ci, high_ci, previous_low, previous_high, tol) else 0
+        if stable_batches >= patience:
+            converged = True
+            break
+    return AdaptiveBootstrapStatistics(np.mean(replicates), low_ci, high_ci, replicates.shape[0], converged)
+
+def adaptive_scalable_bootstrap(df:pd.DataFrame, column:str, granularity:list[str], CIs:list[int]=[2.5, 97.5], batch_size:int=100, tol:float=0.01, patience:int=2, min_B:int=200, max_B:int=10000, max_seconds:float=None, max_memory_mb:float=256) -> pd.DataFrame:
+    """
+    Performs 'adaptive_bootstrap' of the mean for every group in 'granularity', each group stopping on its own.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame containing the data to be resampled.
+        column (str): The name of the column in 'df' for which the bootstrap resampling will be performed.
+        granularity (list[str]): A list of columns that act as a partition for the bootstrap algorithm.
+        The rest of the arguments are the ones of 'adaptive_bootstrap'.
+
+    Returns:
+        pd.DataFrame: The columns in 'granularity' plus mean, low_ci, high_ci, B and converged.
+
+    Description:
+        All the groups still running have drawn the same number of replicates, so their replicates are
+        kept as a single (B, active groups) matrix. Every round draws 'batch_size' replicates for the
+        active groups with the sort-based kernel of 'scalable_vectorize_bootstrap', updates the CIs of all
+        of them with one 'np.percentile' call, and moves the groups that converged out of the matrix.
+    """
+    values, offsets, keys = get_group_offsets(df, column, granularity)
+    starts, sizes = offsets[:-1], np.diff(offsets)
+    n_groups = keys.shape[0]
+    deadline = None if max_seconds is None else time.perf_counter() + max_seconds
+
+    def draw(active, B):
+        return np.concatenate([
+            group_bootstrap_means(values, starts[active[first:last]], sizes[active[first:last]], B, max_memory_mb)
+            for first, last in get_group_batches(sizes[active], B, max_memory_mb)
+        ], axis=1)
+
+    result = {
+        "mean": np.empty(n_groups), "low_ci": np.empty(n_groups), "high_ci": np.empty(n_groups),
+        "B": np.empty(n_groups, dtype=np.int64), "converged": np.zeros(n_groups, dtype=bool),
+    }
+
+    def finish(groups, replicates, low_ci, high_ci, converged):
+        result["mean"][groups] = replicates.mean(axis=0)
+        result["low_ci"][groups] = low_ci
+        result["high_ci"][groups] = high_ci
+        result["B"][groups] = replicates.shape[0]
+        result["converged"][groups] = converged
+
+    if n_groups == 0:
+        return pd.concat([keys, pd.DataFrame(result)], axis=1)
+
+    active = np.arange(n_groups)
+    replicates = draw(active, min(min_B, max_B))
+    low_ci, high_ci = np.percentile(replicates, CIs, axis=0)
+    stable_batches = np.zeros(n_groups, dtype=np.int64)
+    while active.shape[0] and replicates.shape[0] < max_B and (deadline is None or time.perf_counter() < deadline):
+        replicates = np.concatenate([replicates, draw(active, min(batch_size, max_B - replicates.shape[0]))])
+        previous_low, previous_high = low_ci, high_ci
+        low_ci, high_ci = np.percentile(replicates, CIs, axis=0)
+        stable = is_stable(low_ci, high_ci, previous_low, previous_high, tol)
+        stable_batches = np.where(stable, stable_batches + 1, 0)
+
+        done = stable_batches >= patience
+        if done.any():
+            finish(active[done], replicates[:, done], low_ci[done], high_ci[done], True)
+            active, replicates = active[~done], replicates[:, ~done]
+            low_ci, high_ci, stable_batches = low_ci[~done], high_ci[~done], stable_batches[~done]
+    if active.shape[0]:
+        finish(active, replicates, low_ci, high_ci, False)
+
+    return pd.concat([keys, pd.DataFrame(result)], axis=1)
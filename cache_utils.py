@@ -0,0 +1,385 @@
+from __future__ import annotations
+from collections import OrderedDict
+import copy
+from dataclasses import dataclass, asdict
+from functools import wraps
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import threading
+from typing import Callable
+if __package__:
+    from .lazy_utils import lazy_import
+else:
+    from lazy_utils import lazy_import
+
+np = lazy_import("numpy", "numpy")
+pd = lazy_import("pandas", "pandas")
+
+"""
+Content-addressed cache of the results of the expensive helpers, so a notebook rerun on unchanged data is a lookup.
+Results are keyed on a hash of the function and the source of its module, the input columns and the arguments: an
+LRU in memory in front of a size-capped directory of parquet / npz / pickle files. Decorate a function with @cached. The directory of the default
+cache comes from the RESULT_CACHE_DIR environment variable or configure_cache, there is no disk cache without it.
+"""
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    memory_hits:int = 0
+    disk_hits:int = 0
+    misses:int = 0
+    memory_evictions:int = 0
+    disk_evictions:int = 0
+    bypasses:int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def asdict(self):
+        return {**asdict(self), "hits": self.hits, "hit_rate": self.hit_rate}
+
+
+class Unhashable(Exception):
+    """The arguments can't be hashed, e.g. a LazyFrame, the call is not cached."""
+
+
+def is_polars(obj) -> bool:
+    return type(obj).__module__.startswith("polars")
+
+
+def update_hash(hasher, obj, columns:list[str]=None) -> None:
+    """
+    Feeds obj to the hasher. DataFrames are hashed by their column names, dtypes and a vectorized hash of the rows of
+    'columns' (all of them by default), arrays by their bytes, containers recursively and the rest by their repr.
+    """
+    if isinstance(obj, pd.DataFrame):
+        frame = obj if columns is None else obj[[col for col in columns if col in obj.columns]]
+        hasher.update(repr([(str(col), str(dtype)) for col, dtype in frame.dtypes.items()]).encode())
+        hasher.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    elif isinstance(obj, pd.Series):
+        hasher.update(f"{obj.name}:{obj.dtype}".encode())
+        hasher.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        hasher.update(f"{obj.dtype}:{obj.shape}".encode())
+        hasher.update(np.ascontiguousarray(obj).tobytes() if obj.dtype != object else pickle.dumps(obj))
+    elif is_polars(obj) and type(obj).__name__ == "DataFrame":
+        frame = obj if columns is None else obj.select([col for col in columns if col in obj.columns])
+        hasher.update(repr(list(frame.schema.items())).encode())
+        hasher.update(frame.hash_rows(seed=0).to_numpy().tobytes())
+    elif is_polars(obj) and type(obj).__name__ == "Series":
+        hasher.update(f"{obj.name}:{obj.dtype}".encode())
+        hasher.update(obj.hash(seed=0).to_numpy().tobytes())
+    elif is_polars(obj) and type(obj).__name__ == "LazyFrame":
+        raise Unhashable("a LazyFrame is a query, not data")
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(f"{type(obj).__name__}[{len(obj)}]".encode())
+        for item in obj:
+            update_hash(hasher, item, columns)
+    elif isinstance(obj, dict):
+        hasher.update(f"dict[{len(obj)}]".encode())
+        for key, value in sorted(obj.items(), key=lambda item: repr(item[0])):
+            hasher.update(repr(key).encode())
+            update_hash(hasher, value, columns)
+    elif callable(obj):
+        hasher.update(f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', repr(obj))}".encode())
+    else:
+        hasher.update(f"{type(obj).__name__}:{obj!r}".encode())
+
+
+def get_source_hash(func:Callable) -> str:
+    """Hash of the source of the module of the function, so editing it or any helper of the same module invalidates
+    its cached results. The bytecode of the function when the source isn't available."""
+    func = inspect.unwrap(func)
+    try:
+        source = inspect.getsource(inspect.getmodule(func) or func).encode()
+    except (OSError, TypeError):
+        code = func.__code__
+        source = code.co_code + repr(code.co_consts).encode()
+    return hashlib.blake2b(source, digest_size=16).hexdigest()
+
+
+def get_cache_key(func:Callable, arguments:dict, columns:list[str]=None, source_hash:str="") -> str:
+    """Hex digest of the function and its source hash, its bound arguments (defaults included) and the CACHE_VERSION."""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{CACHE_VERSION}:{func.__module__}.{func.__qualname__}:{source_hash}".encode())
+    update_hash(hasher, arguments, columns)
+    return hasher.hexdigest()
+
+
+def get_size(obj) -> int:
+    """Approximate size in bytes of a cached result."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        # deep, otherwise strings count as 8 bytes pointers
+        return int(obj.memory_usage(index=True, deep=True).sum()) if isinstance(obj, pd.DataFrame) else int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if is_polars(obj) and hasattr(obj, "estimated_size"):
+        return int(obj.estimated_size())
+    return len(pickle.dumps(obj))
+
+
+def copy_result(obj):
+    """A copy of a cached result, so the caller can modify it without changing the cache."""
+    if isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray)):
+        return obj.copy()
+    if is_polars(obj):
+        return obj.clone()
+    return copy.deepcopy(obj)
+
+
+class ResultCache:
+    """
+    LRU cache in memory, capped by number of items and bytes, in front of an optional directory capped in bytes.
+
+    pandas and polars DataFrames are written as parquet, numpy arrays as npz and anything else is pickled. The
+    least recently used files (by modification time, refreshed on every hit) are deleted when the directory
+    goes over max_disk_mb. The cache is thread safe.
+    """
+
+    def __init__(self, directory:str=None, max_items:int=128, max_memory_mb:float=512, max_disk_mb:float=2048, enabled:bool=True):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_memory_bytes = max_memory_mb * 2**20
+        self.max_disk_bytes = max_disk_mb * 2**20
+        self.enabled = enabled
+        self.stats = CacheStats()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def __contains__(self, key:str) -> bool:
+        return key in self._memory or self._find_file(key) is not None
+
+    def get(self, key:str, default=None):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return copy_result(self._memory[key][0])
+            path = self._find_file(key)
+            if path is not None:
+                try:
+                    value = self._read(path)
+                except Exception:  # a partial or corrupted file is a miss
+                    os.remove(path)
+                else:
+                    os.utime(path)
+                    self.stats.disk_hits += 1
+                    self._put_memory(key, value)
+                    return copy_result(value)
+            self.stats.misses += 1
+            return default
+
+    def put(self, key:str, value) -> None:
+        """Stores a result, on disk first so a value that can't be written isn't cached at all."""
+        with self._lock:
+            if self.directory is not None:
+                self._write(key, value)
+                self._evict_disk()
+            self._put_memory(key, copy_result(value))
+
+    def clear(self, disk:bool=False) -> None:
+        """Empties the memory cache, and the directory if disk."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if disk and self.directory is not None:
+                for path in self._files():
+                    os.remove(path)
+
+    def _put_memory(self, key:str, value) -> None:
+        size = get_size(value)
+        if size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        self._memory[key] = (value, size)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_items or self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self.stats.memory_evictions += 1
+
+    def _files(self) -> list[str]:
+        if self.directory is None:
+            return []
+        return [entry.path for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith(".tmp")]
+
+    def _find_file(self, key:str) -> str:
+        if self.directory is None:
+            return None
+        for extension in ("parquet", "polars.parquet", "npz", "pkl"):
+            path = os.path.join(self.directory, f"{key}.{extension}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _write(self, key:str, value) -> None:
+        if isinstance(value, pd.DataFrame) and all(isinstance(col, str) for col in value.columns):
+            extension = "parquet"
+        elif is_polars(value) and type(value).__name__ == "DataFrame":
+            extension = "polars.parquet"
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            extension = "npz"
+        else:
+            extension = "pkl"
+        path = os.path.join(self.directory, f"{key}.{extension}")
+        # Written to a temporary file first, so a concurrent reader never sees a partial file
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if extension == "parquet":
+                value.to_parquet(temporary)
+            elif extension == "polars.parquet":
+                value.write_parquet(temporary)
+            else:
+                with open(temporary, "wb") as file:
+                    if extension == "npz":
+                        np.savez(file, value=value)
+                    else:
+                        pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        os.replace(temporary, path)
+
+    def _read(self, path:str):
+        if path.endswith(".polars.parquet"):
+            import polars as pl
+
+            return pl.read_parquet(path)
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        if path.endswith(".npz"):
+            with np.load(path, allow_pickle=False) as npz:
+                return npz["value"]
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+    def _evict_disk(self) -> None:
+        files = [(os.stat(path), path) for path in self._files()]
+        total = sum(stat.st_size for stat, _ in files)
+        for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= stat.st_size
+            self.stats.disk_evictions += 1
+
+
+DEFAULT_CACHE = ResultCache(directory=DEFAULT_CACHE_DIR)
+
+
+def configure_cache(directory:str=None, max_items:int=None, max_memory_mb:float=None, max_disk_mb:float=None, enabled:bool=None) -> ResultCache:
+    """Changes the settings of DEFAULT_CACHE in place, e.g. configure_cache(directory="~/.cache/results"), and returns it."""
+    if directory is not None:
+        DEFAULT_CACHE.directory = os.path.expanduser(directory)
+        os.makedirs(DEFAULT_CACHE.directory, exist_ok=True)
+    if max_items is not None:
+        DEFAULT_CACHE.max_items = max_items
+    if max_memory_mb is not None:
+        DEFAULT_CACHE.max_memory_bytes = max_memory_mb * 2**20
+    if max_disk_mb is not None:
+        DEFAULT_CACHE.max_disk_bytes = max_disk_mb * 2**20
+    if enabled is not None:
+        DEFAULT_CACHE.enabled = enabled
+    return DEFAULT_CACHE
+
+
+def clear_cache(disk:bool=True) -> None:
+    """Empties DEFAULT_CACHE, its directory too by default. Needed after editing a helper of another module than the
+    cached function, which the key doesn't see."""
+    DEFAULT_CACHE.clear(disk=disk)
+
+
+def cached(
+        func:Callable=None,
+        *,
+        cache:ResultCache=None,
+        columns:Callable[[dict], list[str]]=None,
+        random:bool=False,
+        opt_in:bool=False,
+        ignore:list[str]=None,
+    ):
+    """Caches the results of a function on the content of its arguments.
+
+    Args:
+        func (Callable): The function, when used as @cached.
+        cache (ResultCache, optional): Where to keep the results. Defaults to DEFAULT_CACHE.
+        columns (Callable[[dict], list[str]], optional): Receives the bound arguments and returns the columns of the
+        DataFrame arguments the result depends on, only those are hashed. Defaults to None, all the columns.
+        random (bool, optional): The function draws from the global numpy random state. Its calls are cached only
+        with use_cache=True and the state is part of the key. Defaults to False.
+        opt_in (bool, optional): Cache only with use_cache=True, for functions whose inputs take about as long to
+        hash as the result to compute. Defaults to False.
+        ignore (list[str], optional): Arguments left out of the key because they don't change the result, e.g.
+        n_jobs. Defaults to None.
+
+    Returns:
+        Callable: The decorated function, with a 'cache' attribute and a 'cache_info' method returning the hit/miss
+        statistics of the cache. Call it with use_cache=False to skip the cache.
+
+    Description:
+        The key is the hash of the function and of the source of its module, the arguments with their defaults and
+        the content of the DataFrames and arrays, so changing the data, any parameter or the module is a new entry.
+        Edits of helpers in other modules are not seen, call clear_cache after them. CACHE_VERSION invalidates
+        everything, e.g. when the files change format. With 'random', only a call after the same np.random.seed is
+        a hit; unlike the call it replaces, a hit doesn't advance the random state. Calls with arguments that can't
+        be hashed, such as a LazyFrame, are not cached, and results that can't be stored are logged and returned.
+    """
+    def decorator(func:Callable) -> Callable:
+        signature = inspect.signature(func)
+        source_hash = get_source_hash(func)
+
+        result_cache = cache if cache is not None else DEFAULT_CACHE
+
+        @wraps(func)
+        def wrapper(*args, use_cache:bool=None, **kwargs):
+            # random and opt-in functions are cached only on request
+            use_cache = not (random or opt_in) if use_cache is None else use_cache
+            if not (use_cache and result_cache.enabled):
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {name: value for name, value in bound.arguments.items() if name not in (ignore or [])}
+            if random:
+                arguments["numpy_random_state"] = np.random.get_state()
+            try:
+                key = get_cache_key(func, arguments, columns(arguments) if columns is not None else None, source_hash)
+            except Unhashable:
+                result_cache.stats.bypasses += 1
+                return func(*args, **kwargs)
+            missing = object()
+            result = result_cache.get(key, missing)
+            if result is missing:
+                result = func(*args, **kwargs)
+                try:
+                    result_cache.put(key, result)
+                except Exception:
+                    logger.warning("Could not cache the result of %s", func.__qualname__, exc_info=True)
+            return result
+
+        wrapper.cache = result_cache
+        wrapper.cache_info = lambda: result_cache.stats.asdict()
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
@@ -0,0 +1,186 @@
+from __future__ import annotations
+from math import exp, factorial
+from typing import Iterator
+if __package__:
+    from .lazy_utils import lazy_import
+else:
+    from lazy_utils import lazy_import
+
+duckdb = lazy_import("duckdb", "duckdb")
+pd = lazy_import("pandas", "pandas")
+
+"""
+Bootstrap pushed down into DuckDB, so parquet files larger than memory can be
+bootstrapped without loading them into pandas. It follows bootstrap_bigquery.sql
+and returns the same frame as bootstrap_python.scalable_vectorize_bootstrap.
+"""
+
+DUCKDB_BOOTSTRAP_METHODS = ["poisson", "index"]
+
+def get_relation(source:str) -> str:
+    """A parquet path or glob becomes a read_parquet scan, anything else is taken as a table name."""
+    if source.endswith(".parquet") or "*" in source:
+        return f"read_parquet('{source}')"
+    return source
+
+def quote(name:str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+def poisson_weight_expression(random_col:str, max_weight:int=12) -> str:
+    """CASE expression that turns a uniform column into a Poisson(1) weight with the inverse CDF."""
+    cdf = 0.0
+    whens = []
+    for k in range(max_weight):
+        cdf += exp(-1) / factorial(k)
+        whens.append(f"WHEN {random_col} < {cdf!r} THEN {k}")
+    return "CASE {} ELSE {} END".format(" ".join(whens), max_weight)
+
+def bootstrap_statement(relation:str, column:str, granularity:list[str], B:int, CIs:list[int]=[2.5, 97.5], method:str="poisson") -> str:
+    """
+    Builds the SQL of the bootstrap of the mean of 'column' for every group in 'granularity'.
+
+    Args:
+        relation (str): Table name or read_parquet(...) scan, see 'get_relation'.
+        column (str): The column to bootstrap.
+        granularity (list[str]): Columns that act as a partition for the bootstrap, can be empty.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): The lower and upper percentiles. Defaults to [2.5, 97.5].
+        method (str, optional): "poisson" or "index". Defaults to "poisson".
+
+    Returns:
+        str: The statement, returning the granularity columns plus mean, low_ci and high_ci.
+
+    Description:
+        Both methods cross join the data with range(B), so DuckDB streams the n * B rows straight
+        into a hash aggregation by (group, replicate) and never materializes them.
+
+        "poisson" gives every (row, replicate) a Poisson(1) weight and the replicate mean is
+        sum(w * x) / sum(w). It needs a single scan of the data.
+
+        "index" is the exact resampling of bootstrap_bigquery.sql: rows are numbered within each group,
+        every (row, replicate) draws a random row number of its group and the draws are joined back
+        to the data. It needs the data to be numbered first, so it is heavier than "poisson".
+    """
+    if method not in DUCKDB_BOOTSTRAP_METHODS:
+        raise ValueError(f"method must be one of {DUCKDB_BOOTSTRAP_METHODS}, got {method!r}")
+    keys = [quote(col) for col in granularity]
+    keys_select = "".join(f"{key}, " for key in keys)
+    not_null = " AND ".join(f"{key} IS NOT NULL" for key in [*keys, quote(column)])
+    partition = f"PARTITION BY {', '.join(keys)}" if keys else ""
+    order = f"ORDER BY {', '.join(keys)}" if keys else ""
+    low, high = (ci / 100 for ci in CIs)
+
+    # pylint: disable=consider-using-f-string
+    if method == "poisson":
+        bootstrap = """
+        weights AS (
+            SELECT {keys_select}replicate, value, {weight} AS weight
+            FROM (
+                SELECT {keys_select}replicate, {column} AS value, random() AS u
+                FROM {relation}
+                CROSS JOIN range({B}) AS replicates(replicate)
+                WHERE {not_null}
+            )
+        )
+
+        , bootstrap AS (
+            SELECT {keys_select}replicate, SUM(weight * value) / SUM(weight) AS mean
+            FROM weights
+            GROUP BY ALL
+            HAVING SUM(weight) > 0
+        )
+        """.format(
+            keys_select=keys_select, weight=poisson_weight_expression("u"), column=quote(column),
+            relation=relation, B=B, not_null=not_null
+        )
+    else:
+        using = ", ".join([*keys, "row_idx"])
+        bootstrap = """
+        data AS (
+            SELECT {keys_select}{column} AS value
+            , ROW_NUMBER() OVER ({partition}) - 1 AS row_idx
+            , COUNT(*) OVER ({partition}) AS n
+            FROM {relation}
+            WHERE {not_null}
+        )
+
+        , bootstrap_map AS (
+            SELECT {keys_select}replicate, FLOOR(random() * n)::BIGINT AS row_idx
+            FROM data
+            CROSS JOIN range({B}) AS replicates(replicate)
+        )
+
+        , bootstrap AS (
+            SELECT {keys_select}replicate, AVG(value) AS mean
+            FROM bootstrap_map
+            INNER JOIN data USING ({using})
+            GROUP BY ALL
+        )
+        """.format(
+            keys_select=keys_select, column=quote(column), partition=partition, relation=relation,
+            not_null=not_null, B=B, using=using
+        )
+
+    statement = """
+        WITH {bootstrap}
+
+        SELECT {keys_select}AVG(mean) AS mean
+        , quantile_cont(mean, {low}) AS low_ci
+        , quantile_cont(mean, {high}) AS high_ci
+        FROM bootstrap
+        GROUP BY ALL
+        {order}
+    """.format(bootstrap=bootstrap, keys_select=keys_select, low=low, high=high, order=order)
+    # pylint: enable=consider-using-f-string
+    return statement
+
+def iter_duckdb_bootstrap(connection:duckdb.DuckDBPyConnection, source:str, column:str, granularity:list[str], B:int, CIs:list[int]=[2.5, 97.5], method:str="poisson", seed:float=None, vectors_per_chunk:int=1) -> Iterator[pd.DataFrame]:
+    """
+    Runs the bootstrap in DuckDB and streams the grouped results back in chunks.
+
+    Args:
+        connection (duckdb.DuckDBPyConnection): The database connection object.
+        source (str): Parquet file, glob or DuckDB table.
+        column (str): The column to bootstrap.
+        granularity (list[str]): Columns that act as a partition for the bootstrap, can be empty.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): The lower and upper percentiles. Defaults to [2.5, 97.5].
+        method (str, optional): "poisson" or "index", see 'bootstrap_statement'. Defaults to "poisson".
+        seed (float, optional): Passed to DuckDB's setseed, between -1 and 1. Results are only
+                                reproducible with a single thread (SET threads = 1). Defaults to None.
+        vectors_per_chunk (int, optional): Size of each chunk, in DuckDB vectors of 2048 rows. Defaults to 1.
+
+    Yields:
+        pd.DataFrame: Chunks of the granularity columns plus mean, low_ci and high_ci.
+    """
+    if seed is not None:
+        connection.execute("SELECT setseed(?)", [seed])
+    result = connection.execute(bootstrap_statement(get_relation(source), column, granularity, B, CIs, method))
+    while True:
+        chunk = result.fetch_df_chunk(vectors_per_chunk)
+        if chunk.empty:
+            break
+        yield chunk
+
+def duckdb_bootstrap(connection:duckdb.DuckDBPyConnection, source:str, column:str, granularity:list[str], B:int, CIs:list[int]=[2.5, 97.5], method:str="poisson", seed:float=None) -> pd.DataFrame:
+    """
+    Bootstrap of the mean of 'column' for every group in 'granularity', run inside DuckDB over a
+    parquet file or table. Same output as bootstrap_python.scalable_vectorize_bootstrap.
+
+    Args:
+        connection (duckdb.DuckDBPyConnection): The database connection object.
+        source (str): Parquet file, glob or DuckDB table.
+        column (str): The column to bootstrap.
+        granularity (list[str]): Columns that act as a partition for the bootstrap, can be empty.
+        B (int): The number of bootstrap iterations to perform.
+        CIs (list[int], optional): The lower and upper percentiles. Defaults to [2.5, 97.5].
+        method (str, optional): "poisson" or "index", see 'bootstrap_statement'. Defaults to "poisson".
+        seed (float, optional): Passed to DuckDB's setseed, see 'iter_duckdb_bootstrap'. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The granularity columns plus mean, low_ci and high_ci.
+    """
+    chunks = list(iter_duckdb_bootstrap(connection, source, column, granularity, B, CIs, method, seed))
+    if not chunks:
+        return pd.DataFrame(columns=[*granularity, "mean", "low_ci", "high_ci"])
+    return pd.concat(chunks, ignore_index=True)
@@ -1,14 +1,420 @@
+from __future__ import annotations
 
 ###########################################################
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, asdict
 from pathlib import Path
+if __package__:
+    from .lazy_utils import lazy_import
+    from .trace_utils import count, current_span, is_enabled, timed, traced
+else:
+    from lazy_utils import lazy_import
+    from trace_utils import count, current_span, is_enabled, timed, traced
+
+duckdb = lazy_import("duckdb", "duckdb")
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class UpsertReport:
+    files:int
+    skipped:int
+    batches:int
+    rows:int
+    seconds:float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def asdict(self):
+        return {**asdict(self), "rows_per_second": self.rows_per_second}
+
+def expand_files(files:str | Path | list[str | Path]) -> list[str]:
+    """A glob, a path or a list of them as a sorted list of unique local files."""
+    patterns = files if isinstance(files, (list, tuple)) else [files]
+    expanded = []
+    for pattern in patterns:
+        pattern = str(pattern)
+        expanded.extend(sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern])
+    return list(dict.fromkeys(expanded))
+
+def make_batches(files:list[str], batch_files:int=None, batch_bytes:int=None) -> list[list[str]]:
+    """Splits the files in batches of at most 'batch_files' files and 'batch_bytes' bytes
+    (a file larger than 'batch_bytes' is a batch on its own)."""
+    batches, batch, size = [], [], 0
+    for file in files:
+        file_size = os.path.getsize(file) if batch_bytes else 0
+        full = (
+            (batch_files and len(batch) >= batch_files)
+            or (batch_bytes and batch and size + file_size > batch_bytes)
+        )
+        if full:
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(file)
+        size += file_size
+    if batch:
+        batches.append(batch)
+    return batches
+
+def quote(name:str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+def get_manifest_table(target:str) -> str:
+    """Default manifest, an 'upsert_manifest' table next to the target (same catalog and schema)."""
+    return ".".join([*target.split(".")[:-1], "upsert_manifest"])
+
+def create_manifest(connection:duckdb.DuckDBPyConnection, manifest_table:str) -> None:
+    connection.execute(f"""
+        CREATE TABLE IF NOT EXISTS {manifest_table} (
+            target VARCHAR,
+            file VARCHAR,
+            size BIGINT,
+            modified DOUBLE,
+            loaded_at TIMESTAMP DEFAULT current_timestamp,
+            PRIMARY KEY (target, file)
+        )
+    """)
+
+def get_pending_files(connection:duckdb.DuckDBPyConnection, manifest_table:str, target:str, files:list[str]) -> list[tuple[str, int, float]]:
+    """Files not in the manifest yet, or changed (size or modification time) since they were loaded."""
+    loaded = {
+        file: (size, modified)
+        for file, size, modified in connection.execute(
+            f"SELECT file, size, modified FROM {manifest_table} WHERE target = ?", [target]
+        ).fetchall()
+    }
+    pending = []
+    for file in files:
+        stat = os.stat(file)
+        if loaded.get(file) != (stat.st_size, stat.st_mtime):
+            pending.append((file, stat.st_size, stat.st_mtime))
+    return pending
+
+def upsert_statement(target:str, key_cols:list[str], update_cols:list[str]=None, source:str=None) -> str:
+    """
+    Upsert of a set of files into 'target'.
+
+    By default the files are read with a single read_parquet scan of the list bound as the two
+    parameters of the statement, without a staging table. Another 'source' relation can be given,
+    with the same columns as the target plus '__position'. Rows are inserted by column name. If a key
+    appears more than once, the row with the highest '__position' (the last file in the list) wins,
+    as it would with one upsert per file. With 'update_cols' only those columns are updated on
+    conflict; without them the whole row is replaced.
+    """
+    if source is None:
+        source = """(
+            SELECT * EXCLUDE (filename), list_position(?, filename) AS __position
+            FROM read_parquet(?, filename = true, union_by_name = true)
+        )"""
+    keys = ", ".join(quote(col) for col in key_cols)
+    select = f"""
+        SELECT * EXCLUDE (__position)
+        FROM {source}
+        QUALIFY row_number() OVER (PARTITION BY {keys} ORDER BY __position DESC) = 1
+    """
+    if update_cols is None:
+        return f"INSERT OR REPLACE INTO {target} BY NAME {select}"
+    updates = ", ".join(f"{quote(col)} = EXCLUDED.{quote(col)}" for col in update_cols)
+    return f"INSERT INTO {target} BY NAME {select} ON CONFLICT ({keys}) DO UPDATE SET {updates}"
+
+def insert_manifest(connection:duckdb.DuckDBPyConnection, manifest_table:str, target:str, files:list[str], stats:dict[str, tuple]) -> None:
+    connection.execute(
+        f"""
+        INSERT OR REPLACE INTO {manifest_table} (target, file, size, modified)
+        SELECT ?, unnest(?), unnest(?), unnest(?)
+        """,
+        [target, files, [stats[file][0] for file in files], [stats[file][1] for file in files]],
+    )
+
+@traced
+def upsert_parquet_files(
+        connection:duckdb.DuckDBPyConnection,
+        files:str | Path | list[str | Path],
+        target:str,
+        key_cols:list[str],
+        update_cols:list[str]=None,
+        batch_files:int=100,
+        batch_bytes:int=None,
+        manifest_table:str | bool=True,
+    ) -> UpsertReport:
+    """
+    Upserts many parquet files into a table, in batches of files.
+
+    Parameters:
+    - connection (duckdb.DuckDBPyConnection): The database connection object.
+    - files (str | Path | list): A file, a glob (e.g. "data/pickup_hourly/*.parquet") or a list of them.
+    - target (str): The table to upsert into, e.g. "dwh.main.pickup_hourly". It needs a primary key
+      or unique constraint on 'key_cols'.
+    - key_cols (list[str]): The conflict key.
+    - update_cols (list[str], optional): Columns updated on conflict. Defaults to None, the full row.
+    - batch_files (int, optional): Maximum files per batch. Defaults to 100.
+    - batch_bytes (int, optional): Maximum bytes per batch. Defaults to None, no limit.
+    - manifest_table (str | bool, optional): Table recording the loaded files, which are skipped the
+      next time unless their size or modification time changed. True uses an 'upsert_manifest'
+      table next to the target, False disables it. It must live in the same database as the target,
+      as DuckDB writes to a single database per transaction. Defaults to True.
+
+    Returns:
+    UpsertReport: files, skipped files, batches, rows upserted, seconds and rows per second.
+
+    Every batch is one read_parquet([...]) scan and one INSERT, committed in its own transaction
+    together with its manifest rows, so an interrupted backfill resumes from the last committed batch.
+    With tracing on (see trace_utils) the call is a span with the time of the manifest lookup, the
+    upsert statements, the manifest inserts and the commits, and the files, bytes and rows upserted.
+    """
+    start = time.perf_counter()
+    files = expand_files(files)
+    if manifest_table is True:
+        manifest_table = get_manifest_table(target)
+    with timed("upsert.pending_files"):
+        if manifest_table:
+            create_manifest(connection, manifest_table)
+            pending = get_pending_files(connection, manifest_table, target, files)
+        else:
+            pending = [(file, None, None) for file in files]
+
+    stats = {file: (size, modified) for file, size, modified in pending}
+    batches = make_batches(list(stats), batch_files, batch_bytes)
+    statement = upsert_statement(target, key_cols, update_cols)
+    rows = 0
+    for batch in batches:
+        connection.begin()
+        try:
+            # the parquet scan and the conflict resolution are a single statement
+            with timed("upsert.statement"):
+                batch_rows = connection.execute(statement, [batch, batch]).fetchone()[0]
+            if manifest_table:
+                with timed("upsert.manifest"):
+                    insert_manifest(connection, manifest_table, target, batch, stats)
+            with timed("upsert.commit"):
+                connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        rows += batch_rows
+        count("upsert.rows", batch_rows)
+        count("upsert.files", len(batch))
+        if is_enabled():
+            count("upsert.bytes", sum(stats[file][0] or os.path.getsize(file) for file in batch))
+        logger.info("Upserted %s files (%s rows so far) into %s", len(batch), rows, target)
+
+    report = UpsertReport(len(files), len(files) - len(pending), len(batches), rows, time.perf_counter() - start)
+    current_span().set(target=target, **report.asdict())
+    logger.info(
+        "Upserted %s rows from %s files into %s at %.0f rows/s (%s files skipped)",
+        report.rows, len(pending), target, report.rows_per_second, report.skipped,
+    )
+    return report
+
+@dataclass
+class PipelineReport:
+    files:int
+    skipped:int
+    batches:int
+    rows:int
+    seconds:float
+    # summed over the reader threads
+    read_seconds:float = 0.0
+    transform_seconds:float = 0.0
+    reader_blocked_seconds:float = 0.0
+    # writer thread
+    writer_idle_seconds:float = 0.0
+    write_seconds:float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def asdict(self):
+        return {**asdict(self), "rows_per_second": self.rows_per_second}
+
+# put by every reader thread when it has no more files
+_READER_DONE = object()
+
+@traced
+def ingest_parquet_files(
+        connection:duckdb.DuckDBPyConnection,
+        files:str | Path | list[str | Path],
+        target:str,
+        key_cols:list[str],
+        update_cols:list[str]=None,
+        transform:callable=None,
+        n_readers:int=4,
+        queue_size:int=16,
+        batch_files:int=100,
+        batch_rows:int=1_000_000,
+        manifest_table:str | bool=True,
+    ) -> PipelineReport:
+    """
+    Concurrent version of 'upsert_parquet_files': reader threads decode and preprocess the files
+    while a single writer upserts them in batches.
+
+    Parameters:
+    - connection (duckdb.DuckDBPyConnection): The database connection object, used by the writer.
+      Every reader works on its own cursor of the same database.
+    - files, target, key_cols, update_cols, manifest_table: as in 'upsert_parquet_files'.
+    - transform (callable, optional): Function applied by the readers to every file, as a
+      pyarrow.Table, returning a pyarrow.Table with the columns of the target. Defaults to None.
+    - n_readers (int, optional): Reader threads. Defaults to 4.
+    - queue_size (int, optional): Files being read or waiting to be put back in order, at most. When
+      that many are in flight the readers block, so memory stays bounded if the writer or a slow file
+      is the bottleneck. Defaults to 16.
+    - batch_files (int, optional): Maximum files per write batch. Defaults to 100.
+    - batch_rows (int, optional): A batch is written once it holds this many rows. Defaults to 1_000_000.
+
+    Returns:
+    PipelineReport: The totals of 'UpsertReport' plus the time spent per stage. A reader_blocked_seconds
+    close to the total means the writer is the bottleneck; a high writer_idle_seconds means the readers are.
+
+    The readers take the files in order, but finish them out of order, so the writer puts them back
+    in order before batching. Batches are therefore written in the order of the files and, as with
+    one upsert per file, the last file wins on duplicated keys. Each batch is committed with its
+    manifest rows, and the first error of any stage stops the pipeline.
+    """
+    import pyarrow as pa
+
+    start = time.perf_counter()
+    files = expand_files(files)
+    if manifest_table is True:
+        manifest_table = get_manifest_table(target)
+    if manifest_table:
+        create_manifest(connection, manifest_table)
+        pending = get_pending_files(connection, manifest_table, target, files)
+    else:
+        pending = [(file, None, None) for file in files]
+    stats = {file: (size, modified) for file, size, modified in pending}
+    report = PipelineReport(len(files), len(files) - len(pending), 0, 0, 0.0)
+
+    work = queue.Queue()
+    for position, file in enumerate(stats):
+        work.put((position, file))
+    results = queue.Queue(maxsize=queue_size)
+    # one slot per file in flight, released by the writer when the file leaves the reorder buffer
+    window = threading.Semaphore(queue_size)
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read_files():
+        cursor = connection.cursor()
+        read_seconds = transform_seconds = blocked_seconds = 0.0
+        try:
+            while not stop.is_set():
+                tic = time.perf_counter()
+                # the slot is taken before the file, so the earliest pending file always holds one
+                if not window.acquire(timeout=0.1):
+                    blocked_seconds += time.perf_counter() - tic
+                    continue
+                blocked_seconds += time.perf_counter() - tic
+                try:
+                    position, file = work.get_nowait()
+                except queue.Empty:
+                    window.release()
+                    break
+                tic = time.perf_counter()
+                table = cursor.execute("SELECT * FROM read_parquet(?)", [file]).fetch_arrow_table()
+                read_seconds += time.perf_counter() - tic
+                if transform is not None:
+                    tic = time.perf_counter()
+                    table = transform(table)
+                    transform_seconds += time.perf_counter() - tic
+                tic = time.perf_counter()
+                put((position, file, table))
+                blocked_seconds += time.perf_counter() - tic
+        except Exception as e:
+            put((None, None, e))
+        finally:
+            cursor.close()
+            with lock:
+                report.read_seconds += read_seconds
+                report.transform_seconds += transform_seconds
+                report.reader_blocked_seconds += blocked_seconds
+            put(_READER_DONE)
+
+    def write(batch):
+        tic = time.perf_counter()
+        table = pa.concat_tables(
+            [table.append_column("__position", pa.array([position] * table.num_rows, pa.int64())) for position, _, table in batch],
+            promote_options="default",
+        )
+        batch_files = [file for _, file, _ in batch]
+        connection.register("ingest_batch", table)
+        connection.begin()
+        try:
+            report.rows += connection.execute(upsert_statement(target, key_cols, update_cols, "ingest_batch")).fetchone()[0]
+            if manifest_table:
+                insert_manifest(connection, manifest_table, target, batch_files, stats)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.unregister("ingest_batch")
+        report.batches += 1
+        report.write_seconds += time.perf_counter() - tic
+        logger.info("Upserted %s files (%s rows so far) into %s", len(batch), report.rows, target)
+
+    readers = [threading.Thread(target=read_files, daemon=True) for _ in range(min(n_readers, len(stats)))]
+    for reader in readers:
+        reader.start()
+    try:
+        finished, next_position, waiting, batch, rows = 0, 0, {}, [], 0
+        while finished < len(readers):
+            tic = time.perf_counter()
+            item = results.get()
+            report.writer_idle_seconds += time.perf_counter() - tic
+            if item is _READER_DONE:
+                finished += 1
+                continue
+            position, file, table = item
+            if isinstance(table, Exception):
+                raise table
+            waiting[position] = (position, file, table)
+            # release the files in order
+            while next_position in waiting:
+                batch.append(waiting.pop(next_position))
+                window.release()
+                rows += batch[-1][2].num_rows
+                next_position += 1
+                if len(batch) >= batch_files or rows >= batch_rows:
+                    write(batch)
+                    batch, rows = [], 0
+        if batch:
+            write(batch)
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    report.seconds = time.perf_counter() - start
+    current_span().set(target=target, **report.asdict())
+    logger.info(
+        "Ingested %s rows from %s files into %s at %.0f rows/s (%s files skipped)",
+        report.rows, len(pending), target, report.rows_per_second, report.skipped,
+    )
+    return report
 
 def upsert_data_from_parquet(connection: duckdb.DuckDBPyConnection, path:Path):
     """
     Upserts data from a processed file into the dwh.main.pickup_hourly table.
 
-    This function reads data from a parquet file.
-    creates a temporary staging table, and then upserts the data into the dwh.main.pickup_hourly table.
     If a record with the same key already exists, it updates the num_pickup field with the new value.
+    It is 'upsert_parquet_files' for a single file and without manifest, use it directly to load
+    many files at once.
 
     Parameters:
     - db (duckdb.DuckDBPyConnection): The database connection object.
@@ -17,26 +423,8 @@ def upsert_data_from_parquet(connection: duckdb.DuckDBPyConnection, path:Path):
     Returns:
     None
     """
-    # replace with parquet path
-    file = str(path)
-    
-    # pylint: disable=consider-using-f-string
-    statement = """
-        CREATE OR REPLACE TEMP TABLE stg_pickup_hourly AS
-        SELECT * 
-        FROM read_parquet('{file}');
-        
-        INSERT INTO dwh.main.pickup_hourly  
-        SELECT * FROM stg_pickup_hourly
-        ON CONFLICT(key)
-        DO UPDATE SET num_pickup = EXCLUDED.num_pickup;
-        
-        DROP TABLE stg_pickup_hourly;
-    """.format(file=file)
-    # pylint: enable=consider-using-f-string
-    
-    with connection:
-        connection.execute(statement)
-    logger.info("Upserted %s into dwh.main.pickup_hourly", file)
+    upsert_parquet_files(
+        connection, [path], "dwh.main.pickup_hourly", ["key"], ["num_pickup"], manifest_table=False
+    )
 
 ###########################################################
@@ -1,3 +1,23 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+import time
+if __package__:
+    from .cache_utils import cached
+    from .lazy_utils import lazy_import
+else:
+    from cache_utils import cached
+    from lazy_utils import lazy_import
+
+plt = lazy_import("matplotlib.pyplot", "matplotlib")
+np = lazy_import("numpy", "numpy")
+pd = lazy_import("pandas", "pandas")
+sns = lazy_import("seaborn", "seaborn")
+
+CORRELATION_METHODS = ["pearson", "spearman"]
+PROFILE_QUANTILES = [0.01, 0.25, 0.5, 0.75, 0.99]
+CARDINALITY_METHODS = ["exact", "hll", None]
+
 def check_nulls(df:pd.DataFrame, selected_cols: list[str], threshold: float = 0.05) -> list[str]:
     """Checks for problematic nulls in the selected columns and all the columns.
 
@@ -9,9 +29,7 @@ def check_nulls(df:pd.DataFrame, selected_cols: list[str], threshold: float = 0.
         print('-------------------')
 
     columns_with_nulls_over_threshold = (
-        df
-        .isnull()
-        .mean()
+        get_null_rates(df)
         .gt(threshold)
         .loc[lambda x: x]
         .index
@@ -19,12 +37,17 @@ def check_nulls(df:pd.DataFrame, selected_cols: list[str], threshold: float = 0.
     )
 
     print(f"Rows with more than {threshold:.0%} nulls")
-    print(df[columns_with_nulls_over_threshold].isnull().mean())
+    print(get_null_rates(df[columns_with_nulls_over_threshold]))
     print('-------------------')
 
     return columns_with_nulls_over_threshold
 
 
+def get_null_rates(df:pd.DataFrame) -> pd.Series:
+    """Null rate of every column, one column at a time instead of a boolean copy of the whole frame."""
+    return pd.Series({col: df[col].isna().mean() for col in df.columns}, dtype=float)
+
+
 def is_numeric(series: pd.Series) -> bool:
     """
     This function takes a pandas Series as an argument and returns True if the series data type is numeric (float or int).
@@ -32,11 +55,187 @@ def is_numeric(series: pd.Series) -> bool:
     return pd.api.types.is_numeric_dtype(series)
 
 
+def check_correlation_method(method:str) -> None:
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"method must be one of {CORRELATION_METHODS}, got {method!r}")
+
+
+def get_numeric_matrix(data:pd.DataFrame, columns:list[str], method:str="pearson") -> np.ndarray:
+    """Float matrix of the columns, NaN for the missing values, ranked (average ties) for spearman."""
+    matrix = data[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    if method == "spearman":
+        matrix = data[columns].rank(method="average").to_numpy(dtype=np.float64, na_value=np.nan)
+    return matrix
+
+
+def pairwise_correlations(x:np.ndarray, y:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pearson correlation of every column of x (n, k) with every column of y (n, m), over the rows where both are not
+    missing, with masked matrix products. Returns the (k, m) correlations and the (k, m) number of rows used.
+    """
+    mask_x, mask_y = ~np.isnan(x), ~np.isnan(y)
+    if mask_x.all() and mask_y.all():
+        x, y = x - x.mean(axis=0), y - y.mean(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = np.clip((x.T @ y) / np.sqrt(np.outer(np.einsum("ij,ij->j", x, x), np.einsum("ij,ij->j", y, y))), -1, 1)
+        return corr, np.full(corr.shape, len(x), dtype=np.int64)
+    # Centering first keeps the sums of squares from cancelling out
+    x = np.where(mask_x, x - np.nanmean(x, axis=0), 0.0)
+    y = np.where(mask_y, y - np.nanmean(y, axis=0), 0.0)
+    mx, my = mask_x.astype(np.float64), mask_y.astype(np.float64)
+    n = mx.T @ my
+    sum_x, sum_y = x.T @ my, mx.T @ y
+    sum_xy = x.T @ y
+    sum_xx, sum_yy = (x**2).T @ my, mx.T @ (y**2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = n * sum_xy - sum_x * sum_y
+        var_x, var_y = n * sum_xx - sum_x**2, n * sum_yy - sum_y**2
+        corr = np.clip(cov / np.sqrt(var_x * var_y), -1, 1)
+    corr[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return corr, n.astype(np.int64)
+
+
+def get_correlations(data:pd.DataFrame, target:str, covariates:list[str]=None, method:str="pearson", chunk_cols:int=64) -> pd.DataFrame:
+    """Correlation of every numeric covariate with the target, in a vectorized pass over blocks of columns.
+
+    Args:
+        data (pd.DataFrame): The data.
+        target (str): The target column.
+        covariates (list[str], optional): The covariates, the numeric columns but the target by default.
+        method (str, optional): "pearson" or "spearman". Defaults to "pearson".
+        chunk_cols (int, optional): Columns per block, bounds the float copy to n * chunk_cols. Defaults to 64.
+
+    Returns:
+        pd.DataFrame: correlation and n (rows where covariate and target are not missing), indexed by covariate.
+
+    Description:
+        Same result as data[[covariate, target]].corr(method) for every covariate. Rows with a missing target are dropped
+        once. For spearman the target is ranked once, and re-ranked only for the covariates with missing values, since
+        the ranks have to be computed on the rows both columns share.
+    """
+    check_correlation_method(method)
+    if covariates is None:
+        covariates = [col for col in data.columns if col != target and is_numeric(data[col])]
+    data = data.loc[data[target].notna()]
+    y = get_numeric_matrix(data, [target], method)
+    results = []
+    for first in range(0, len(covariates), chunk_cols):
+        block = covariates[first:first + chunk_cols]
+        x = get_numeric_matrix(data, block, method)
+        corr, n = pairwise_correlations(x, y)
+        corr, n = corr[:, 0], n[:, 0]
+        if method == "spearman":
+            for j in np.flatnonzero(n < len(data)):
+                valid = ~np.isnan(x[:, j])
+                subset = data.loc[valid, [block[j], target]].rank(method="average").to_numpy(dtype=np.float64)
+                corr[j] = pairwise_correlations(subset[:, :1], subset[:, 1:])[0][0, 0]
+        results.append(pd.DataFrame({"correlation": corr, "n": n}, index=pd.Index(block, name="covariate")))
+    if not results:
+        return pd.DataFrame({"correlation": pd.Series(dtype=float), "n": pd.Series(dtype=np.int64)}, index=pd.Index([], name="covariate"))
+    return pd.concat(results)
+
+
+def correlation_matrix(data:pd.DataFrame, columns:list[str]=None, method:str="pearson") -> pd.DataFrame:
+    """Correlation matrix of the numeric columns, pairwise complete like DataFrame.corr, with matrix products.
+
+    Spearman ranks every column once over its own non-missing values, so with missing values it is an approximation of
+    pairwise Spearman (exact without missing values).
+    """
+    check_correlation_method(method)
+    if columns is None:
+        columns = [col for col in data.columns if is_numeric(data[col])]
+    x = get_numeric_matrix(data, columns, method)
+    corr, _ = pairwise_correlations(x, x)
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+def get_group_associations(data:pd.DataFrame, target:str, covariates:list[str]) -> pd.DataFrame:
+    """Association of categorical covariates with a numeric target from group statistics.
+
+    Args:
+        data (pd.DataFrame): The data.
+        target (str): The numeric target.
+        covariates (list[str]): The categorical covariates.
+
+    Returns:
+        pd.DataFrame: eta_squared (share of the target variance explained by the groups), f_statistic of the one-way
+        ANOVA, n_groups and n, indexed by covariate.
+
+    Description:
+        Every covariate is factorized and the group counts, sums and sums of squares of the target come from
+        np.bincount, a single pass without groupby. Missing categories are a group.
+    """
+    data = data.loc[data[target].notna()]
+    y = data[target].to_numpy(dtype=np.float64)
+    n = len(y)
+    total_ss = np.sum((y - y.mean()) ** 2) if n else np.nan
+    rows = []
+    for covariate in covariates:
+        codes, uniques = pd.factorize(data[covariate], use_na_sentinel=False)
+        counts = np.bincount(codes)
+        sums = np.bincount(codes, weights=y)
+        n_groups = np.count_nonzero(counts)
+        between_ss = np.sum(sums[counts > 0] ** 2 / counts[counts > 0]) - y.sum() ** 2 / n if n else np.nan
+        within_ss = total_ss - between_ss
+        eta_squared = between_ss / total_ss if total_ss > 0 else np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            f_statistic = (between_ss / (n_groups - 1)) / (within_ss / (n - n_groups)) if n_groups > 1 and n > n_groups else np.nan
+        rows.append({"covariate": covariate, "eta_squared": eta_squared, "f_statistic": f_statistic, "n_groups": n_groups, "n": n})
+    return pd.DataFrame(rows, columns=["covariate", "eta_squared", "f_statistic", "n_groups", "n"]).set_index("covariate")
+
+
+@cached(columns=lambda args: [args["target"], *args["covariates"]], opt_in=True)
+def rank_covariates(data:pd.DataFrame, target:str, covariates:list[str], method:str="spearman") -> pd.DataFrame:
+    """Ranks numeric and categorical covariates by their association with the target.
+
+    Args:
+        data (pd.DataFrame): The data.
+        target (str): The numeric target.
+        covariates (list[str]): The covariates, numeric or categorical.
+        method (str, optional): Correlation of the numeric covariates, "pearson" or "spearman". Defaults to "spearman".
+
+    Returns:
+        pd.DataFrame: One row per covariate sorted by strength: kind, statistic (the correlation or eta squared),
+        value, strength and n. The strength is the share of variance explained, correlation squared for the numeric
+        covariates and eta squared for the categorical ones, so both kinds are comparable. Pass use_cache=True to
+        look the ranking up in the result cache, see cache_utils.cached.
+    """
+    numeric = [col for col in covariates if is_numeric(data[col])]
+    categorical = [col for col in covariates if col not in numeric]
+    correlations = get_correlations(data, target, numeric, method)
+    groups = get_group_associations(data, target, categorical)
+    ranking = pd.concat([
+        pd.DataFrame({"kind": "numeric", "statistic": method, "value": correlations["correlation"], "strength": correlations["correlation"] ** 2, "n": correlations["n"]}),
+        pd.DataFrame({"kind": "categorical", "statistic": "eta_squared", "value": groups["eta_squared"], "strength": groups["eta_squared"], "n": groups["n"]}),
+    ])
+    return ranking.sort_values("strength", ascending=False, na_position="last")
+
+
+def get_box_stats(data:pd.DataFrame, target:str, covariate:str, max_groups:int=30) -> list[dict]:
+    """Box plot statistics of the target for the 'max_groups' most frequent groups of the covariate (all of them if
+    None), for Axes.bxp, without fliers."""
+    grouped = data.groupby(covariate, observed=True)[target]
+    counts = grouped.size().sort_values(ascending=False, kind="stable")[:max_groups]
+    quantiles = grouped.quantile([0.25, 0.5, 0.75]).unstack().loc[counts.index]
+    low, high = grouped.min().loc[counts.index], grouped.max().loc[counts.index]
+    stats = []
+    for group, (q1, median, q3) in quantiles.iterrows():
+        iqr = q3 - q1
+        stats.append({
+            "label": str(group), "q1": q1, "med": median, "q3": q3,
+            "whislo": max(low[group], q1 - 1.5 * iqr), "whishi": min(high[group], q3 + 1.5 * iqr), "fliers": [],
+        })
+    return stats
+
+
 def plot_relation_between_target_and_covariates(
         data: pd.DataFrame,
         target:str, 
         covariates:list[str], 
         ncols:int=3, 
+        max_points:int=5_000,
+        seed:int=None,
+        max_groups:int=30,
         **kwargs
     ):
     """
@@ -44,17 +243,29 @@ def plot_relation_between_target_and_covariates(
     It then plots scatterplots for numeric covariates and boxplots for categorical covariates, with the target column on the y-axis and each covariate on the x-axis.
     Additionally, for numeric covariates, it annotates the plot with the Pearson correlation value between the target and the covariate.
     The function returns nothing, but displays the plot.
+
+    The statistics come from the full data, computed once for all covariates (get_correlations, get_box_stats), while
+    matplotlib only receives compact data: the scatterplots draw a random sample of at most max_points rows, with the
+    regression line and no bootstrapped CI unless 'ci' is passed, and the boxplots are drawn from precomputed group
+    quantiles of the 'max_groups' most frequent groups (None for all of them); the title says when groups were left
+    out. kwargs are passed to sns.regplot and sns.boxplot; with kwargs, the boxplots are drawn by sns.boxplot from
+    the full data and every group, as Axes.bxp doesn't take them.
     """
+    regplot_kwargs = dict(kwargs)
+    regplot_kwargs.setdefault("ci", None)
+    numeric = [covariate for covariate in covariates if is_numeric(data[covariate])]
+    correlations = get_correlations(data, target, numeric)["correlation"]
+    sample = data.sample(n=max_points, random_state=seed) if len(data) > max_points else data
+
     nrows = int(np.ceil(len(covariates) / ncols))
     fig, axs = plt.subplots(nrows=nrows, ncols=ncols, figsize=(15, 5*nrows))
-    axs = axs.flatten()
+    axs = np.atleast_1d(axs).flatten()
     for i, covariate in enumerate(covariates):
-        if is_numeric(data[covariate]):
-            sns.regplot(x=covariate, y=target, data=data, ax=axs[i], **kwargs)
-            # Calculate and annotate Pearson correlation
-            correlation = data[[covariate, target]].corr().iloc[0,1]
+        title = f'{target} vs {covariate}'
+        if covariate in correlations.index:
+            sns.regplot(x=covariate, y=target, data=sample, ax=axs[i], **regplot_kwargs)
             axs[i].annotate(
-                f'Pearson: {correlation:.2f}'
+                f'Pearson: {correlations[covariate]:.2f}'
                 , xy=(0.05, 0.95)
                 , xycoords='axes fraction'
                 , ha='left'
@@ -62,25 +273,40 @@ def plot_relation_between_target_and_covariates(
                 , fontsize=10
                 , bbox=dict(boxstyle="round", alpha=0.5, color="w")
             )
-        else:
+        elif kwargs:
             sns.boxplot(x=covariate, y=target, data=data, ax=axs[i], **kwargs)
-        axs[i].set_title(f'{target} vs {covariate}')
+        else:
+            box_stats = get_box_stats(data, target, covariate, max_groups)
+            axs[i].bxp(box_stats, showfliers=False)
+            axs[i].set_xlabel(covariate)
+            axs[i].set_ylabel(target)
+            n_groups = data[covariate].nunique()
+            if len(box_stats) < n_groups:
+                title = f'{title} (top {len(box_stats)} of {n_groups} groups)'
+        axs[i].set_title(title)
     plt.tight_layout()
     plt.show()
 
-def plot_categories(df:pd.DataFrame, plot_func: callable, x:str, y:str, hue:str, color:str = "grey") -> None:
+def plot_categories(df:pd.DataFrame, plot_func: callable, x:str, y:str, hue:str, color:str = "grey", aggregate:str = None) -> None:
     """Create a plot for each category in hue. The value of this function
     is that the color is the same for each category. This is meant to be
     used as a background plot for a plot that will be plotted on top of it.
 
+    With 'aggregate', e.g. "mean", the data is aggregated first, one row per category and x,
+    so the plot function only receives the points it draws instead of every raw row
+    (seaborn's lineplot would otherwise aggregate and bootstrap a CI per category and x).
+
     Args:
-        df (pd.DataFrame): _description_
-        plot_func (callable): _description_
-        x (str): _description_
-        y (str): _description_
-        hue (str): _description_
-        color (str, optional): _description_. Defaults to "grey".
+        df (pd.DataFrame): The data.
+        plot_func (callable): A seaborn function with x, y, hue, data, palette and legend arguments, e.g. sns.lineplot.
+        x (str): The x column.
+        y (str): The y column.
+        hue (str): The category column, one line / series each.
+        color (str, optional): The color of every category. Defaults to "grey".
+        aggregate (str, optional): Aggregation of y per category and x, any groupby aggregation, or None to plot the raw rows. Defaults to None.
     """
+    if aggregate is not None:
+        df = df.groupby([hue, x], observed=True, sort=True)[y].agg(aggregate).reset_index()
     unique_values = df[hue].unique()
     palette_dict = {value: color for value in unique_values}
     plot_func(
@@ -92,3 +318,381 @@ def plot_categories(df:pd.DataFrame, plot_func: callable, x:str, y:str, hue:str,
         legend=False
     )
     plt.show()
+
+
+@dataclass
+class ColumnProfile:
+    column:str
+    dtype:str
+    count:int
+    null_count:int
+    null_rate:float
+    n_unique:int = None
+    n_unique_approx:bool = False
+    min:object = None
+    max:object = None
+    mean:float = None
+    quantiles:dict = field(default_factory=dict)
+
+    def asdict(self):
+        return asdict(self)
+
+@dataclass
+class Profile:
+    n_rows:int
+    n_rows_profiled:int
+    sampled:bool
+    backend:str
+    seconds:float
+    columns:list[ColumnProfile]
+
+    def __getitem__(self, column:str) -> ColumnProfile:
+        return next(profile for profile in self.columns if profile.column == column)
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per column, the quantiles as q{quantile} columns."""
+        rows = []
+        for profile in self.columns:
+            row = profile.asdict()
+            row.update({f"q{q:g}": value for q, value in row.pop("quantiles").items()})
+            rows.append(row)
+        return pd.DataFrame(rows).set_index("column")
+
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch of the number of distinct values, with 2**precision registers.
+
+    The relative error is about 1.04 / sqrt(2**precision), 0.8% with the default precision. Values are hashed
+    with pd.util.hash_pandas_object, so any dtype works, and sketches of different chunks can be merged.
+    """
+
+    def __init__(self, precision:int=14):
+        self.precision = precision
+        self.registers = np.zeros(2**precision, dtype=np.uint8)
+
+    def update(self, values:pd.Series) -> None:
+        # Duplicates don't change the sketch, hashing the distinct values of the chunk is enough and faster
+        hashes = pd.util.hash_pandas_object(pd.Series(pd.unique(values)), index=False).to_numpy()
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64(2**bits - 1)
+        # Position of the leftmost 1 in the remaining bits, from the exponent of the float
+        rank = (bits + 1 - np.frexp(rest.astype(np.float64))[1]).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other:"HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m**2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class ColumnAccumulator:
+    """
+    Statistics of a column, updated chunk by chunk: nulls, distinct values (exact or HyperLogLog), min, max, mean
+    and the quantiles of a Bernoulli sample of the values ('quantile_rate').
+    """
+
+    def __init__(self, column:str, dtype, cardinality:str="exact", quantiles:list[float]=PROFILE_QUANTILES, quantile_rate:float=1.0, rng:np.random.Generator=None, hll_precision:int=14):
+        self.column = column
+        self.dtype = dtype
+        self.cardinality = cardinality
+        self.quantiles = quantiles
+        self.quantile_rate = quantile_rate
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.is_numeric = pd.api.types.is_numeric_dtype(dtype)
+        self.is_ordered = self.is_numeric or pd.api.types.is_datetime64_any_dtype(dtype)
+        self.count = 0
+        self.null_count = 0
+        self.uniques = None
+        self.hll = HyperLogLog(hll_precision) if cardinality == "hll" else None
+        self.min = self.max = None
+        self.total = 0.0
+        self.samples = []
+
+    def update(self, chunk:pd.Series) -> None:
+        valid = chunk.dropna()
+        self.count += len(chunk)
+        self.null_count += len(chunk) - len(valid)
+        if len(valid) == 0:
+            return
+        if self.cardinality == "exact":
+            uniques = pd.unique(valid)
+            self.uniques = uniques if self.uniques is None else pd.unique(np.concatenate([self.uniques, uniques]))
+        elif self.cardinality == "hll":
+            self.hll.update(valid)
+        if self.is_ordered:
+            low, high = valid.min(), valid.max()
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+        if self.is_numeric:
+            values = valid.to_numpy(dtype=np.float64)
+            self.total += values.sum()
+            if self.quantile_rate < 1:
+                values = values[self.rng.random(len(values)) < self.quantile_rate]
+            self.samples.append(values)
+
+    def result(self) -> ColumnProfile:
+        n_valid = self.count - self.null_count
+        if self.cardinality == "exact":
+            n_unique = 0 if self.uniques is None else len(self.uniques)
+        elif self.cardinality == "hll":
+            n_unique = self.hll.estimate()
+        else:
+            n_unique = None
+        profile = ColumnProfile(
+            column=self.column,
+            dtype=str(self.dtype),
+            count=self.count,
+            null_count=self.null_count,
+            null_rate=self.null_count / self.count if self.count else np.nan,
+            n_unique=n_unique,
+            n_unique_approx=self.cardinality == "hll",
+            min=self.min,
+            max=self.max,
+        )
+        if self.is_numeric and n_valid:
+            profile.mean = self.total / n_valid
+            samples = np.concatenate(self.samples)
+            if len(samples):
+                profile.quantiles = dict(zip(self.quantiles, np.quantile(samples, self.quantiles).tolist()))
+        return profile
+
+
+def check_cardinality(cardinality:str) -> None:
+    if cardinality not in CARDINALITY_METHODS:
+        raise ValueError(f"cardinality must be one of {CARDINALITY_METHODS}, got {cardinality!r}")
+
+
+def profile_dataframe(
+        df:pd.DataFrame,
+        columns:list[str]=None,
+        cardinality:str="exact",
+        quantiles:list[float]=PROFILE_QUANTILES,
+        sample:float=None,
+        seed:int=None,
+        chunk_rows:int=1_000_000,
+        quantile_sample:int=1_000_000,
+        n_jobs:int=1,
+        hll_precision:int=14,
+        use_cache:bool=False,
+    ) -> Profile:
+    """Profiles the columns of a DataFrame in a single chunked pass per column, without printing.
+
+    Args:
+        df (pd.DataFrame): The data.
+        columns (list[str], optional): Columns to profile. Defaults to all of them.
+        cardinality (str, optional): "exact" distinct count, "hll" HyperLogLog estimate or None to skip it. Defaults to "exact".
+        quantiles (list[float], optional): Quantiles of the numeric columns. Defaults to PROFILE_QUANTILES.
+        sample (float, optional): Profile a random sample of rows instead, a fraction if < 1 or a number of rows. Defaults to None.
+        seed (int, optional): Seed of the sample and of the quantile sample. Defaults to None.
+        chunk_rows (int, optional): Rows per chunk, bounds the temporary copies. Defaults to 1_000_000.
+        quantile_sample (int, optional): Approximate number of values per column kept for the quantiles, exact below it. Defaults to 1_000_000.
+        n_jobs (int, optional): Columns profiled in parallel, in threads. Defaults to 1.
+        hll_precision (int, optional): Precision of the HyperLogLog sketches. Defaults to 14.
+        use_cache (bool, optional): Look the profile up in the result cache, hashing the columns costs about as much
+                                    as a sampled profile. Defaults to False.
+
+    Returns:
+        Profile: Null rates, cardinality, min/max/mean/quantiles and dtype of every column, see Profile.to_frame.
+
+    Description:
+        Every column is read once, chunk by chunk, by a ColumnAccumulator, so nothing bigger than a chunk is copied
+        (df.isnull() copies the whole frame). Exact distinct counts keep the distinct values in memory; "hll" keeps
+        16 KB per column. The quantiles come from a Bernoulli sample of about 'quantile_sample' values.
+        With 'sample', the statistics are estimates from the sampled rows and n_rows_profiled is the sample size.
+        With use_cache, the column profiles are cached on the content of the columns and the arguments but n_jobs,
+        see cache_utils.cached; 'seconds' is the time of the call, a lookup on a hit. A profile drawn without a seed
+        (sample, or quantiles of more than 'quantile_sample' rows) is never cached.
+    """
+    check_cardinality(cardinality)
+    start = time.perf_counter()
+    random = seed is None and (sample is not None or len(df) > quantile_sample)
+    n_rows, n_profiled, profiles = profile_columns(
+        df, columns, cardinality, quantiles, sample, seed, chunk_rows, quantile_sample, n_jobs, hll_precision,
+        use_cache=use_cache and not random,
+    )
+    return Profile(n_rows, n_profiled, sample is not None, "pandas", time.perf_counter() - start, profiles)
+
+
+@cached(columns=lambda args: args["columns"], opt_in=True, ignore=["n_jobs"])
+def profile_columns(
+        df:pd.DataFrame,
+        columns:list[str],
+        cardinality:str,
+        quantiles:list[float],
+        sample:float,
+        seed:int,
+        chunk_rows:int,
+        quantile_sample:int,
+        n_jobs:int,
+        hll_precision:int,
+    ) -> tuple[int, int, list[ColumnProfile]]:
+    """The number of rows, the number of rows profiled and the column profiles of profile_dataframe."""
+    columns = list(df.columns) if columns is None else columns
+    n_rows = len(df)
+    data = df[columns]
+    if sample is not None:
+        data = data.sample(frac=sample, random_state=seed) if sample < 1 else data.sample(n=min(int(sample), n_rows), random_state=seed)
+    n_profiled = len(data)
+    quantile_rate = min(1.0, quantile_sample / n_profiled) if n_profiled else 1.0
+
+    def profile_column(i:int) -> ColumnProfile:
+        series = data.iloc[:, i]
+        accumulator = ColumnAccumulator(
+            columns[i], series.dtype, cardinality, quantiles, quantile_rate,
+            np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(i,))), hll_precision
+        )
+        for first in range(0, n_profiled, chunk_rows):
+            accumulator.update(series.iloc[first:first + chunk_rows])
+        return accumulator.result()
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        profiles = list(executor.map(profile_column, range(len(columns))))
+    return n_rows, n_profiled, profiles
+
+
+def profile_parquet(
+        source:str,
+        columns:list[str]=None,
+        cardinality:str="exact",
+        quantiles:list[float]=PROFILE_QUANTILES,
+        sample:float=None,
+        seed:int=None,
+        backend:str="duckdb",
+        connection=None,
+    ) -> Profile:
+    """Profiles parquet files on disk with DuckDB or polars, in a single query, without loading them in pandas.
+
+    Args:
+        source (str): Parquet file, glob or list of files (polars), or a table name of 'connection' (duckdb).
+        columns (list[str], optional): Columns to profile. Defaults to all of them.
+        cardinality (str, optional): "exact", "hll" (approximate distinct count of the engine) or None. Defaults to "exact".
+        quantiles (list[float], optional): Quantiles of the numeric columns. Defaults to PROFILE_QUANTILES.
+        sample (float, optional): Profile a random sample of rows instead, a fraction if < 1 or a number of rows. Defaults to None.
+        seed (int, optional): Seed of the sample. Defaults to None.
+        backend (str, optional): "duckdb" or "polars". Defaults to "duckdb".
+        connection (duckdb.DuckDBPyConnection, optional): DuckDB connection, an in-memory one by default.
+
+    Returns:
+        Profile: Same structure as profile_dataframe.
+
+    Description:
+        DuckDB computes the quantiles with approx_quantile, a t-digest, and the "hll" distinct count with
+        approx_count_distinct. Polars runs the query with the streaming engine and computes exact quantiles.
+    """
+    check_cardinality(cardinality)
+    start = time.perf_counter()
+    if backend == "duckdb":
+        import duckdb
+
+        connection = connection if connection is not None else duckdb.connect()
+        n_rows, n_profiled, profiles = profile_duckdb(connection, source, columns, cardinality, quantiles, sample, seed)
+    elif backend == "polars":
+        n_rows, n_profiled, profiles = profile_polars(source, columns, cardinality, quantiles, sample, seed)
+    else:
+        raise ValueError(f"backend must be 'duckdb' or 'polars', got {backend!r}")
+    return Profile(n_rows, n_profiled, sample is not None, backend, time.perf_counter() - start, profiles)
+
+
+def get_column_profile(column:str, dtype:str, n_profiled:int, values:dict, cardinality:str, quantiles:list[float]) -> ColumnProfile:
+    """ColumnProfile from the aggregates of a DuckDB / polars query, keyed by nulls, n_unique, min, max, mean, q{i}."""
+    quantile_values = [values.get(f"q{i}") for i in range(len(quantiles))]
+    return ColumnProfile(
+        column=column,
+        dtype=dtype,
+        count=n_profiled,
+        null_count=values["nulls"],
+        null_rate=values["nulls"] / n_profiled if n_profiled else np.nan,
+        n_unique=values.get("n_unique"),
+        n_unique_approx=cardinality == "hll",
+        min=values.get("min"),
+        max=values.get("max"),
+        mean=values.get("mean"),
+        quantiles=dict(zip(quantiles, quantile_values)) if quantile_values and quantile_values[0] is not None else {},
+    )
+
+
+def profile_duckdb(connection, source:str, columns:list[str], cardinality:str, quantiles:list[float], sample:float, seed:int) -> tuple[int, int, list[ColumnProfile]]:
+    relation = f"read_parquet('{source}')" if source.endswith(".parquet") or "*" in source else source
+    schema = connection.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()
+    dtypes = {name: dtype for name, dtype, *_ in schema}
+    columns = list(dtypes) if columns is None else columns
+    n_rows = connection.execute(f"SELECT count(*) FROM {relation}").fetchone()[0]
+
+    numeric = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL")
+    not_ordered = ("STRUCT", "MAP", "LIST", "UNION", "[]")
+    expressions = ["count(*) AS n"]
+    for i, col in enumerate(columns):
+        quoted = '"{}"'.format(col.replace('"', '""'))
+        expressions.append(f"count(*) - count({quoted}) AS c{i}_nulls")
+        if cardinality == "exact":
+            expressions.append(f"count(DISTINCT {quoted}) AS c{i}_n_unique")
+        elif cardinality == "hll":
+            expressions.append(f"approx_count_distinct({quoted}) AS c{i}_n_unique")
+        if not any(kind in dtypes[col] for kind in not_ordered):
+            expressions += [f"min({quoted}) AS c{i}_min", f"max({quoted}) AS c{i}_max"]
+        if dtypes[col].startswith(numeric):
+            expressions.append(f"avg({quoted}) AS c{i}_mean")
+            if quantiles:
+                expressions.append(f"approx_quantile({quoted}, {list(quantiles)}) AS c{i}_quantiles")
+
+    sampling = ""
+    if sample is not None:
+        size, method = (f"{sample * 100}%", "bernoulli") if sample < 1 else (f"{int(sample)} ROWS", "reservoir")
+        sampling = f"USING SAMPLE {size} ({method}{'' if seed is None else f', {seed}'})"
+    result = connection.execute(f"SELECT {', '.join(expressions)} FROM {relation} {sampling}").fetchdf().iloc[0]
+    n_profiled = int(result["n"])
+    profiles = []
+    for i, col in enumerate(columns):
+        prefix = f"c{i}_"
+        values = {key[len(prefix):]: (None if np.ndim(value) == 0 and pd.isna(value) else value) for key, value in result.items() if key.startswith(prefix)}
+        values["nulls"] = int(values["nulls"])
+        if values.get("n_unique") is not None:
+            values["n_unique"] = int(values["n_unique"])
+        if values.get("quantiles") is not None:
+            values.update({f"q{j}": float(value) for j, value in enumerate(values.pop("quantiles"))})
+        profiles.append(get_column_profile(col, dtypes[col], n_profiled, values, cardinality, quantiles))
+    return n_rows, n_profiled, profiles
+
+
+def profile_polars(source, columns:list[str], cardinality:str, quantiles:list[float], sample:float, seed:int) -> tuple[int, int, list[ColumnProfile]]:
+    import polars as pl
+
+    lf = pl.scan_parquet(source)
+    schema = lf.collect_schema()
+    columns = schema.names() if columns is None else columns
+    n_rows = lf.select(pl.len()).collect().item()
+    if sample is not None:
+        # Bernoulli sample on the hash of the row index, so the scan still streams
+        fraction = sample if sample < 1 else min(1.0, sample / max(n_rows, 1))
+        lf = lf.with_row_index("__row").filter(pl.col("__row").hash(seed or 0) % 1_000_000 < int(fraction * 1_000_000))
+
+    expressions = [pl.len().alias("n")]
+    for i, col in enumerate(columns):
+        dtype = schema[col]
+        expressions.append(pl.col(col).null_count().alias(f"c{i}_nulls"))
+        if cardinality == "exact":
+            expressions.append(pl.col(col).drop_nulls().n_unique().alias(f"c{i}_n_unique"))
+        elif cardinality == "hll":
+            expressions.append(pl.col(col).drop_nulls().approx_n_unique().alias(f"c{i}_n_unique"))
+        if dtype.is_numeric() or dtype.is_temporal() or dtype == pl.String or dtype == pl.Boolean:
+            expressions += [pl.col(col).min().alias(f"c{i}_min"), pl.col(col).max().alias(f"c{i}_max")]
+        if dtype.is_numeric():
+            expressions.append(pl.col(col).mean().alias(f"c{i}_mean"))
+            expressions += [pl.col(col).quantile(q, interpolation="linear").alias(f"c{i}_q{j}") for j, q in enumerate(quantiles)]
+    result = lf.select(expressions).collect(engine="streaming").row(0, named=True)
+    n_profiled = result["n"]
+    profiles = []
+    for i, col in enumerate(columns):
+        prefix = f"c{i}_"
+        values = {key[len(prefix):]: value for key, value in result.items() if key.startswith(prefix)}
+        profiles.append(get_column_profile(col, str(schema[col]), n_profiled, values, cardinality, quantiles))
+    return n_rows, n_profiled, profiles
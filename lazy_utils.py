@@ -0,0 +1,48 @@
+import importlib
+import sys
+import types
+
+"""
+Lazy imports of the heavy dependencies, so importing a helper module costs what the helpers actually use.
+
+    np = lazy_import("numpy")
+
+binds a placeholder module that imports numpy the first time one of its attributes is read, after that it reads as
+numpy itself. Modules using it need 'from __future__ import annotations', otherwise the annotations of their
+functions, e.g. 'df: pd.DataFrame', import the dependency when the module is imported.
+"""
+
+
+class LazyModule(types.ModuleType):
+    """A module that is imported on the first access to one of its attributes."""
+    def __init__(self, name:str, extra:str=None):
+        super().__init__(name)
+        self.__dict__["_lazy_extra"] = extra
+
+    def _load(self) -> types.ModuleType:
+        try:
+            module = importlib.import_module(self.__name__)
+        except ImportError as e:
+            hint = f", install it with 'pip install {self._lazy_extra}'" if self._lazy_extra else ""
+            raise ImportError(f"{self.__name__} is needed by this function but it can't be imported{hint}: {e}") from e
+        # from now on attributes are found without going through __getattr__
+        self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, name:str):
+        return getattr(self._load(), name)
+
+    def __dir__(self) -> list[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        loaded = "" if self.__name__ in sys.modules else " (not imported yet)"
+        return f"<lazy module {self.__name__!r}{loaded}>"
+
+
+def lazy_import(name:str, extra:str=None) -> types.ModuleType:
+    """The module if it's already imported, a LazyModule otherwise. 'extra' is the pip requirement shown when the
+    module is missing, e.g. lazy_import("duckdb", "duckdb")."""
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name, extra)
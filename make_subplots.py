@@ -1,6 +1,30 @@
-import matplotlib.pyplot as plt
-from dataclasses import dataclass
-import pandas as pd
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+if __package__:
+    from .lazy_utils import lazy_import
+else:
+    from lazy_utils import lazy_import
+
+plt = lazy_import("matplotlib.pyplot", "matplotlib")
+np = lazy_import("numpy", "numpy")
+pd = lazy_import("pandas", "pandas")
+sns = lazy_import("seaborn", "seaborn")
+
+"""
+Small multiples of the distribution of many columns. With the "aggregate" backend the histograms, KDEs, quantiles and
+rug samples are computed once per column, with NumPy or DuckDB, and only those summaries reach matplotlib, so the
+render time doesn't grow with the number of rows.
+"""
+
+PLOT_BACKENDS = ["aggregate", "seaborn"]
+SUMMARY_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+# args of the seaborn charts the aggregate backend draws, max_points is its own
+AGGREGATE_ARGS = {
+    "histplot": {"bins", "kde", "color", "alpha"},
+    "kdeplot": {"color"},
+    "rugplot": {"color", "height", "alpha", "linewidth", "max_points"},
+}
 
 
 @dataclass
@@ -9,29 +33,290 @@ class Chart:
     args: dict[str, any]
 
 
-def make_subplots(charts: list[Chart], data: pd.DataFrame, columns: list[str], n_columns:int=2, row_height:int=5, width:int=15):
+@dataclass
+class ColumnSummary:
+    column:str
+    n:int
+    edges:np.ndarray
+    counts:np.ndarray
+    grid:np.ndarray = None
+    density:np.ndarray = None
+    quantiles:dict = field(default_factory=dict)
+    rug:np.ndarray = None
+
+
+def gaussian_kde_grid(fine_edges:np.ndarray, fine_counts:np.ndarray, bandwidth:float, grid_size:int=200) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Binned Gaussian KDE: the counts of a fine histogram are convolved with the kernel, sampled at the bin width, so
+    the cost depends on the number of bins and not on the number of rows. Returns the grid and the density on it,
+    between the first and last edge (seaborn's cut=0).
+    """
+    width = fine_edges[1] - fine_edges[0]
+    centers = (fine_edges[:-1] + fine_edges[1:]) / 2
+    n = fine_counts.sum()
+    if n == 0 or bandwidth <= 0 or width <= 0:
+        return centers, np.zeros_like(centers)
+    half = int(np.ceil(4 * bandwidth / width))
+    offsets = np.arange(-half, half + 1) * width
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    density = np.convolve(fine_counts, kernel, mode="full")[half:half + len(fine_counts)] / n
+    grid = np.linspace(fine_edges[0], fine_edges[-1], grid_size)
+    return grid, np.interp(grid, centers, density)
+
+
+def scott_bandwidth(n:int, std:float) -> float:
+    """Scott's rule, the default bandwidth of scipy / seaborn."""
+    return std * n ** (-1 / 5) if n > 1 else 0.0
+
+
+def summarize_values(
+        column:str,
+        values:np.ndarray,
+        bins:int=10,
+        kde:bool=True,
+        quantiles:list[float]=SUMMARY_QUANTILES,
+        rug_size:int=1_000,
+        kde_bins:int=2_048,
+        seed:int=None,
+    ) -> ColumnSummary:
+    """Histogram, binned KDE, quantiles and a random sample for the rug of a column, with NumPy.
+
+    Args:
+        column (str): The name of the column.
+        values (np.ndarray): The values, missing values are dropped.
+        bins (int, optional): Number of bins of the histogram. Defaults to 10.
+        kde (bool, optional): Estimate the density on a grid. Defaults to True.
+        quantiles (list[float], optional): Quantiles to compute. Defaults to SUMMARY_QUANTILES.
+        rug_size (int, optional): Values kept for the rug, 0 for no rug. Defaults to 1_000.
+        kde_bins (int, optional): Bins of the fine histogram of the KDE. Defaults to 2_048.
+        seed (int, optional): Seed of the rug sample. Defaults to None.
+
+    Returns:
+        ColumnSummary: The compact summary of the column.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    n = len(values)
+    if n == 0:
+        return ColumnSummary(column, 0, np.array([0.0, 1.0]), np.zeros(1))
+    low, high = values.min(), values.max()
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    counts, edges = np.histogram(values, bins=bins, range=(low, high))
+    summary = ColumnSummary(column, n, edges, counts)
+    if quantiles:
+        summary.quantiles = dict(zip(quantiles, np.quantile(values, quantiles).tolist()))
+    if kde:
+        fine_counts, fine_edges = np.histogram(values, bins=kde_bins, range=(low, high))
+        summary.grid, summary.density = gaussian_kde_grid(fine_edges, fine_counts, scott_bandwidth(n, values.std(ddof=1)))
+    if rug_size:
+        rng = np.random.default_rng(seed)
+        summary.rug = values if n <= rug_size else rng.choice(values, rug_size, replace=False)
+    return summary
+
+
+def summarize_duckdb(
+        connection,
+        relation:str,
+        column:str,
+        bins:int=10,
+        kde:bool=True,
+        quantiles:list[float]=SUMMARY_QUANTILES,
+        rug_size:int=1_000,
+        kde_bins:int=2_048,
+        seed:int=None,
+    ) -> ColumnSummary:
+    """Same summary as summarize_values computed by DuckDB, for a table or read_parquet(...) scan of 'relation'.
+
+    The range, standard deviation and quantiles (t-digest, approx_quantile) come from one aggregation, the histogram and the fine histogram of the
+    KDE from a GROUP BY on the bin number, and the rug from a reservoir sample. Only the aggregates are fetched.
+    """
+    quoted = '"{}"'.format(column.replace('"', '""'))
+    n, low, high, std, quantile_values = connection.execute(f"""
+        SELECT count({quoted}), min({quoted}), max({quoted}), stddev_samp({quoted}), approx_quantile({quoted}, {list(quantiles)})
+        FROM {relation}
+    """).fetchone()
+    if not n:
+        return ColumnSummary(column, 0, np.array([0.0, 1.0]), np.zeros(1))
+    low, high = float(low), float(high)
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+
+    def histogram(n_bins:int) -> tuple[np.ndarray, np.ndarray]:
+        width = (high - low) / n_bins
+        counts = np.zeros(n_bins)
+        rows = connection.execute(f"""
+            SELECT least(floor(({quoted} - ?) / ?)::BIGINT, ?) AS bin, count(*)
+            FROM {relation}
+            WHERE {quoted} IS NOT NULL
+            GROUP BY bin
+        """, [low, width, n_bins - 1]).fetchall()
+        for bin_, count in rows:
+            counts[bin_] = count
+        return counts, np.linspace(low, high, n_bins + 1)
+
+    counts, edges = histogram(bins)
+    summary = ColumnSummary(column, n, edges, counts, quantiles=dict(zip(quantiles, map(float, quantile_values or []))))
+    if kde:
+        fine_counts, fine_edges = histogram(kde_bins)
+        summary.grid, summary.density = gaussian_kde_grid(fine_edges, fine_counts, scott_bandwidth(n, std or 0.0))
+    if rug_size:
+        repeatable = "" if seed is None else f" REPEATABLE ({seed})"
+        summary.rug = connection.execute(f"""
+            SELECT {quoted} FROM (SELECT {quoted} FROM {relation} WHERE {quoted} IS NOT NULL)
+            USING SAMPLE reservoir({int(rug_size)} ROWS){repeatable}
+        """).fetchnumpy()[column].astype(np.float64)
+    return summary
+
+
+def get_summary_args(charts:list[Chart]) -> dict:
+    """Arguments of summarize_values implied by the charts: bins and kde of sns.histplot, and a rug if sns.rugplot."""
+    args = {"bins": 10, "kde": False, "rug_size": 0}
+    for chart in charts:
+        if chart.callabe is sns.histplot:
+            args["bins"] = chart.args.get("bins", 10)
+            args["kde"] = args["kde"] or chart.args.get("kde", False)
+        elif chart.callabe is sns.kdeplot:
+            args["kde"] = True
+        elif chart.callabe is sns.rugplot:
+            args["rug_size"] = chart.args.get("max_points", 1_000)
+    return args
+
+
+def get_unsupported_args(charts:list[Chart]) -> list[str]:
+    """Args of the histplot, kdeplot and rugplot charts that the aggregate backend can't draw, e.g. hue or stat."""
+    unsupported = []
+    for chart in charts:
+        name = getattr(chart.callabe, "__name__", None)
+        if chart.callabe is getattr(sns, name or "", None) and name in AGGREGATE_ARGS:
+            unsupported += [f"{name}({arg}=...)" for arg in chart.args if arg not in AGGREGATE_ARGS[name]]
+            if name == "histplot" and not isinstance(chart.args.get("bins", 10), int):
+                unsupported.append(f"histplot(bins={chart.args['bins']!r})")
+    return unsupported
+
+
+def is_aggregable(series:pd.Series) -> bool:
+    """Numeric columns, booleans included, which the summaries handle as floats. Datetimes are not."""
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_datetime64_any_dtype(series)
+
+
+def get_seaborn_args(chart:Chart) -> dict:
+    """The args of the chart without the ones of the aggregate backend."""
+    if chart.callabe is sns.rugplot:
+        return {arg: value for arg, value in chart.args.items() if arg != "max_points"}
+    return chart.args
+
+
+def render_summary(ax:plt.Axes, summary:ColumnSummary, charts:list[Chart], data:pd.DataFrame=None) -> None:
+    """
+    Draws the charts of a column from its summary: histograms as one bar per bin, the KDE as a line and the rug as
+    a single line collection. Other callables are called with the raw data.
+    """
+    for chart in charts:
+        args = dict(chart.args)
+        color = args.get("color")
+        if chart.callabe is sns.histplot:
+            color = color if color is not None else "C0"
+            ax.bar(summary.edges[:-1], summary.counts, width=np.diff(summary.edges), align="edge", color=color, alpha=args.get("alpha", 0.5), edgecolor="black")
+            if args.get("kde") and summary.density is not None:
+                width = summary.edges[1] - summary.edges[0]
+                ax.plot(summary.grid, summary.density * summary.n * width, color=color)
+            ax.set_ylabel("Count")
+        elif chart.callabe is sns.kdeplot and summary.density is not None:
+            ax.plot(summary.grid, summary.density, color=color)
+        elif chart.callabe is sns.rugplot and summary.rug is not None:
+            height = args.get("height", 0.025)
+            ax.vlines(summary.rug, 0, height, transform=ax.get_xaxis_transform(), color=color, alpha=args.get("alpha"), linewidth=args.get("linewidth", 1))
+        elif data is not None:
+            chart.callabe(data=data, x=summary.column, ax=ax, **args)
+
+
+def summarize_columns(data:pd.DataFrame, columns:list[str], charts:list[Chart], n_jobs:int=1, seed:int=None, connection=None) -> list[ColumnSummary]:
+    """
+    Summaries of the columns for the charts, in parallel threads, from a DataFrame or a DuckDB relation name. Every
+    thread uses its own cursor of the connection, so the relation must be a table or a read_parquet(...) scan, not a
+    DataFrame registered on the connection.
+    """
+    args = get_summary_args(charts)
+
+    def summarize(column:str) -> ColumnSummary:
+        if connection is not None:
+            return summarize_duckdb(connection.cursor(), data, column, seed=seed, **args)
+        return summarize_values(column, data[column].to_numpy(dtype=np.float64, na_value=np.nan), seed=seed, **args)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(summarize, columns))
+
+
+def make_subplots(
+        charts: list[Chart],
+        data: pd.DataFrame,
+        columns: list[str],
+        n_columns:int=2,
+        row_height:int=5,
+        width:int=15,
+        backend:str="aggregate",
+        n_jobs:int=1,
+        seed:int=None,
+        connection=None,
+    ):
     """Generates small multiples for a given list of charts and columns.
     Args:
         charts (list[Chart]): A chart is a dataclass with a callable and a dict of args. The callable is a
         plt.Axes type, therefore, it supports Seaborn and Matplotlib charts. The args are the arguments
         that will be passed to the callable to customize the chart.
-        
-        data (pd.DataFrame): _description_
-        columns (list[str]): _description_
-        n_columns (int, optional): _description_. Defaults to 2.
+
+        data (pd.DataFrame): The data, or a table name / read_parquet(...) scan of 'connection' with the aggregate backend.
+        columns (list[str]): The columns, one subplot each.
+        n_columns (int, optional): Subplots per row. Defaults to 2.
+        backend (str, optional): "aggregate" draws sns.histplot, sns.kdeplot and sns.rugplot from summaries computed once
+        per column (see summarize_values), other callables receive the data. Charts with args it can't draw (see
+        AGGREGATE_ARGS), e.g. hue or stat, fall back to "seaborn", which passes the data to every callable, and so
+        do the non-numeric and datetime columns. With a connection, the columns must be numeric and the charts
+        histplot, kdeplot or rugplot. Defaults to "aggregate".
+        n_jobs (int, optional): Columns summarized in parallel. Defaults to 1.
+        seed (int, optional): Seed of the rug samples. Defaults to None.
+        connection (duckdb.DuckDBPyConnection, optional): Compute the summaries with DuckDB, 'data' being a relation of
+        the connection. Defaults to None.
+
+    The rug of the aggregate backend is a random sample of at most 1_000 points, set "max_points" in the rugplot args
+    to change it.
     """
+    if backend not in PLOT_BACKENDS:
+        raise ValueError(f"backend must be one of {PLOT_BACKENDS}, got {backend!r}")
+    unsupported = get_unsupported_args(charts) if backend == "aggregate" else []
+    if unsupported and connection is not None:
+        raise ValueError(f"The aggregate backend doesn't support {', '.join(unsupported)} and there is no DataFrame to fall back to seaborn")
+    if unsupported:
+        backend = "seaborn"
+    others = [chart for chart in charts if chart.callabe not in (sns.histplot, sns.kdeplot, sns.rugplot)]
+    if backend == "aggregate" and others and connection is not None:
+        raise ValueError(f"With a connection the aggregate backend only draws histplot, kdeplot and rugplot, not {getattr(others[0].callabe, '__name__', others[0].callabe)}")
     n_rows = int(np.ceil(len(columns) / n_columns))
     f, axs = plt.subplots(n_rows, n_columns, figsize=(width, row_height*n_rows))
-    axs = axs.flatten()
-    for i, kpi in enumerate(columns):
+    axs = np.atleast_1d(axs).flatten()
+    axes = dict(zip(columns, axs))
+    seaborn_columns = columns
+    if backend == "aggregate":
+        aggregated = columns if connection is not None else [kpi for kpi in columns if is_aggregable(data[kpi])]
+        summaries = summarize_columns(data, aggregated, charts, n_jobs, seed, connection)
+        raw = data if isinstance(data, pd.DataFrame) else None
+        for summary in summaries:
+            render_summary(axes[summary.column], summary, charts, raw)
+        seaborn_columns = [kpi for kpi in columns if kpi not in aggregated]
+    for kpi in seaborn_columns:
         for chart in charts:
-            chart.callabe(data=data, x=kpi, ax=axs[i], **chart.args)
-        axs[i].set_title(kpi)
-        axs[i].set_xlabel("")
-        
-        
- 
-histplot_args = Chart(sns.histplot, {"bins": 10, "kde": True})
-rugplot_args = Chart(sns.rugplot, {"color": "red", "height": 0.1, "alpha": 0.5})
-kpis = ["avg_weekly_gfv", "avg_weekly_frequency", "avg_weekly_incentivized_rate", "avg_weekly_incentives", "avg_weekly_customer_fees"]
-make_subplots([histplot_args, rugplot_args], gp_db, kpis, n_columns=2, figsize=(15, 20))
+            chart.callabe(data=data, x=kpi, ax=axes[kpi], **get_seaborn_args(chart))
+    for ax, kpi in zip(axs, columns):
+        ax.set_title(kpi)
+        ax.set_xlabel("")
+
+
+if __name__ == "__main__":
+    from benchmarks.generators import make_kpis
+
+    gp_db = make_kpis(100_000)
+    histplot_args = Chart(sns.histplot, {"bins": 10, "kde": True})
+    rugplot_args = Chart(sns.rugplot, {"color": "red", "height": 0.1, "alpha": 0.5})
+    kpis = ["avg_weekly_gfv", "avg_weekly_frequency", "avg_weekly_incentivized_rate", "avg_weekly_incentives", "avg_weekly_customer_fees"]
+    make_subplots([histplot_args, rugplot_args], gp_db, kpis, n_columns=2, row_height=4)
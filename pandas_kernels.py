@@ -0,0 +1,208 @@
+from __future__ import annotations
+if __package__:
+    from .lazy_utils import lazy_import
+else:
+    from lazy_utils import lazy_import
+
+np = lazy_import("numpy", "numpy")
+pd = lazy_import("pandas", "pandas")
+
+"""
+Vectorized kernels of the pandas_utils transforms, for frames of tens of millions of rows.
+
+Every kernel works on the NumPy arrays of the columns, writes its result as a new column of the frame instead of
+concatenating frames, and takes a seed or a numpy Generator where it draws random numbers. 'compact_dtypes' shrinks a
+frame before the heavy steps: integers to the smallest type that holds them, floats to float32 when nothing is lost
+and low-cardinality strings to categoricals.
+"""
+
+INTEGER_DTYPES = ["int8", "int16", "int32", "int64"]
+UNSIGNED_DTYPES = ["uint8", "uint16", "uint32", "uint64"]
+FLOAT_MODES = ["lossless", "float32", "keep"]
+
+
+def get_rng(seed:int | np.random.Generator=None) -> np.random.Generator:
+    return seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+
+
+def randomize_dates(dates:pd.Series, max_delta:int, min_delta:int=1, unit:str="D", seed:int | np.random.Generator=None) -> pd.Series:
+    """Shifts every date back by a random whole number of 'unit' between min_delta and max_delta, both included.
+
+    Args:
+        dates (pd.Series): Datetime series, tz-aware or not. NaT stays NaT.
+        max_delta (int): Largest shift.
+        min_delta (int, optional): Smallest shift. Defaults to 1.
+        unit (str, optional): A numpy timedelta unit, "D", "h", "m", "s"... Defaults to "D".
+        seed (int | np.random.Generator, optional): Seed or Generator of the shifts. Defaults to None.
+
+    Returns:
+        pd.Series: The shifted dates, with the index of 'dates'.
+    """
+    if min_delta > max_delta:
+        raise ValueError(f"min_delta ({min_delta}) is greater than max_delta ({max_delta})")
+    shifts = get_rng(seed).integers(min_delta, max_delta + 1, size=len(dates)).astype(f"timedelta64[{unit}]")
+    return dates - shifts
+
+
+def coalesce(df:pd.DataFrame, cols:list[str], new_col:str=None) -> pd.DataFrame:
+    """SQL-like coalesce of any number of columns: the first non-null value of 'cols', in order, into 'new_col'.
+
+    Args:
+        df (pd.DataFrame): The frame, 'new_col' is written in place.
+        cols (list[str]): The columns, by priority.
+        new_col (str, optional): Defaults to "<first column>_coalesce". It can be one of 'cols'.
+
+    Returns:
+        pd.DataFrame: 'df'.
+
+    Description:
+        With NumPy dtypes the result is allocated once with the common dtype of the columns and every next column is
+        only read at the positions still null, so each column after the first costs as much as its remaining nulls.
+        Extension dtypes (strings, nullable integers, categoricals) are filled with pandas, one column at a time.
+    """
+    new_col = new_col or f"{cols[0]}_coalesce"
+    series = [df[col] for col in cols]
+    if any(isinstance(ser.dtype, pd.api.extensions.ExtensionDtype) for ser in series):
+        result = series[0]
+        for ser in series[1:]:
+            result = result.where(result.notna(), ser)
+        df[new_col] = result
+        return df
+
+    result = series[0].to_numpy(dtype=np.result_type(*[ser.dtype for ser in series]), copy=True)
+    missing = np.flatnonzero(pd.isna(result))
+    for ser in series[1:]:
+        if missing.shape[0] == 0:
+            break
+        fill = ser.to_numpy()[missing]
+        result[missing] = fill
+        missing = missing[pd.isna(fill)]
+    df[new_col] = result
+    return df
+
+
+def get_bin_edges(values:pd.Series | np.ndarray, n_edges:int, max_cap:float=None) -> np.ndarray:
+    """'n_edges' evenly spaced edges from the minimum to the maximum of the values, ignoring nulls and values over
+    'max_cap'. Compute them once and pass them to 'cut' to bin other data on the same scale."""
+    values = np.asarray(values, dtype=np.float64)
+    if max_cap is not None:
+        values = values[values <= max_cap]
+    return np.linspace(np.nanmin(values), np.nanmax(values), n_edges)
+
+
+def bin_codes(values:pd.Series | np.ndarray, edges:np.ndarray, right:bool=True, include_lowest:bool=False) -> np.ndarray:
+    """Bin of every value for the given edges, as pd.cut, -1 for nulls and values out of the edges.
+
+    Args:
+        values (pd.Series | np.ndarray): The values.
+        edges (np.ndarray): Increasing bin edges.
+        right (bool, optional): Bins include their right edge, (a, b]. Defaults to True.
+        include_lowest (bool, optional): The first bin includes its left edge, when right is True. Defaults to False.
+
+    Returns:
+        np.ndarray: The codes, in the smallest integer dtype that holds them.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.float64)
+    codes = np.searchsorted(edges, values, side="left" if right else "right") - 1
+    outside = (codes < 0) | (codes >= edges.shape[0] - 1) | np.isnan(values)
+    if include_lowest and right:
+        lowest = values == edges[0]
+        codes[lowest] = 0
+        outside &= ~lowest
+    codes[outside] = -1
+    return codes.astype(np.min_scalar_type(-edges.shape[0]))
+
+
+def cut(values:pd.Series | np.ndarray, edges:np.ndarray, right:bool=True, include_lowest:bool=False, precision:int=3) -> pd.Series:
+    """pd.cut with precomputed edges: the same categorical of intervals, with the index of 'values' if it's a Series."""
+    codes = bin_codes(values, edges, right, include_lowest)
+    # pd.cut of the edges alone builds the intervals, labels rounded to 'precision' included
+    categories = pd.cut(edges, edges, right=right, include_lowest=include_lowest, precision=precision).categories
+    index = values.index if isinstance(values, pd.Series) else None
+    name = values.name if isinstance(values, pd.Series) else None
+    return pd.Series(pd.Categorical.from_codes(codes, categories, ordered=True), index=index, name=name)
+
+
+def divide_columns(df:pd.DataFrame, cols:list[str], div_col:str, suffix:str=None) -> pd.DataFrame:
+    """Writes every column of 'cols' divided by 'div_col' as '<col>_<suffix>' (default 'per_<div_col>') in 'df'.
+    Nulls give NaN and zeros in 'div_col' give inf, as DataFrame.div."""
+    suffix = suffix or f"per_{div_col}"
+    denominator = df[div_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for col in cols:
+            df[f"{col}_{suffix}"] = df[col].to_numpy(dtype=np.float64, na_value=np.nan) / denominator
+    return df
+
+
+def smallest_integer_dtype(min_value:int, max_value:int, unsigned:bool=False) -> np.dtype:
+    for dtype in (UNSIGNED_DTYPES if unsigned and min_value >= 0 else INTEGER_DTYPES):
+        info = np.iinfo(dtype)
+        if info.min <= min_value and max_value <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def compact_series(ser:pd.Series, max_cardinality:float=0.5, floats:str="lossless", unsigned:bool=False) -> pd.Series:
+    """The series in its most compact dtype, see 'compact_dtypes'. Series that can't be compacted are returned as is."""
+    dtype = ser.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "iu" and ser.shape[0]:
+        target = smallest_integer_dtype(int(ser.min()), int(ser.max()), unsigned or dtype.kind == "u")
+        return ser.astype(target) if target.itemsize < dtype.itemsize else ser
+    if isinstance(dtype, np.dtype) and dtype == np.float64 and floats != "keep":
+        values = ser.to_numpy()
+        with np.errstate(over="ignore"):
+            compact = values.astype(np.float32)
+        if floats == "float32":
+            return pd.Series(compact, index=ser.index, name=ser.name)
+        # finite values must come back exactly, NaN stays NaN and inf stays inf
+        if np.array_equal(compact.astype(np.float64), values, equal_nan=True):
+            return pd.Series(compact, index=ser.index, name=ser.name)
+        return ser
+    if dtype == object or isinstance(dtype, pd.StringDtype):
+        try:
+            categorical = ser.astype("category")
+        except TypeError:  # unhashable values, e.g. lists
+            return ser
+        if len(categorical.cat.categories) <= max_cardinality * ser.shape[0]:
+            return categorical
+    return ser
+
+
+def compact_dtypes(df:pd.DataFrame, max_cardinality:float=0.5, floats:str="lossless", unsigned:bool=False, cols:list[str]=None, inplace:bool=False) -> pd.DataFrame:
+    """
+    Shrinks the memory of a frame, column by column.
+
+    Args:
+        df (pd.DataFrame): The frame.
+        max_cardinality (float, optional): Strings become categoricals when their distinct values are at most this
+                                           fraction of the rows. Defaults to 0.5.
+        floats (str, optional): "lossless" casts float64 to float32 when every value round-trips exactly, "float32"
+                                always does it and "keep" never does. Defaults to "lossless".
+        unsigned (bool, optional): Cast non-negative integers to unsigned types, which can hold twice as much but
+                                   wrap around on subtraction. Defaults to False.
+        cols (list[str], optional): Columns to compact. Defaults to None, all the columns.
+        inplace (bool, optional): Replace the columns of 'df' instead of a shallow copy. Defaults to False.
+
+    Returns:
+        pd.DataFrame: The compacted frame, with the same columns, index and values.
+
+    Description:
+        Integers go to the smallest signed type that holds their minimum and maximum. A string column is factorized
+        once and kept as a categorical only if it has few enough categories, so the codes plus the categories take
+        less memory than the strings. One column is converted at a time, so the peak memory is the frame plus a column.
+    """
+    if floats not in FLOAT_MODES:
+        raise ValueError(f"floats must be one of {FLOAT_MODES}, got {floats!r}")
+    result = df if inplace else df.copy(deep=False)
+    for col in (cols if cols is not None else df.columns):
+        ser = result[col]
+        compact = compact_series(ser, max_cardinality, floats, unsigned)
+        if compact is not ser:
+            result[col] = compact
+    return result
+
+
+def get_memory_usage(df:pd.DataFrame) -> pd.Series:
+    """MB of every column, strings included (deep), plus the index as 'Index'."""
+    return df.memory_usage(deep=True) / 1024**2
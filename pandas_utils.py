@@ -1,54 +1,194 @@
-import pandas as pd
-import numpy as np
-from datetime import timedelta
-from random import random
+from __future__ import annotations
+if __package__:
+    from . import pandas_kernels as pk
+    from .lazy_utils import lazy_import
+else:
+    import pandas_kernels as pk
+    from lazy_utils import lazy_import
 
-def normalize_by_colum(data, columns_to_normalize, div_col, sufix= None):
+pd = lazy_import("pandas", "pandas")
+np = lazy_import("numpy", "numpy")
+
+def normalize_by_colum(data, columns_to_normalize, div_col, sufix= None, inplace = False):
     """
-    Divide all selected columns by a single columns and append it to the current dataframe 
+    Divide all selected columns by a single columns and append it to the current dataframe.
+    The new columns are written into a shallow copy (or 'data' itself with inplace=True), without copying the frame
     """
-    if not sufix:
-        sufix = f'per_{div_col}'
-    cols_to_add = (
-                    data
-                    .loc[:, columns_to_normalize]
-                    .div(data[div_col], axis = 0)
-                    .rename(columns = {x: f'{x}_{sufix}' for x in columns_to_normalize})
-                )
-    return pd.concat([data, cols_to_add], axis=1)
+    if not inplace:
+        data = data.copy(deep=False)
+    return pk.divide_columns(data, columns_to_normalize, div_col, sufix)
 
 
 def lead_window(data, partition_cols, sort_col, value_col, shifts = 1):
     """
-    SQL-like lead function
+    SQL-like lead function: the value 'shifts' rows after, within the partition, aligned to data.index
+    """
+    return Window(data, partition_cols, sort_col).lead(value_col, shifts)
+
+def lag_window(data, partition_cols, sort_col, value_col, shifts = 1):
+    """
+    SQL-like lag function: the value 'shifts' rows before, within the partition, aligned to data.index
     """
-    return (
-        data
-        .sort_values(by= sort_col, ascending=True)
-        .groupby(partition_cols)[value_col]
-        .shift(shifts)
-    )
+    return Window(data, partition_cols, sort_col).lag(value_col, shifts)
 
 def row_number(data, partition_cols, sort_col):
     """
     SQL-like row_number function
     """
-    return (
-        data
-        .sort_values(by= sort_col, ascending=True)
-        .groupby(partition_cols)
-        .cumcount() + 1
-    )
+    return Window(data, partition_cols, sort_col).row_number()
+
+
+class Window:
+    """
+    SQL-like window, PARTITION BY partition_cols ORDER BY sort_col, to compute many window functions of a DataFrame
+    with a single sort.
+
+    The partition keys are factorized and the rows sorted by (partition, sort_col) once, when the window is created.
+    The group boundaries are kept as offsets in the sorted order, so lead/lag/row_number/rank/cumsum/rolling are NumPy
+    offset arithmetic over the sorted values, with no groupby. Every function accepts a column or a list of columns and
+    returns a Series / DataFrame aligned to the original index, ready to be assigned to data.
+
+    Example:
+        window = Window(df, 'pickup_location_id', 'pickup_datetime_hour')
+        df[['lag_1', 'lag_24']] = window.lag('num_pickup', [1, 24])
+        df['rolling_mean_24'] = window.rolling('num_pickup', 24)
+
+    Missing partition keys form their own partition, like NULL in SQL. The sort is stable, ties keep the order of data.
+    """
+
+    def __init__(self, data, partition_cols, sort_col, ascending=True):
+        self.data = data
+        n = len(data)
+        partition_cols = [partition_cols] if isinstance(partition_cols, str) else list(partition_cols)
+        sort_cols = [sort_col] if isinstance(sort_col, str) else list(sort_col)
+        ascending = [ascending] * len(sort_cols) if isinstance(ascending, bool) else list(ascending)
+
+        codes = data.groupby(partition_cols, sort=False, dropna=False).ngroup().to_numpy()
+        sort_keys = []
+        for col, asc in zip(sort_cols, ascending):
+            key, uniques = pd.factorize(data[col], sort=True)
+            key = np.where(key < 0, len(uniques), key) # missing values last, like sort_values
+            sort_keys.append(key if asc else np.where(key == len(uniques), len(uniques), -key))
+        self.order = np.lexsort([*reversed(sort_keys), codes])
+        self.inverse = np.empty(n, dtype=np.int64)
+        self.inverse[self.order] = np.arange(n)
+
+        # Offsets in the sorted order: start of the group of every row, and its position within the group
+        codes = codes[self.order]
+        is_start = np.ones(n, dtype=bool)
+        is_start[1:] = codes[1:] != codes[:-1]
+        self.starts = np.flatnonzero(is_start)
+        self.sizes = np.diff(np.append(self.starts, n))
+        self.group_start = np.repeat(self.starts, self.sizes)
+        self.position = np.arange(n) - self.group_start
+        self.group_size = np.repeat(self.sizes, self.sizes)
+
+        # Start of the run of equal sort keys (peers) of every row, for the ranks
+        is_peer_start = is_start.copy()
+        for key in sort_keys:
+            key = key[self.order]
+            is_peer_start[1:] |= key[1:] != key[:-1]
+        self.is_peer_start = is_peer_start
+
+    def _sorted(self, cols):
+        return self.data[cols].take(self.order)
+
+    def _align(self, values, name):
+        """Back from the sorted order to the original index."""
+        if values.ndim == 1:
+            return pd.Series(values[self.inverse], index=self.data.index, name=name)
+        return pd.DataFrame(values[self.inverse], index=self.data.index, columns=name)
+
+    def _shift(self, values, shifts):
+        """Shift of values, already sorted and with a RangeIndex, within the partitions."""
+        source = np.clip(np.arange(len(values)) - shifts, 0, max(len(values) - 1, 0))
+        valid = pd.Series((self.position >= shifts) & (self.position - shifts < self.group_size))
+        shifted = values.take(source).reset_index(drop=True).where(valid, axis=0)
+        return shifted.take(self.inverse).set_axis(self.data.index)
+
+    def shift(self, col, shifts=1, prefix='shift'):
+        """
+        Value 'shifts' rows before within the partition (after if negative), like groupby().shift. With a list of
+        shifts the result has a column {col}_{prefix}_{abs(shift)} per shift, all of them from one take of the column.
+        """
+        values = self._sorted(col).reset_index(drop=True)
+        if not isinstance(shifts, (list, tuple)):
+            return self._shift(values, shifts)
+        columns = {}
+        for n in shifts:
+            shifted = self._shift(values, n)
+            for name, column in (shifted.items() if shifted.ndim == 2 else [(col, shifted)]):
+                columns[f'{name}_{prefix}_{abs(n)}'] = column
+        return pd.DataFrame(columns)
+
+    def lag(self, col, shifts=1):
+        """SQL lag: the value 'shifts' rows before within the partition."""
+        return self.shift(col, shifts, prefix='lag')
+
+    def lead(self, col, shifts=1):
+        """SQL lead: the value 'shifts' rows after within the partition."""
+        negated = [-n for n in shifts] if isinstance(shifts, (list, tuple)) else -shifts
+        return self.shift(col, negated, prefix='lead')
+
+    def row_number(self):
+        """SQL row_number, starting at 1."""
+        return self._align(self.position + 1, 'row_number')
+
+    def rank(self, method='min'):
+        """
+        SQL rank ('min') or dense_rank ('dense') by sort_col within the partition, starting at 1.
+        """
+        if method == 'min':
+            peer_start = np.maximum.accumulate(np.where(self.is_peer_start, np.arange(len(self.position)), 0))
+            ranks = peer_start - self.group_start + 1
+        elif method == 'dense':
+            peers = np.cumsum(self.is_peer_start)
+            ranks = peers - peers[self.group_start] + 1
+        else:
+            raise ValueError(f"method must be 'min' or 'dense', got {method}")
+        return self._align(ranks, 'rank')
+
+    def _cumulative(self, col):
+        """Cumulative sums and counts of the non-missing values, with a leading 0, in the sorted order."""
+        values = self._sorted(col).to_numpy(dtype=float)
+        missing = np.isnan(values)
+        zeros = np.zeros((1,) + values.shape[1:])
+        sums = np.concatenate([zeros, np.cumsum(np.where(missing, 0, values), axis=0)])
+        counts = np.concatenate([zeros, np.cumsum(~missing, axis=0)])
+        return values, missing, sums, counts
+
+    def cumsum(self, col):
+        """
+        Cumulative sum within the partition, missing values stay missing, like groupby().cumsum.
+        """
+        values, missing, sums, _ = self._cumulative(col)
+        result = sums[1:] - sums[self.group_start]
+        return self._align(np.where(missing, np.nan, result), col)
+
+    def rolling(self, col, window, agg='mean', min_periods=1):
+        """
+        Rolling sum, mean or count over the last 'window' rows of the partition, the current one included, like
+        groupby().rolling(window, min_periods).
+        """
+        if agg not in ('sum', 'mean', 'count'):
+            raise ValueError(f"agg must be 'sum', 'mean' or 'count', got {agg}")
+        _, _, sums, counts = self._cumulative(col)
+        end = np.arange(1, len(self.position) + 1)
+        begin = np.maximum(end - window, self.group_start)
+        total, count = sums[end] - sums[begin], counts[end] - counts[begin]
+        result = {'sum': total, 'mean': total / np.where(count > 0, count, np.nan), 'count': count}[agg]
+        return self._align(np.where(count >= min_periods, result, np.nan), col)
 
-def binarize(ser, step, max_cap = None):
+def binarize(ser, step, max_cap = None, bins = None):
     """
-    Transform a continuous series into a discrete one by step bins
+    Transform a continuous series into a discrete one by step bins (edges), from its min to its max.
+    Values over max_cap are dropped. Pass the 'bins' of pandas_kernels.get_bin_edges to reuse them across calls
     """
-    if max_cap:
+    if max_cap is not None:
         ser = ser[ser <= max_cap]
-        min_val, max_val = ser.min(), ser.max()
-        bins = np.linspace(min_val, max_val, step)
-    return pd.cut(ser, bins)
+    if bins is None:
+        bins = pk.get_bin_edges(ser, step)
+    return pk.cut(ser, bins)
 
 def get_unique_val_col(df):
     """
@@ -58,18 +198,13 @@ def get_unique_val_col(df):
 
 def coalesce_two_cols(df, cols, new_col=None):
     """
-    Perform a SQL-like coalese function for two columns.
+    Perform a SQL-like coalese function for two columns, see pandas_kernels.coalesce for more.
     """
-    if not new_col:
-        new_col = f'{cols[0]}_coalesce'
-        
-    col1, col2 = cols
-    df[new_col] = np.where(df[col1].isnull(), df[col2], df[col1])
-    return df
+    return pk.coalesce(df, cols, new_col)
 
-def randomize_date_col(df, date_col, max_delta):
+def randomize_date_col(df, date_col, max_delta, seed = None):
     """
-    Randomize a date column by a random number defined by delta
+    Randomize a date column by a random number of days between 1 and max_delta, 'seed' makes it reproducible
     """
-    df[f"{date_col}_random"] = df[date_col].apply(lambda x: x - timedelta(days=random.randint(1,max_delta)))
+    df[f"{date_col}_random"] = pk.randomize_dates(df[date_col], max_delta, seed=seed)
     return df
\ No newline at end of file
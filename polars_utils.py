@@ -1,4 +1,18 @@
-def get_time_lags(df: pl.DataFrame, n_lags: list[int]) -> pl.DataFrame:
+from __future__ import annotations
+import re
+from typing import Callable
+
+if __package__:
+    from .cache_utils import cached
+    from .lazy_utils import lazy_import
+else:
+    from cache_utils import cached
+    from lazy_utils import lazy_import
+
+pl = lazy_import("polars", "polars")
+
+@cached
+def get_time_lags(df: pl.DataFrame | pl.LazyFrame, n_lags: list[int], maintain_order: bool = True) -> pl.DataFrame | pl.LazyFrame:
     """
     
     Description
@@ -8,28 +22,28 @@ def get_time_lags(df: pl.DataFrame, n_lags: list[int]) -> pl.DataFrame:
     - 24 -> 24 hours ago
     - 7*24 -> same hour 7 days ago.
 
-    This function takes a DataFrame and an integer n_lags to generate n_lags new columns in the DataFrame. Each new column represents the number of pickups n hours ago, where n ranges from 1 to n_lags. The function sorts the DataFrame by 'pickup_location_id' and 'pickup_datetime_hour' before shifting to ensure that the lagged values are correctly aligned with the corresponding times and locations.
+    This function takes a DataFrame and an integer n_lags to generate n_lags new columns in the DataFrame. Each new column represents the number of pickups n hours ago, where n ranges from 1 to n_lags. The lags are calendar lags built by 'build_lag_features': if the hour n hours ago is missing for a location, the lag is null and the row is dropped.
+
+    A LazyFrame stays lazy, so the lags can be part of a bigger query, see 'stream_time_lags'. The results of DataFrames are cached, see cache_utils.cached.
 
     Parameters:
-    - df (pl.DataFrame): The DataFrame containing the pickup data.
+    - df (pl.DataFrame | pl.LazyFrame): The DataFrame containing the pickup data.
     - n_lags (list[int]): The number of lagged time periods to generate.
+    - maintain_order (bool, optional): Keep the order of the input rows, otherwise they are sorted by location and hour. Defaults to True.
 
     Returns:
-    - pl.DataFrame: The original DataFrame with n_lags new columns added, each representing the number of pickups n hours ago.
+    - pl.DataFrame | pl.LazyFrame: The original DataFrame with n_lags new columns added, each representing the number of pickups n hours ago.
     """
     return (
-        df
-        .with_columns([
-            pl.col("num_pickup").sort_by(["pickup_location_id", "pickup_datetime_hour"]).shift(i).over("pickup_location_id").alias(f"num_pickup_{i}d_ago") for i in n_lags
-        ])
+        build_lag_features(df, n_lags, maintain_order=maintain_order)
+        .rename({f"num_pickup_lag_{i}h": f"num_pickup_{i}d_ago" for i in n_lags})
         .drop_nulls()
     )
 
 
-
-def row_number(data, partition_cols, sort_col, col_name:str='row_number', descending:bool=False):
+def row_number(data: pl.DataFrame | pl.LazyFrame, partition_cols, sort_col, col_name:str='row_number', descending:bool=False) -> pl.DataFrame | pl.LazyFrame:
     """
-    SQL-like row_number function
+    SQL-like row_number function. Works on a DataFrame or a LazyFrame.
     """
     return (
         data
@@ -38,3 +52,182 @@ def row_number(data, partition_cols, sort_col, col_name:str='row_number', descen
             pl.col(sort_col).cum_count().over(partition_by=partition_cols).alias(col_name)
         )
     )
+
+
+def shift_offset(every: str, n: int) -> str:
+    """Polars offset of n times 'every', e.g. ("1h", 24) -> "24h"."""
+    count, unit = re.fullmatch(r"(\d+)(\w+)", every).groups()
+    return f"{int(count) * n}{unit}"
+
+
+def build_lag_features(
+        df: pl.DataFrame | pl.LazyFrame,
+        lags: list[int],
+        rolling_windows: list[int] = None,
+        rolling_aggs: list[str] = ["mean", "sum"],
+        value_col: str = "num_pickup",
+        time_col: str = "pickup_datetime_hour",
+        group_col: str = "pickup_location_id",
+        every: str = "1h",
+        fill_value: float = None,
+        maintain_order: bool = True,
+    ) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Description
+
+    Generates calendar-correct lag and rolling features of 'value_col' for every 'group_col'.
+    - lags: the value exactly n periods ('every') before, e.g. 24 -> same hour the day before.
+    - rolling windows: the mean / sum of the previous n periods, the current one excluded.
+
+    Every group is first expanded to a complete grid of periods between its first and last timestamp,
+    and the grid is sorted once by group and time. On a complete grid a calendar lag of n periods is a
+    plain shift by n rows, so all the lags are shifts of the same sorted frame, in a single
+    'with_columns', and only need to be masked where the shift crosses into the previous group.
+    Missing periods are null (or 'fill_value', e.g. 0 pickups), instead of silently taking the value
+    of an older period as a row-based shift would. The timestamps must be aligned to 'every'.
+
+    Parameters:
+    - df (pl.DataFrame | pl.LazyFrame): The data, one row per group and period.
+    - lags (list[int]): The lags, in periods.
+    - rolling_windows (list[int], optional): The rolling windows, in periods. Defaults to None.
+    - rolling_aggs (list[str], optional): Aggregations of the rolling windows, "mean", "sum", "min",
+      "max" or "std". Defaults to ["mean", "sum"].
+    - value_col, time_col, group_col (str, optional): Defaults to the hourly pickups columns.
+    - every (str, optional): The period, as a polars duration. Defaults to "1h".
+    - fill_value (float, optional): Value of the missing periods. Defaults to None, null.
+    - maintain_order (bool, optional): Keep the order of the input rows, otherwise they are sorted by
+      group and time. Defaults to True.
+
+    Returns:
+    - pl.DataFrame | pl.LazyFrame: The input rows plus {value_col}_lag_{n}h and
+      {value_col}_rolling_{agg}_{n}h columns (the suffix is the unit of 'every'). Same type as the input.
+    """
+    lazy = isinstance(df, pl.LazyFrame)
+    lf = df.lazy().with_row_index("__row")
+    unit = re.fullmatch(r"(\d+)(\w+)", every).group(2)
+
+    grid = (
+        lf
+        .group_by(group_col)
+        .agg(pl.datetime_range(pl.col(time_col).min(), pl.col(time_col).max(), every).alias(time_col))
+        .explode(time_col)
+        .join(lf, on=[group_col, time_col], how="left")
+        .sort([group_col, time_col])
+    )
+    value = pl.col(value_col)
+    if fill_value is not None:
+        grid = grid.with_columns(pl.when(pl.col("__row").is_null()).then(pl.lit(fill_value)).otherwise(value).alias(value_col))
+
+    features = [
+        pl.when(pl.col(group_col).shift(lag) == pl.col(group_col)).then(value.shift(lag)).alias(f"{value_col}_lag_{lag}{unit}")
+        for lag in lags
+    ]
+    for window in rolling_windows or []:
+        for agg in rolling_aggs:
+            rolling = getattr(value.shift(1), f"rolling_{agg}")(window, min_samples=1)
+            features.append(rolling.over(group_col).alias(f"{value_col}_rolling_{agg}_{window}{unit}"))
+
+    result = grid.with_columns(features).filter(pl.col("__row").is_not_null())
+    if maintain_order:
+        result = result.sort("__row")
+    result = result.drop("__row")
+    return result if lazy else result.collect()
+
+
+def get_lag_tail(
+        df: pl.DataFrame,
+        horizon: int,
+        time_col: str = "pickup_datetime_hour",
+        group_col: str = "pickup_location_id",
+        every: str = "1h",
+    ) -> pl.DataFrame:
+    """Rows of the last 'horizon' periods of every group, the history needed by 'update_lag_features'."""
+    start = pl.col(time_col).max().over(group_col).dt.offset_by(f"-{shift_offset(every, horizon)}")
+    return df.filter(pl.col(time_col) >= start)
+
+
+def update_lag_features(
+        new_rows: pl.DataFrame,
+        tail: pl.DataFrame,
+        lags: list[int],
+        rolling_windows: list[int] = None,
+        rolling_aggs: list[str] = ["mean", "sum"],
+        value_col: str = "num_pickup",
+        time_col: str = "pickup_datetime_hour",
+        group_col: str = "pickup_location_id",
+        every: str = "1h",
+        fill_value: float = None,
+    ) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Incremental 'build_lag_features': computes the features of the new rows only, from a cached tail.
+
+    Parameters:
+    - new_rows (pl.DataFrame): The new periods, e.g. the last hour of pickups.
+    - tail (pl.DataFrame): The history returned by the previous call (or 'get_lag_tail' of the history),
+      with the same columns as new_rows. It can be empty.
+    - The rest of the parameters are the ones of 'build_lag_features'.
+
+    Returns:
+    - tuple[pl.DataFrame, pl.DataFrame]: The new rows with their features and the tail to pass to the
+      next call, the last max(lags, rolling windows) periods of every group.
+
+    A new row replaces the tail row of the same group and period. The features are equal to running
+    'build_lag_features' on the full history.
+    """
+    horizon = max([*lags, *(rolling_windows or [])])
+    combined = (
+        pl.concat([tail.with_columns(__new=pl.lit(False)), new_rows.with_columns(__new=pl.lit(True))], how="diagonal_relaxed")
+        .unique([group_col, time_col], keep="last", maintain_order=True)
+    )
+    features = (
+        build_lag_features(combined, lags, rolling_windows, rolling_aggs, value_col, time_col, group_col, every, fill_value)
+        .filter(pl.col("__new"))
+        .drop("__new")
+    )
+    new_tail = get_lag_tail(combined.drop("__new"), horizon, time_col, group_col, every)
+    return features, new_tail
+
+
+def stream_time_lags(
+        source: str | list[str],
+        destination: str,
+        n_lags: list[int],
+        rolling_windows: list[int] = None,
+        transform: Callable[[pl.LazyFrame], pl.LazyFrame] = None,
+        columns: list[str] = None,
+        row_group_size: int = None,
+        engine: str = "streaming",
+    ) -> None:
+    """
+    Description
+
+    Builds the time lags of parquet files of hourly pickups and writes them to 'destination', without
+    loading the history in memory first: scan_parquet -> 'get_time_lags' (plus the rolling windows) ->
+    'transform' -> sink_parquet, as a single lazy query run by the polars streaming engine.
+
+    Only the columns used by the query are read from the files. 'transform' receives the LazyFrame with
+    the lags, e.g. lambda lf: row_number(lf, "pickup_location_id", "pickup_datetime_hour"), and is part
+    of the same query plan. The output is sorted by location and hour, not in the order of the files, and
+    only the rows with a null lag are dropped.
+
+    Parameters:
+    - source (str | list[str]): Parquet file(s), globs or hive-partitioned directory.
+    - destination (str): The output parquet file.
+    - n_lags (list[int]): The lags, in hours.
+    - rolling_windows (list[int], optional): Rolling windows of 'build_lag_features', in hours. Defaults to None.
+    - transform (Callable[[pl.LazyFrame], pl.LazyFrame], optional): Extra lazy steps before writing. Defaults to None.
+    - columns (list[str], optional): Columns to read, default all of them.
+    - row_group_size (int, optional): Row group size of the output. Defaults to the polars default.
+    - engine (str, optional): The polars engine, "streaming" or "in-memory". Defaults to "streaming".
+    """
+    lf = pl.scan_parquet(source)
+    if columns is not None:
+        lf = lf.select(columns)
+    lf = (
+        build_lag_features(lf, n_lags, rolling_windows, maintain_order=False)
+        .rename({f"num_pickup_lag_{i}h": f"num_pickup_{i}d_ago" for i in n_lags})
+        .drop_nulls([f"num_pickup_{i}d_ago" for i in n_lags])
+    )
+    if transform is not None:
+        lf = transform(lf)
+    lf.sink_parquet(destination, row_group_size=row_group_size, engine=engine)
@@ -1,18 +1,485 @@
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from io import BytesIO, RawIOBase
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterator
+from urllib.parse import quote, unquote
 import os
-import boto3
+if __package__:
+    from .trace_utils import count, counter_callback, current_span, timed, traced
+else:
+    from trace_utils import count, counter_callback, current_span, timed, traced
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 """
 Simple S3 connector
+
+A single client, with a connection pool as large as the thread pool, is built
+once and shared by every call. Transfers go through boto3's managed transfer,
+which streams file objects in parts (multipart upload above
+'multipart_threshold') instead of copying them in memory. Failed requests are
+retried by botocore with exponential backoff.
+
+It works against any S3 compatible endpoint ('endpoint_url'), e.g. a moto
+server or localstack, or with moto's in-process mock_aws.
 """
 
+MB = 1024**2
+HIVE_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+# S3 rejects multipart parts smaller than 5 MB, but the last one
+MIN_PART_SIZE = 5 * MB
+
+
+class S3MultipartWriter(RawIOBase):
+    """Writable file object that uploads to S3 while it is written.
+
+    Data is buffered until 'part_size' bytes and then sent as a part of a multipart
+    upload, so at most one part is held in memory. Objects smaller than a part are
+    sent with a single put_object on close. If the writer is used as a context
+    manager and the block raises, the upload is aborted.
+    """
+    def __init__(self, client, bucket_name: str, key: str, part_size: int = 16 * MB):
+        self._client = client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self._buffer = bytearray()
+        self._position = 0
+        self._upload_id = None
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            upload = self._client.create_multipart_upload(Bucket=self.bucket_name, Key=self.key)
+            self._upload_id = upload["UploadId"]
+        part_number = len(self._parts) + 1
+        with timed("s3.upload_part"):
+            response = self._client.upload_part(
+                Bucket=self.bucket_name, Key=self.key, UploadId=self._upload_id,
+                PartNumber=part_number, Body=bytes(self._buffer),
+            )
+        count("s3.requests")
+        count("s3.bytes_uploaded", len(self._buffer))
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self._buffer.clear()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                with timed("s3.put_object"):
+                    self._client.put_object(Bucket=self.bucket_name, Key=self.key, Body=bytes(self._buffer))
+                count("s3.requests")
+                count("s3.bytes_uploaded", len(self._buffer))
+            else:
+                if self._buffer:
+                    self._upload_part()
+                self._client.complete_multipart_upload(
+                    Bucket=self.bucket_name, Key=self.key, UploadId=self._upload_id,
+                    MultipartUpload={"Parts": self._parts},
+                )
+        finally:
+            self._buffer.clear()
+            super().close()
+
+    def abort(self):
+        if self._upload_id is not None:
+            self._client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self._upload_id)
+        self._buffer.clear()
+        super().close()
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class S3ObjectReader(RawIOBase):
+    """Seekable, read-only file object over an S3 object. Every read is a ranged GET, so a
+    parquet reader only downloads the footer and the column chunks it needs."""
+    def __init__(self, client, bucket_name: str, key: str, size: int = None):
+        self._client = client
+        self.bucket_name = bucket_name
+        self.key = key
+        if size is None:
+            size = client.head_object(Bucket=bucket_name, Key=key)["ContentLength"]
+        self.size = size
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            self._position = offset
+        elif whence == os.SEEK_CUR:
+            self._position += offset
+        elif whence == os.SEEK_END:
+            self._position = self.size + offset
+        else:
+            raise ValueError(f"invalid whence {whence}")
+        return self._position
+
+    def readinto(self, buffer):
+        end = min(self._position + len(buffer), self.size)
+        if end <= self._position:
+            return 0
+        with timed("s3.get_object"):
+            response = self._client.get_object(
+                Bucket=self.bucket_name, Key=self.key, Range=f"bytes={self._position}-{end - 1}"
+            )
+            data = response["Body"].read()
+        count("s3.requests")
+        count("s3.bytes_downloaded", len(data))
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def partition_path(partition_cols: list[str], values: tuple) -> str:
+    """Hive-style path, e.g. year=2024/month=1"""
+    return "/".join(
+        f"{col}={HIVE_NULL_PARTITION if value is None or value != value else quote(str(value), safe='')}"
+        for col, value in zip(partition_cols, values)
+    )
+
+def parse_partitions(key: str, prefix: str) -> dict[str, str]:
+    """Partition values of a key written by 'S3Connector.write_parquet', as strings (None for nulls)."""
+    relative = key[len(prefix):].strip("/").split("/")[:-1]
+    partitions = {}
+    for part in relative:
+        if "=" in part:
+            col, value = part.split("=", 1)
+            partitions[col] = None if value == HIVE_NULL_PARTITION else unquote(value)
+    return partitions
+
+def matches_filters(partitions: dict[str, str], filters: dict) -> bool:
+    """True if the partition values pass every filter. A filter is a value or a list of accepted values
+    of a partition column, compared as strings."""
+    for col, accepted in filters.items():
+        if col not in partitions:
+            continue
+        accepted = accepted if isinstance(accepted, (list, tuple, set)) else [accepted]
+        if partitions[col] not in {None if value is None else str(value) for value in accepted}:
+            return False
+    return True
+
+def partition_positions(df, partition_cols: list[str]) -> dict[tuple, "np.ndarray"]:
+    """Row positions of every partition of a pandas or polars DataFrame."""
+    import numpy as np
+
+    if not partition_cols:
+        return {(): np.arange(len(df))}
+    if hasattr(df, "iloc"):
+        grouped = df.groupby(partition_cols, sort=False, dropna=False, observed=True)
+        return {key if isinstance(key, tuple) else (key,): positions for key, positions in grouped.indices.items()}
+    import polars as pl
+
+    rows = (
+        df
+        .select(partition_cols)
+        .with_row_index("__position")
+        .group_by(partition_cols, maintain_order=True)
+        .agg(pl.col("__position"))
+    )
+    return {
+        tuple(row[col] for col in partition_cols): np.asarray(row["__position"])
+        for row in rows.iter_rows(named=True)
+    }
+
+def to_arrow(df, positions, drop_cols: list[str], schema=None):
+    """Arrow table of the rows at 'positions', without 'drop_cols', for pandas or polars."""
+    import pyarrow as pa
+
+    if hasattr(df, "iloc"):
+        return pa.Table.from_pandas(df.iloc[positions].drop(columns=drop_cols), schema=schema, preserve_index=False)
+    return df[positions].drop(drop_cols).to_arrow()
+
 class S3Connector:
-    def __init__(self, aws_access_key, aws_secret, region_name = "us-east-1"):
-        self.session = boto3.Session(os.environ[aws_access_key], os.environ[aws_secret], region_name=region_name)
-        self._s3 = self.session.resource("s3")
+    def __init__(
+            self,
+            aws_access_key = None,
+            aws_secret = None,
+            region_name = "us-east-1",
+            endpoint_url = None,
+            max_workers = 16,
+            multipart_threshold = 64 * MB,
+            multipart_chunksize = 16 * MB,
+            max_attempts = 5,
+        ):
+        """
+        Args:
+            aws_access_key (str, optional): Name of the env var with the access key. Defaults to None,
+                which uses the default boto3 credential chain.
+            aws_secret (str, optional): Name of the env var with the secret. Defaults to None.
+            region_name (str, optional): Defaults to "us-east-1".
+            endpoint_url (str, optional): Custom S3 endpoint, e.g. a local S3 stand-in. Defaults to None.
+            max_workers (int, optional): Threads of the batch transfers and size of the connection pool. Defaults to 16.
+            multipart_threshold (int, optional): Objects larger than this, in bytes, use multipart upload. Defaults to 64 MB.
+            multipart_chunksize (int, optional): Part size, in bytes, of multipart transfers. Defaults to 16 MB.
+            max_attempts (int, optional): Attempts per request, retried with exponential backoff. Defaults to 5.
+        """
+        # boto3 takes a while to import, it is only paid by the jobs that connect
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        credentials = {}
+        if aws_access_key and aws_secret:
+            credentials = {
+                "aws_access_key_id": os.environ[aws_access_key],
+                "aws_secret_access_key": os.environ[aws_secret],
+            }
+        self.session = boto3.Session(region_name=region_name, **credentials)
+        self.max_workers = max_workers
+        self._client = self.session.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            config=Config(
+                max_pool_connections=max_workers,
+                retries={"max_attempts": max_attempts, "mode": "standard"},
+            ),
+        )
+        # threads within a single transfer (parts of a multipart upload)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max(max_workers // 4, 1),
+        )
+        self._s3 = self.session.resource("s3", endpoint_url=endpoint_url)
+
+    @property
+    def client(self):
+        return self._client
 
     def put_object_bucket(self, bucket_name, object, key):
-        bucket = self._s3.Bucket(bucket_name)
-        bucket.put_object(Body=object.getvalue(), Key=key)
-        print(f"object saved in {bucket_name} with key {key}")
\ No newline at end of file
+        self.upload_fileobj(object, bucket_name, key)
+        print(f"object saved in {bucket_name} with key {key}")
+
+    @traced
+    def upload_fileobj(self, fileobj: BinaryIO, bucket_name: str, key: str) -> str:
+        """Streams a binary file object to S3 from its start, in parts if it is large."""
+        current_span().set(bucket=bucket_name, key=key)
+        fileobj.seek(0)
+        self._client.upload_fileobj(
+            fileobj, bucket_name, key, Config=self.transfer_config, Callback=counter_callback("s3.bytes_uploaded")
+        )
+        return key
+
+    @traced
+    def upload_file(self, path: str | Path, bucket_name: str, key: str) -> str:
+        current_span().set(bucket=bucket_name, key=key)
+        self._client.upload_file(
+            str(path), bucket_name, key, Config=self.transfer_config, Callback=counter_callback("s3.bytes_uploaded")
+        )
+        return key
+
+    @traced
+    def download_file(self, bucket_name: str, key: str, path: str | Path) -> Path:
+        current_span().set(bucket=bucket_name, key=key)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._client.download_file(
+            bucket_name, key, str(path), Config=self.transfer_config, Callback=counter_callback("s3.bytes_downloaded")
+        )
+        return path
+
+    @traced
+    def download_fileobj(self, bucket_name: str, key: str, fileobj: BinaryIO = None) -> BinaryIO:
+        """Downloads an object into 'fileobj' (a new BytesIO by default), rewound to its start."""
+        current_span().set(bucket=bucket_name, key=key)
+        fileobj = BytesIO() if fileobj is None else fileobj
+        self._client.download_fileobj(
+            bucket_name, key, fileobj, Config=self.transfer_config, Callback=counter_callback("s3.bytes_downloaded")
+        )
+        fileobj.seek(0)
+        return fileobj
+
+    def iter_object(self, bucket_name: str, key: str, chunk_size: int = 1 * MB) -> Iterator[bytes]:
+        """Streams the body of an object in chunks, without holding it in memory."""
+        body = self._client.get_object(Bucket=bucket_name, Key=key)["Body"]
+        count("s3.requests")
+        try:
+            for chunk in body.iter_chunks(chunk_size):
+                count("s3.bytes_downloaded", len(chunk))
+                yield chunk
+        finally:
+            body.close()
+
+    def list_objects(self, bucket_name: str, prefix: str = "") -> Iterator[dict]:
+        """Yields the metadata (Key, Size, LastModified...) of every object under 'prefix'."""
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            yield from page.get("Contents", [])
+
+    def list_keys(self, bucket_name: str, prefix: str = "") -> list[str]:
+        return [obj["Key"] for obj in self.list_objects(bucket_name, prefix)]
+
+    def _map(self, func: callable, *iterables) -> list:
+        """Runs func over the iterables in the thread pool, keeping the order. The first error is raised
+        once all the submitted transfers have finished. Every call runs in a copy of the caller's context, so
+        its spans nest in the current one (see trace_utils)."""
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, func, *args) for args in zip(*iterables)]
+        return [future.result() for future in futures]
+
+    @traced
+    def upload_many(self, files: dict[str, str | Path], bucket_name: str) -> list[str]:
+        """Uploads many local files in parallel.
+
+        Args:
+            files (dict[str, str | Path]): Mapping of key to local path.
+            bucket_name (str): Target bucket.
+
+        Returns:
+            list[str]: The uploaded keys.
+        """
+        keys = list(files)
+        return self._map(
+            lambda key, path: self.upload_file(path, bucket_name, key), keys, [files[key] for key in keys]
+        )
+
+    @traced
+    def upload_many_fileobjs(self, fileobjs: dict[str, BinaryIO], bucket_name: str) -> list[str]:
+        """Uploads many in-memory file objects, mapping of key to file object, in parallel."""
+        keys = list(fileobjs)
+        return self._map(
+            lambda key, fileobj: self.upload_fileobj(fileobj, bucket_name, key), keys, [fileobjs[key] for key in keys]
+        )
+
+    @traced
+    def download_many(self, bucket_name: str, keys: list[str], directory: str | Path) -> list[Path]:
+        """Downloads many objects in parallel into 'directory', keeping the key as relative path."""
+        directory = Path(directory)
+        return self._map(lambda key: self.download_file(bucket_name, key, directory / key), keys)
+
+    def download_prefix(self, bucket_name: str, prefix: str, directory: str | Path) -> list[Path]:
+        return self.download_many(bucket_name, self.list_keys(bucket_name, prefix), directory)
+
+    def open_writer(self, bucket_name: str, key: str, part_size: int = None) -> S3MultipartWriter:
+        part_size = self.transfer_config.multipart_chunksize if part_size is None else part_size
+        return S3MultipartWriter(self._client, bucket_name, key, part_size)
+
+    def open_reader(self, bucket_name: str, key: str, size: int = None) -> S3ObjectReader:
+        return S3ObjectReader(self._client, bucket_name, key, size)
+
+    @traced
+    def write_parquet(self, df, bucket_name: str, prefix: str, partition_cols: list[str] = None, row_group_size: int = 100_000, compression: str = "snappy") -> list[str]:
+        """Writes a pandas or polars DataFrame to S3 as parquet, streaming one row group at a time.
+
+        Args:
+            df (pd.DataFrame | pl.DataFrame): The data.
+            bucket_name (str): Target bucket.
+            prefix (str): Key prefix of the dataset, e.g. "trips/pickup_hourly".
+            partition_cols (list[str], optional): Columns used to split the data in hive-style keys,
+                prefix/col=value/part-00000.parquet. They are not stored inside the files. Defaults to None.
+            row_group_size (int, optional): Rows per row group. Defaults to 100_000.
+            compression (str, optional): Parquet compression codec. Defaults to "snappy".
+
+        Returns:
+            list[str]: The keys written.
+
+        Description:
+            Every row group is converted to arrow and written by a pyarrow ParquetWriter straight into an
+            'S3MultipartWriter', which uploads a part as soon as it holds 'multipart_chunksize' bytes. So the
+            memory on top of the DataFrame is about one row group plus one part, instead of the parquet
+            bytes and a copy of them.
+        """
+        import pyarrow.parquet as pq
+
+        partition_cols = partition_cols or []
+        prefix = prefix.strip("/")
+        current_span().set(bucket=bucket_name, prefix=prefix)
+        keys = []
+        for values, positions in partition_positions(df, partition_cols).items():
+            path = partition_path(partition_cols, values)
+            key = "/".join(part for part in [prefix, path, "part-00000.parquet"] if part)
+            with self.open_writer(bucket_name, key) as sink:
+                writer = None
+                for start in range(0, len(positions), row_group_size):
+                    table = to_arrow(df, positions[start:start + row_group_size], partition_cols, writer and writer.schema)
+                    if writer is None:
+                        writer = pq.ParquetWriter(sink, table.schema, compression=compression)
+                    writer.write_table(table, row_group_size=row_group_size)
+                    count("s3.rows_written", table.num_rows)
+                if writer is not None:
+                    writer.close()
+            keys.append(key)
+        return keys
+
+    def iter_parquet(self, bucket_name: str, prefix: str, columns: list[str] = None, filters: dict = None, backend: str = "pandas", batch_size: int = 65_536) -> Iterator:
+        """Lazily reads a parquet dataset written by 'write_parquet', one record batch at a time.
+
+        Args:
+            bucket_name (str): Source bucket.
+            prefix (str): Key prefix of the dataset.
+            columns (list[str], optional): Columns to read, partition columns included. Only the needed
+                column chunks are downloaded. Defaults to None, all columns.
+            filters (dict, optional): Partition pruning, {column: value or list of values}. Files of other
+                partitions are not opened. Defaults to None.
+            backend (str, optional): "pandas" or "polars". Defaults to "pandas".
+            batch_size (int, optional): Maximum rows per yielded frame. Defaults to 65_536.
+
+        Yields:
+            pd.DataFrame | pl.DataFrame: The batches, with the partition columns as string columns.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        prefix = prefix.strip("/")
+        filters = filters or {}
+        for obj in self.list_objects(bucket_name, prefix + "/" if prefix else ""):
+            if not obj["Key"].endswith(".parquet"):
+                continue
+            partitions = parse_partitions(obj["Key"], prefix)
+            if not matches_filters(partitions, filters):
+                continue
+            file_columns = None if columns is None else [col for col in columns if col not in partitions]
+            with self.open_reader(bucket_name, obj["Key"], obj["Size"]) as source:
+                for batch in pq.ParquetFile(source).iter_batches(batch_size=batch_size, columns=file_columns):
+                    table = pa.Table.from_batches([batch])
+                    for col, value in partitions.items():
+                        if columns is None or col in columns:
+                            table = table.append_column(col, pa.array([value] * table.num_rows, pa.string()))
+                    if columns is not None:
+                        table = table.select(columns)
+                    count("s3.rows_read", table.num_rows)
+                    if backend == "polars":
+                        import polars as pl
+                        yield pl.from_arrow(table)
+                    else:
+                        yield table.to_pandas()
+
+    @traced
+    def read_parquet(self, bucket_name: str, prefix: str, columns: list[str] = None, filters: dict = None, backend: str = "pandas"):
+        """Reads a parquet dataset written by 'write_parquet' into a single frame, see 'iter_parquet'."""
+        frames = list(self.iter_parquet(bucket_name, prefix, columns, filters, backend))
+        if backend == "polars":
+            import polars as pl
+            return pl.concat(frames, how="vertical_relaxed") if frames else pl.DataFrame()
+        import pandas as pd
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
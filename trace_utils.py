@@ -0,0 +1,386 @@
+from contextvars import ContextVar
+from functools import wraps
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Callable
+
+"""
+Instrumentation of the hot paths: timed spans, counters (rows, bytes, replicates...) and memory snapshots.
+
+A span times a block, 'with span("upsert.batch", files=10):' or @traced, and nests in the span that is current in its
+context. 'count' adds to the counters of the current span, and 'timed' adds the seconds of a block to them, for steps
+in loops too hot for a span each. Finished spans roll their counters up into their parent and go to the exporters:
+logging, JSON lines or OpenTelemetry.
+
+Tracing is off by default, then 'span', 'timed' and 'current_span' return a shared no-op object and 'count' returns
+at once, a single attribute check. Turn it on with configure_tracing or the TRACE_EXPORTERS environment variable, a
+comma separated list of "log", "jsonl:<path>" and "otel", e.g. TRACE_EXPORTERS=log,jsonl:/tmp/trace.jsonl.
+"""
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPORTERS = os.environ.get("TRACE_EXPORTERS")
+MB = 1024**2
+
+
+def memory_snapshot() -> dict[str, float]:
+    """Resident memory of the process now and its peak so far, in MB, None where the platform doesn't expose it."""
+    rss_mb = peak_rss_mb = None
+    try:
+        with open("/proc/self/statm") as file:
+            rss_mb = int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on macOS
+        peak_rss_mb = peak / MB if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    return {"rss_mb": rss_mb, "peak_rss_mb": peak_rss_mb}
+
+
+class Span:
+    """A timed block, with its attributes, counters and the memory of the process when it ended."""
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent", "attributes", "counters", "start_time_ns", "end_time_ns", "seconds",
+        "memory", "status", "error", "_tracer", "_token", "_start",
+    )
+
+    def __init__(self, tracer:"Tracer", name:str, parent:"Span"=None, attributes:dict=None):
+        self._tracer = tracer
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes = attributes or {}
+        self.counters = {}
+        self.start_time_ns = self.end_time_ns = None
+        self.seconds = None
+        self.memory = {}
+        self.status = "ok"
+        self.error = None
+
+    @property
+    def parent_id(self) -> str:
+        return self.parent.span_id if self.parent is not None else None
+
+    def set(self, **attributes) -> "Span":
+        self.attributes.update(attributes)
+        return self
+
+    def count(self, name:str, value:float=1) -> None:
+        with self._tracer._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            self._tracer.totals[name] = self._tracer.totals.get(name, 0) + value
+
+    def __enter__(self) -> "Span":
+        self._token = _CURRENT_SPAN.set(self)
+        self.start_time_ns = time.time_ns()
+        if self._tracer.memory:
+            self.memory = {"start_rss_mb": memory_snapshot()["rss_mb"]}
+        self._tracer._on_start(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.seconds = time.perf_counter() - self._start
+        self.end_time_ns = time.time_ns()
+        _CURRENT_SPAN.reset(self._token)
+        if exc_type is not None:
+            self.status = "error"
+            self.error = f"{exc_type.__name__}: {exc}"
+        if self._tracer.memory:
+            self.memory.update(memory_snapshot())
+        self._tracer._on_end(self)
+
+    def asdict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time_ns": self.start_time_ns,
+            "end_time_ns": self.end_time_ns,
+            "seconds": self.seconds,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "counters": self.counters,
+            "memory": self.memory,
+        }
+
+
+class NoopSpan:
+    """What the tracing functions return while tracing is off, every method does nothing."""
+    __slots__ = ()
+
+    def set(self, **attributes) -> "NoopSpan":
+        return self
+
+    def count(self, name:str, value:float=1) -> None:
+        pass
+
+    def __enter__(self) -> "NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+_CURRENT_SPAN = ContextVar("current_span", default=None)
+
+
+class Timer:
+    """Adds the seconds of a block to the '<name>.seconds' counter of the current span."""
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name:str):
+        self.name = name
+
+    def __enter__(self) -> "Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        count(f"{self.name}.seconds", time.perf_counter() - self._start)
+
+
+class LoggingExporter:
+    """Logs every finished span, one line with its time, attributes, counters and memory."""
+    def __init__(self, logger:logging.Logger=logger, level:int=logging.INFO):
+        self.logger = logger
+        self.level = level
+
+    def export(self, span:Span) -> None:
+        details = {**span.attributes, **span.counters, **{key: value for key, value in span.memory.items() if value is not None}}
+        self.logger.log(
+            self.level, "%s %s in %.3fs %s", span.name, span.status, span.seconds,
+            " ".join(f"{key}={value:.6g}" if isinstance(value, float) else f"{key}={value}" for key, value in details.items()),
+        )
+
+
+class JsonLinesExporter:
+    """Appends every finished span as a JSON line to 'path', see Span.asdict. Several processes can share the file."""
+    def __init__(self, path:str):
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, span:Span) -> None:
+        line = json.dumps(span.asdict(), default=str) + "\n"
+        with self._lock, open(self.path, "a") as file:
+            file.write(line)
+
+
+class OpenTelemetryExporter:
+    """
+    Mirrors the spans into OpenTelemetry spans, with the same nesting, start and end times. Attributes keep their
+    name, counters are prefixed with "counter." and memory with "memory.". Needs the opentelemetry-api package and,
+    to send the spans anywhere, a configured opentelemetry-sdk TracerProvider.
+    """
+    def __init__(self, tracer_provider=None, instrumentation_name:str="trace_utils"):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(instrumentation_name, tracer_provider=tracer_provider)
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, span:Span) -> None:
+        with self._lock:
+            parent = self._spans.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(span.name, context=context, start_time=span.start_time_ns)
+        with self._lock:
+            self._spans[span.span_id] = otel_span
+
+    def export(self, span:Span) -> None:
+        from opentelemetry.trace import Status, StatusCode
+
+        with self._lock:
+            otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        attributes = {
+            **span.attributes,
+            **{f"counter.{key}": value for key, value in span.counters.items()},
+            **{f"memory.{key}": value for key, value in span.memory.items() if value is not None},
+        }
+        # OpenTelemetry takes str, bool, int, float and sequences of them only
+        otel_span.set_attributes({
+            key: value if isinstance(value, (str, bool, int, float)) else str(value) for key, value in attributes.items()
+        })
+        if span.status == "error":
+            otel_span.set_status(Status(StatusCode.ERROR, span.error))
+        otel_span.end(end_time=span.end_time_ns)
+
+
+class MemoryExporter:
+    """Keeps the finished spans in a list, e.g. to inspect them in a notebook."""
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span:Span) -> None:
+        self.spans.append(span)
+
+
+def get_exporter(spec) -> object:
+    """An exporter from its name: "log", "jsonl:<path>", "otel" or "memory". Exporter objects are returned as is."""
+    if not isinstance(spec, str):
+        return spec
+    name, _, argument = spec.strip().partition(":")
+    if name == "log":
+        return LoggingExporter()
+    if name == "jsonl":
+        if not argument:
+            raise ValueError('the jsonl exporter needs a path, e.g. "jsonl:/tmp/trace.jsonl"')
+        return JsonLinesExporter(argument)
+    if name == "otel":
+        return OpenTelemetryExporter()
+    if name == "memory":
+        return MemoryExporter()
+    raise ValueError(f'unknown exporter {spec!r}, use "log", "jsonl:<path>", "otel" or "memory"')
+
+
+class Tracer:
+    """
+    Creates the spans and sends the finished ones to the exporters. Exporters have an 'export(span)' method and an
+    optional 'on_start(span)'. An exporter that fails is logged and skipped, tracing never breaks the traced code.
+
+    Args:
+        exporters (list, optional): Exporter objects or names, see get_exporter. Defaults to None.
+        enabled (bool, optional): Defaults to True.
+        memory (bool, optional): Take a memory snapshot when spans start and end. Defaults to True.
+    """
+    def __init__(self, exporters:list=None, enabled:bool=True, memory:bool=True):
+        self.exporters = [get_exporter(exporter) for exporter in exporters or []]
+        self.enabled = enabled
+        self.memory = memory
+        # every count since the tracer was created, or reset_totals
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def span(self, name:str, /, **attributes) -> Span | NoopSpan:
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, _CURRENT_SPAN.get(), attributes)
+
+    def reset_totals(self) -> dict:
+        with self._lock:
+            totals, self.totals = self.totals, {}
+        return totals
+
+    def _on_start(self, span:Span) -> None:
+        for exporter in self.exporters:
+            if hasattr(exporter, "on_start"):
+                try:
+                    exporter.on_start(span)
+                except Exception:
+                    logger.exception("Exporter %r failed on the start of %s", exporter, span.name)
+
+    def _on_end(self, span:Span) -> None:
+        if span.parent is not None:
+            with self._lock:
+                for key, value in span.counters.items():
+                    span.parent.counters[key] = span.parent.counters.get(key, 0) + value
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                logger.exception("Exporter %r failed on %s", exporter, span.name)
+
+
+DEFAULT_TRACER = Tracer(
+    exporters=DEFAULT_EXPORTERS.split(",") if DEFAULT_EXPORTERS else None, enabled=bool(DEFAULT_EXPORTERS)
+)
+
+
+def configure_tracing(exporters:list=None, enabled:bool=True, memory:bool=None) -> Tracer:
+    """
+    Changes the settings of DEFAULT_TRACER in place and returns it, e.g. configure_tracing(["log"]) or
+    configure_tracing(enabled=False). Exporters given replace the current ones.
+    """
+    if exporters is not None:
+        DEFAULT_TRACER.exporters = [get_exporter(exporter) for exporter in exporters]
+    if memory is not None:
+        DEFAULT_TRACER.memory = memory
+    DEFAULT_TRACER.enabled = enabled
+    return DEFAULT_TRACER
+
+
+def is_enabled() -> bool:
+    """Whether DEFAULT_TRACER records, to skip computing attributes that are only needed by the spans."""
+    return DEFAULT_TRACER.enabled
+
+
+def span(name:str, /, **attributes) -> Span | NoopSpan:
+    """A span of DEFAULT_TRACER, child of the current span, to use as 'with span("name", key=value):'."""
+    if not DEFAULT_TRACER.enabled:
+        return NOOP_SPAN
+    return Span(DEFAULT_TRACER, name, _CURRENT_SPAN.get(), attributes)
+
+
+def current_span() -> Span | NoopSpan:
+    """The innermost open span of this context, e.g. to set attributes known once the work is done."""
+    if not DEFAULT_TRACER.enabled:
+        return NOOP_SPAN
+    return _CURRENT_SPAN.get() or NOOP_SPAN
+
+
+def count(name:str, value:float=1) -> None:
+    """Adds 'value' to a counter of the current span and to DEFAULT_TRACER.totals."""
+    if not DEFAULT_TRACER.enabled:
+        return
+    current = _CURRENT_SPAN.get()
+    if current is not None:
+        current.count(name, value)
+    else:
+        with DEFAULT_TRACER._lock:
+            DEFAULT_TRACER.totals[name] = DEFAULT_TRACER.totals.get(name, 0) + value
+
+
+def timed(name:str) -> Timer | NoopSpan:
+    """Adds the seconds of a block to the '<name>.seconds' counter of the current span, without a span of its own."""
+    if not DEFAULT_TRACER.enabled:
+        return NOOP_SPAN
+    return Timer(name)
+
+
+def counter_callback(name:str) -> Callable[[float], None] | None:
+    """
+    A callback adding its argument to a counter of the current span, for work that reports progress from other
+    threads, e.g. the Callback of boto3 transfers. None while tracing is off.
+    """
+    if not DEFAULT_TRACER.enabled:
+        return None
+    # the span is bound here, the callback runs in threads where it isn't current
+    current = _CURRENT_SPAN.get()
+    if current is None:
+        return lambda value: count(name, value)
+    return lambda value: current.count(name, value)
+
+
+def traced(func:Callable=None, *, name:str=None):
+    """Runs every call of the function in a span named after it (its qualified name by default)."""
+    def decorator(func:Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not DEFAULT_TRACER.enabled:
+                return func(*args, **kwargs)
+            with Span(DEFAULT_TRACER, span_name, _CURRENT_SPAN.get()):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator(func) if func is not None else decorator